@@ -1,16 +1,22 @@
 # backend/app/api/v1/ai_analysis.py
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Request, Query
 from sqlalchemy.orm import Session
-from app.dependencies import get_db, get_current_user
-from app.schemas.analysis import AnalysisJobCreate, AnalysisJobOut
+from app.dependencies import get_db, get_current_user, get_optional_user
+from app.schemas.analysis import AnalysisJobCreate, AnalysisJobOut, UploadInit
 from app.services.analysis_service import AnalysisService
+from app.services.upload_service import UploadService, stored_sha256
 from app.schemas.analysis import LogOut
 from typing import List, Optional
 from uuid import UUID
 from datetime import datetime
 from app.models.analysis_job import AnalysisJob
 from app.models.analysis_log import AnalysisLog
-import uuid, os
+from app.models.log_dataset import LogDataset
+from app.core.llm_scheduler import get_llm_scheduler
+from app.core.model_residency import get_model_residency
+from app.utils.exceptions import UploadError
+from app.utils.line_index import LineIndex, line_context
+import os
 
 router = APIRouter()
 service = AnalysisService()
@@ -18,6 +24,7 @@ service = AnalysisService()
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 UPLOAD_DIR = os.path.join(BASE_DIR, "uploaded_logs")
 os.makedirs(UPLOAD_DIR, exist_ok=True)
+uploads = UploadService(UPLOAD_DIR)
 
 @router.post("/run-analysis", response_model=AnalysisJobOut)
 def run_analysis(
@@ -25,11 +32,23 @@ def run_analysis(
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user),
 ):
+    file_path = job_data.file_path or job_data.uploaded_file_path
+
+    # File đã được phân tích với cùng model → trả về job cũ, không phân tích lại.
+    # Chỉ dùng hash ghi lúc upload: file chưa có .sha256 thì không hash cả file trong request
+    # (worker tự tính khi chạy job)
+    content_hash = stored_sha256(file_path) if job_data.reuse_existing and file_path else None
+    if content_hash:
+        existing = UploadService.find_completed_job(db, content_hash, job_data.model_name, current_user.id)
+        if existing:
+            print(f"[API] ♻️ Same content already analyzed by job {existing.id}")
+            return existing
+
     job = service.create_job(
         db,
         job_name=job_data.job_name,
         model_name=job_data.model_name,
-        file_path=job_data.file_path or job_data.uploaded_file_path,
+        file_path=file_path,
         time_from=job_data.time_range_from,
         time_to=job_data.time_range_to,
         device_ids=job_data.device_ids,
@@ -39,16 +58,87 @@ def run_analysis(
     return job
 
 @router.post("/upload")
-async def upload_log(file: UploadFile = File(...)):
+async def upload_log(
+    file: UploadFile = File(...),
+    db: Session = Depends(get_db),
+    current_user: Optional[dict] = Depends(get_optional_user),
+):
+    """
+    Không bắt buộc đăng nhập (giữ contract cũ); có token → kèm dataset / job đã có cùng nội dung
+    """
     try:
-        filename = f"{uuid.uuid4()}_{file.filename}"
-        path = os.path.join(UPLOAD_DIR, filename)
-        os.makedirs(os.path.dirname(path), exist_ok=True)
-        with open(path, "wb") as f:
-            f.write(await file.read())
-        return {"filepath": path, "filename": file.filename}
+        result = await uploads.save_upload(file)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    return _with_existing_dataset(db, result, current_user.id if current_user else None)
+
+# -------------------------
+# Resumable upload (file nhiều GB): init → PUT chunk theo offset → complete
+# -------------------------
+@router.post("/uploads")
+def init_upload(data: UploadInit, current_user: dict = Depends(get_current_user)):
+    try:
+        return uploads.begin(data.filename, data.size)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+@router.get("/uploads/{upload_id}")
+def upload_status(upload_id: str, current_user: dict = Depends(get_current_user)):
+    try:
+        return uploads.status(upload_id)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+@router.put("/uploads/{upload_id}")
+async def upload_chunk(
+    upload_id: str,
+    offset: int,
+    request: Request,
+    current_user: dict = Depends(get_current_user),
+):
+    """
+    Body = byte thô của chunk, bắt đầu tại `offset` (phải bằng số byte server đã nhận)
+    """
+    try:
+        return await uploads.write_chunk(upload_id, offset, request.stream())
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+@router.post("/uploads/{upload_id}/complete")
+def complete_upload(
+    upload_id: str,
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user),
+):
+    try:
+        result = uploads.complete(upload_id)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    return _with_existing_dataset(db, result, current_user.id)
+
+def _with_existing_dataset(db: Session, result: dict, user_id: Optional[int]) -> dict:
+    # nội dung đã có dataset → client dùng lại dataset / job thay vì phân tích lại
+    # (không đăng nhập → không tra dataset của user khác)
+    dataset = UploadService.find_dataset(db, result["sha256"], user_id) if user_id is not None else None
+    result["dataset_id"] = dataset.id if dataset else None
+    result["job_id"] = str(dataset.created_from_job) if dataset and dataset.created_from_job else None
+    return result
+
+# -------------------------
+# LLM scheduler metrics
+# -------------------------
+@router.get("/llm-scheduler")
+def llm_scheduler_metrics(current_user: dict = Depends(get_current_user)):
+    return get_llm_scheduler().metrics()
+
+# -------------------------
+# Model residency (model đang load, event load / evict)
+# -------------------------
+@router.get("/model-residency")
+def model_residency_status(current_user: dict = Depends(get_current_user)):
+    return get_model_residency().snapshot()
 
 # -------------------------
 # List jobs
@@ -81,6 +171,85 @@ def get_job(
 
     return job
 
+# -------------------------
+# Log lines around a timeline entry (timeline[].index)
+# -------------------------
+@router.get("/jobs/{job_id}/lines/{line}/context")
+def get_job_line_context(
+    job_id: UUID,
+    line: int,
+    before: int = Query(5, ge=0, le=100),
+    after: int = Query(5, ge=0, le=100),
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user),
+):
+    dataset = (
+        db.query(LogDataset)
+        .join(AnalysisJob, LogDataset.created_from_job == AnalysisJob.id)
+        .filter(AnalysisJob.id == job_id, AnalysisJob.created_by == current_user.id)
+        .order_by(LogDataset.id.desc())
+        .first()
+    )
+    if not dataset:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _line_context(dataset, line, before, after)
+
+# -------------------------
+# Dataset lines (random access qua line index)
+# -------------------------
+@router.get("/datasets/{dataset_id}/lines")
+def get_dataset_lines(
+    dataset_id: int,
+    start: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user),
+):
+    dataset = _get_dataset_or_404(db, dataset_id, current_user.id)
+    try:
+        with LineIndex(dataset.file_path) as index:
+            lines = index.read(start, start + limit)
+            total = len(index)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Log file not found")
+    return {
+        "dataset_id": dataset.id,
+        "start": start,
+        "total_lines": total,
+        "lines": [{"index": start + i, "text": text} for i, text in enumerate(lines)],
+    }
+
+@router.get("/datasets/{dataset_id}/lines/{line}/context")
+def get_dataset_line_context(
+    dataset_id: int,
+    line: int,
+    before: int = Query(5, ge=0, le=100),
+    after: int = Query(5, ge=0, le=100),
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user),
+):
+    dataset = _get_dataset_or_404(db, dataset_id, current_user.id)
+    return _line_context(dataset, line, before, after)
+
+def _get_dataset_or_404(db: Session, dataset_id: int, user_id: int) -> LogDataset:
+    dataset = db.query(LogDataset).filter(
+        LogDataset.id == dataset_id,
+        LogDataset.created_by == user_id,
+    ).first()
+    if not dataset:
+        raise HTTPException(status_code=404, detail="Dataset not found")
+    return dataset
+
+def _line_context(dataset: LogDataset, line: int, before: int, after: int) -> dict:
+    try:
+        context = line_context(dataset.file_path, line, before, after)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Log file not found")
+    except IndexError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    context["dataset_id"] = dataset.id
+    return context
+
 # -------------------------
 # Get job logs
 # -------------------------
@@ -7,15 +7,18 @@ from sqlalchemy.orm import Session
 from app.dependencies import get_db
 from app.models.AnalysisJob import Analysis
 from app.schemas.analysis import AnalysisJobCreate
+from app.services.upload_service import UploadService
+from app.utils.exceptions import UploadError
+from app.utils.log_reader import COMPRESSED_EXTENSIONS, LOG_EXTENSIONS
 import os
-import uuid
 
 router = APIRouter()
 UPLOAD_DIR = "uploads/logs"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
+uploads = UploadService(UPLOAD_DIR)
 
 MAX_FILE_SIZE = 100 * 1024 * 1024  # 100MB
-ALLOWED_EXTENSIONS = ["log", "txt", "csv"]
+ALLOWED_EXTENSIONS = [*LOG_EXTENSIONS, *COMPRESSED_EXTENSIONS]  # .gz / .bz2 / .zst lưu nguyên dạng nén
 
 
 # =========================================================
@@ -73,26 +76,20 @@ async def upload_log_file(file: UploadFile = File(...)):
         print("[API] ERROR — unsupported extension:", ext)
         raise HTTPException(status_code=400, detail="Unsupported file extension")
 
-    content = await file.read()
-    print("[API] File size:", len(content))
-
-    if len(content) > MAX_FILE_SIZE:
-        print("[API] ERROR — file too large")
-        raise HTTPException(status_code=400, detail="File too large (max 100MB)")
-
-    # Tạo tên file duy nhất
-    file_name = f"{uuid.uuid4()}.{ext}"
-    file_path = os.path.join(UPLOAD_DIR, file_name)
-
-    with open(file_path, "wb") as f:
-        f.write(content)
+    # ghi theo chunk + sha256, dừng ngay khi vượt MAX_FILE_SIZE (không đọc cả file vào memory)
+    try:
+        result = await uploads.save_upload(file, max_size=MAX_FILE_SIZE)
+    except UploadError as e:
+        print("[API] ERROR —", e)
+        raise HTTPException(status_code=e.status_code, detail=str(e))
 
-    print("[API] File saved:", file_path)
+    print("[API] File saved:", result["filepath"], f"({result['size']} bytes)")
 
     return {
         "message": "uploaded",
-        "file_path": file_path,
-        "file_name": file.filename
+        "file_path": result["filepath"],
+        "file_name": file.filename,
+        "sha256": result["sha256"],
     }
 
 
@@ -1,5 +1,5 @@
 # backend/app/api/v1/chatbot.py
-from fastapi import APIRouter
+from fastapi import APIRouter, Request
 from fastapi.responses import StreamingResponse
 from app.schemas.chatRequest import ChatRequest
 from app.services.chatbot_service import ChatbotService
@@ -7,10 +7,12 @@ from app.services.chatbot_service import ChatbotService
 router = APIRouter()
 
 @router.post("/chat-stream")
-def chat_stream(req: ChatRequest):
+def chat_stream(req: ChatRequest, request: Request):
+    # endpoint không có auth → fairness theo IP client
+    client_id = request.client.host if request.client else None
 
     def generate():
-        for chunk in ChatbotService.stream(req.message, req.history):
+        for chunk in ChatbotService.stream(req.message, req.history, user_id=client_id):
             yield chunk
 
     return StreamingResponse(generate(), media_type="text/plain")
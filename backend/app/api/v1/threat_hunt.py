@@ -156,6 +156,25 @@ def get_findings(hunt_id: int, db: Session = Depends(get_db)):
     except NoResultFound:
         raise HTTPException(status_code=404, detail="Hunt not found")
 
+# ---------------------------
+# 7b. Log lines around a finding
+# ---------------------------
+@router.get("/{hunt_id}/findings/{finding_id}/context")
+def get_finding_context(
+    hunt_id: int,
+    finding_id: int,
+    before: int = Query(5, ge=0, le=100),
+    after: int = Query(5, ge=0, le=100),
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user),
+):
+    try:
+        return hunt_service.finding_context(db, hunt_id, finding_id, before, after)
+    except NoResultFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except (FileNotFoundError, IndexError) as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
 # ---------------------------
 # 8. Conclude hunt
 # ---------------------------
@@ -299,6 +318,7 @@ def serialize_hunt_session(hunt: HuntSession) -> dict:
             "started_at": latest_execution.started_at.isoformat() if latest_execution.started_at else None,
             "finished_at": latest_execution.finished_at.isoformat() if latest_execution.finished_at else None,
             "error": latest_execution.error,
+            "telemetry": latest_execution.telemetry,
         } if latest_execution else None,
         
         # Findings Summary
@@ -1,5 +1,6 @@
 # backend/app/core/celery_app.py
 from celery import Celery
+from celery.signals import worker_process_init, worker_process_shutdown
 from dotenv import load_dotenv
 
 from .config import settings
@@ -27,6 +28,21 @@ celery_app.conf.update(
     task_track_started=True,
 )
 
+# 🔥 Model residency: preload model + ping keep_alive ở mỗi worker process
+@worker_process_init.connect
+def _start_model_residency(**_):
+    if settings.MODEL_RESIDENCY_ENABLED:
+        from app.core.model_residency import get_model_residency
+        get_model_residency().start()
+
+
+@worker_process_shutdown.connect
+def _stop_model_residency(**_):
+    if settings.MODEL_RESIDENCY_ENABLED:
+        from app.core.model_residency import get_model_residency
+        get_model_residency().stop()
+
+
 # Force import để debug lỗi import
 print("=== Đang force import các task ===")
 try:
@@ -24,6 +24,128 @@ class Settings(BaseSettings):
     # --- Ollama ---
     OLLAMA_MODEL: str = "qwen3:8b"
     OLLAMA_API_URL: str = "http://localhost:11434/api/generate"
+    OLLAMA_NUM_CTX: int = 8192
+    OLLAMA_KEEP_ALIVE: str = "30m"  # giữ model + KV cache của system prompt giữa các batch
+    # none = chỉ dặn trong prompt | json = format="json" | schema = JSON schema của "results"
+    OLLAMA_OUTPUT_FORMAT: str = "none"
+    OLLAMA_STREAMING: bool = False  # stream output, đẩy từng verdict ngay khi object đóng
+    AI_RETRY_BUDGET: int = 6  # số lần gọi thêm / batch khi output JSON hỏng
+
+    # --- Ollama HTTP Client (pool dùng chung / process) ---
+    OLLAMA_MAX_CONNECTIONS: int = 8  # connection keep-alive tối đa tới Ollama
+    OLLAMA_CONNECT_TIMEOUT: float = 5.0
+    OLLAMA_READ_TIMEOUT: float = 300.0
+    OLLAMA_MAX_RETRIES: int = 2  # retry lỗi kết nối / 429 / 5xx
+    OLLAMA_RETRY_BACKOFF: float = 0.5  # giây, nhân đôi mỗi lần
+
+    # --- Model Residency (preload lúc worker start + ping keep_alive) ---
+    MODEL_RESIDENCY_ENABLED: bool = True
+    # các model phải cùng vừa VRAM, nếu không ping sẽ làm chúng evict lẫn nhau
+    MODEL_PRELOAD: list[str] = ["qwen3:8b", "qwen2.5:3b"]
+    # keep_alive theo call class (priority của LLM Scheduler); class khác → OLLAMA_KEEP_ALIVE
+    MODEL_KEEP_ALIVE: dict[str, str] = {"interactive": "15m", "hunt": "30m", "bulk": "30m"}
+    MODEL_KEEPALIVE_INTERVAL: float = 240.0  # giây, 0 = chỉ preload, không ping
+
+    # --- LLM Scheduler (Redis, dùng chung mọi worker / API replica) ---
+    # priority: interactive (chatbot) > hunt > bulk (ai.analysis.run)
+    LLM_SCHEDULER_ENABLED: bool = True
+    LLM_MAX_CONCURRENCY: int = 4  # tổng request đồng thời tới Ollama (≈ OLLAMA_NUM_PARALLEL)
+    LLM_SCHEDULER_LEASE: float = 600.0  # giây; slot tự giải phóng nếu process chết
+    LLM_SCHEDULER_POLL_INTERVAL: float = 0.05
+    LLM_SCHEDULER_MAX_WAIT: float = 0  # 0 = chờ không giới hạn
+    LLM_SCHEDULER_DEFAULT_PRIORITY: str = "bulk"  # request không khai báo llm_priority()
+
+    # --- Model Cascade (model nhỏ trước, leo thang lên model lớn) ---
+    # AnalysisJob.model_name = tên profile (vd "cascade") để bật cascade cho job
+    CASCADE_SMALL_MODEL: str = "qwen2.5:3b"
+    CASCADE_LARGE_MODEL: str | None = None  # None → OLLAMA_MODEL
+    CASCADE_MIN_CONFIDENCE: int = 70  # dưới ngưỡng → chạy lại trên model lớn
+    CASCADE_PROFILES: dict[str, dict[str, Any]] = {}  # JSON: {"tên": {"small": ..., "large": ..., "min_confidence": ...}}
+
+    # --- Adaptive Batching (theo ngân sách token) ---
+    BATCH_MIN_LINES: int = 1
+    BATCH_MAX_LINES: int = 50
+    BATCH_INITIAL_LINES: int = 10
+    BATCH_CONTEXT_FILL: float = 0.75  # tỉ lệ num_ctx dành cho prompt + output
+    BATCH_OUTPUT_TOKENS_PER_LINE: int = 120
+    BATCH_TARGET_LATENCY: float = 60.0  # giây / batch
+
+    # --- Threat Hunt Map-Reduce (threat_service.hunt_threats_from_lines) ---
+    HUNT_MAP_WORKERS: int = 4  # chunk phân tích song song (vẫn qua LLM scheduler)
+    HUNT_CHUNK_MAX_LINES: int = 100
+    HUNT_OUTPUT_TOKENS_PER_LINE: int = 90
+
+    # --- Hunt Depth (HuntExecution.depth: quick = stratified sample, standard = prefilter, deep = mọi dòng) ---
+    HUNT_QUICK_PER_TEMPLATE: int = 3  # số dòng mẫu / template (Drain)
+    HUNT_QUICK_PER_SOURCE: int = 1  # số dòng mẫu / source IP
+    HUNT_QUICK_MAX_SOURCES: int = 1000  # quá số này → chọn ngẫu nhiên
+    HUNT_QUICK_MAX_FLAGGED: int = 5000  # trần dòng DENY/BLOCK + khớp THREAT_RULES
+    HUNT_QUICK_SEED: int = 0
+
+    # --- Log Upload (stream theo chunk + sha256, resumable) ---
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024  # 1 MiB / lần đọc-ghi
+    UPLOAD_MAX_SIZE: int = 100 * 1024 * 1024  # /upload (multipart)
+    UPLOAD_RESUMABLE_MAX_SIZE: int = 20 * 1024 * 1024 * 1024  # /uploads (resumable, nhiều GB)
+    # trần byte sau giải nén của file .gz / .bz2 / .zst (giới hạn upload chỉ tính byte nén)
+    LOG_MAX_DECOMPRESSED_SIZE: int = 20 * 1024 * 1024 * 1024
+
+    # --- LLM Telemetry (AnalysisJob.telemetry / HuntExecution.telemetry) ---
+    TELEMETRY_MAX_BATCHES: int = 500  # số record per-batch tối đa lưu kèm summary
+
+    # --- AI Analysis Runner ---
+    # Số batch gửi song song tới Ollama (1 = tuần tự).
+    # Nên khớp với OLLAMA_NUM_PARALLEL của Ollama server.
+    ANALYSIS_MAX_INFLIGHT_BATCHES: int = 1
+
+    # --- Rule Prefilter (tier 1 trước LLM) ---
+    PREFILTER_ENABLED: bool = True
+    PREFILTER_RULES_FILE: str | None = None  # JSON override allow-list theo source_type
+    # dst (IP / hostname đúng như trong log) được allow-list cho tcp/443 (firewall) và CONNECT :443 (proxy);
+    # rỗng = không allow HTTPS nào
+    PREFILTER_HTTPS_TRUSTED_DSTS: list[str] = []
+
+    # --- Verdict Cache (theo log template) ---
+    VERDICT_CACHE_ENABLED: bool = True
+    VERDICT_CACHE_SIZE: int = 10000
+    VERDICT_CACHE_TTL: int = 3600  # giây
+    VERDICT_CACHE_REDIS: bool = False  # bật tier Redis dùng chung giữa các worker
+
+    # --- Vector Verdict Reuse (nearest neighbour, hashed n-gram, tier sau verdict cache) ---
+    VECTOR_INDEX_ENABLED: bool = False
+    VECTOR_INDEX_DIR: str = "vector_index"  # .npz theo source_type + model
+    VECTOR_INDEX_DIM: int = 1024
+    VECTOR_INDEX_NGRAM: int = 3
+    VECTOR_INDEX_MAX_SIZE: int = 20000  # dòng / index (float32 → ~80MB với dim 1024)
+    VECTOR_INDEX_BOOTSTRAP_ROWS: int = 20000  # nạp từ analysis_logs khi chưa có file
+    VECTOR_SIM_THRESHOLD: float = 0.92
+
+    # --- Format Detection (LogDataset.log_format, chọn parser theo mẫu đầu file + offset ngẫu nhiên) ---
+    FORMAT_DETECT_HEAD_LINES: int = 200
+    FORMAT_DETECT_PROBES: int = 8  # số đoạn lấy ở offset ngẫu nhiên
+    FORMAT_DETECT_PROBE_LINES: int = 25
+    FORMAT_DETECT_MIN_SCORE: float = 0.6  # tỉ lệ dòng mẫu khớp tối thiểu, thấp hơn → "unknown"
+    FORMAT_DETECT_SEED: int = 0
+
+    # --- Template Clustering (Drain) ---
+    ANALYSIS_CLUSTERING_ENABLED: bool = False
+    DRAIN_SIM_THRESHOLD: float = 0.7
+    DRAIN_DEPTH: int = 4
+    DRAIN_MAX_CHILDREN: int = 100
+    DRAIN_MAX_CLUSTERS: int = 5000
+    CLUSTER_REPRESENTATIVES: int = 3  # số dòng đại diện / cluster gửi lên LLM
+
+    # --- Fake Ollama (app/devtools/fake_ollama.py, load test không cần GPU) ---
+    # python -m app.devtools.fake_ollama → OLLAMA_API_URL=http://127.0.0.1:11435/api/generate
+    FAKE_OLLAMA_HOST: str = "127.0.0.1"
+    FAKE_OLLAMA_PORT: int = 11435
+    FAKE_OLLAMA_LATENCY: str = "lognormal:0.8,0.4"  # time-to-first-token (giây)
+    FAKE_OLLAMA_TOKENS_PER_SEC: float = 40.0
+    FAKE_OLLAMA_PREFILL_TOKENS_PER_SEC: float = 500.0  # eval prompt (phần không cache)
+    FAKE_OLLAMA_MALFORMED_RATE: float = 0.0  # tỉ lệ response JSON hỏng
+    FAKE_OLLAMA_PARALLEL: int = 4  # giống OLLAMA_NUM_PARALLEL
+    FAKE_OLLAMA_SEED: int = 0
+    FAKE_OLLAMA_LOAD_SECONDS: float = 0.0  # thời gian load model (cold start)
+    FAKE_OLLAMA_MAX_LOADED: int = 0  # 0 = không giới hạn
 
     # --- Pydantic Config ---
     model_config = SettingsConfigDict(
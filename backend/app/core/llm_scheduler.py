@@ -0,0 +1,368 @@
+# backend/app/core/llm_scheduler.py
+"""
+Scheduler dùng chung (qua Redis) cho mọi request tới Ollama.
+
+- Priority class: interactive (chatbot) > hunt > bulk (ai.analysis.run)
+- Global concurrency cap cho TẤT CẢ worker process / API replica
+- Fair giữa các user trong cùng class (start-time fair queuing: user gửi 100 request
+  không chặn user khác chỉ gửi 1)
+- Metrics thời gian chờ theo class
+
+Caller khai báo class bằng context:
+
+    with llm_priority("hunt", user_id=user_id):
+        AIProcessor.analyze_batch(...)   # OllamaClient tự xin slot cho từng request
+"""
+import asyncio
+import contextvars
+import random
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+import redis
+from redis.backoff import NoBackoff
+from redis.retry import Retry
+
+from app.core.config import settings
+from app.utils.exceptions import LLMQueueTimeout
+
+PRIORITIES = {
+    "interactive": 0,
+    "hunt": 1,
+    "bulk": 2,
+}
+
+# score trong hàng chờ = class_rank * CLASS_SPAN + fair tag
+CLASS_SPAN = 10 ** 12
+
+_request_class: contextvars.ContextVar[Optional[Tuple[str, str]]] = contextvars.ContextVar(
+    "llm_request_class", default=None
+)
+
+
+@contextmanager
+def llm_priority(priority: str, user_id: Any = None):
+    """
+    Gắn priority class + user cho mọi request Ollama trong block (kể cả thread con
+    được submit bằng contextvars.copy_context())
+    """
+    if priority not in PRIORITIES:
+        raise ValueError(f"Unknown LLM priority: {priority}")
+    token = _request_class.set((priority, str(user_id) if user_id is not None else "anonymous"))
+    try:
+        yield
+    finally:
+        _request_class.reset(token)
+
+
+def current_request_class() -> Tuple[str, str]:
+    return _request_class.get() or (settings.LLM_SCHEDULER_DEFAULT_PRIORITY, "anonymous")
+
+
+# ======================================================
+# LUA (atomic trên Redis)
+# ======================================================
+# KEYS: waiting(zset) seen(hash) vclock(hash) tags(hash) enqueued(hash)
+# ARGV: ticket class_rank user_key now tag_ttl
+_ENQUEUE = """
+local v = tonumber(redis.call('HGET', KEYS[3], ARGV[2]) or '0')
+local last = tonumber(redis.call('HGET', KEYS[4], ARGV[3]) or '0')
+local tag = math.max(v, last) + 1
+redis.call('HSET', KEYS[4], ARGV[3], tag)
+redis.call('EXPIRE', KEYS[4], tonumber(ARGV[5]))
+redis.call('ZADD', KEYS[1], tonumber(ARGV[2]) * %d + tag, ARGV[1])
+redis.call('HSET', KEYS[2], ARGV[1], ARGV[4])
+redis.call('HSET', KEYS[5], ARGV[1], ARGV[4])
+return tag
+""" % CLASS_SPAN
+
+# KEYS: waiting seen active vclock enqueued metrics
+# ARGV: ticket now cap lease_until stale_after class_name
+# return: 1 = granted, 0 = chờ tiếp, -1 = ticket không còn trong hàng (bị dọn) → enqueue lại
+_TRY_ACQUIRE = """
+local now = tonumber(ARGV[2])
+redis.call('ZREMRANGEBYSCORE', KEYS[3], '-inf', now)
+
+local seen = redis.call('HGETALL', KEYS[2])
+for i = 1, #seen, 2 do
+  if tonumber(seen[i + 1]) < now - tonumber(ARGV[5]) then
+    redis.call('ZREM', KEYS[1], seen[i])
+    redis.call('HDEL', KEYS[2], seen[i])
+    redis.call('HDEL', KEYS[5], seen[i])
+  end
+end
+
+local rank = redis.call('ZRANK', KEYS[1], ARGV[1])
+if not rank then return -1 end
+redis.call('HSET', KEYS[2], ARGV[1], ARGV[2])
+
+local free = tonumber(ARGV[3]) - redis.call('ZCARD', KEYS[3])
+if rank >= free then return 0 end
+
+local score = tonumber(redis.call('ZSCORE', KEYS[1], ARGV[1]))
+local class = math.floor(score / %d)
+local tag = score - class * %d
+if tag > tonumber(redis.call('HGET', KEYS[4], class) or '0') then
+  redis.call('HSET', KEYS[4], class, tag)
+end
+
+local waited = now - tonumber(redis.call('HGET', KEYS[5], ARGV[1]) or ARGV[2])
+redis.call('ZREM', KEYS[1], ARGV[1])
+redis.call('HDEL', KEYS[2], ARGV[1])
+redis.call('HDEL', KEYS[5], ARGV[1])
+redis.call('ZADD', KEYS[3], ARGV[4], ARGV[1])
+
+redis.call('HINCRBY', KEYS[6], ARGV[6] .. ':granted', 1)
+redis.call('HINCRBYFLOAT', KEYS[6], ARGV[6] .. ':wait_seconds', waited)
+if waited > tonumber(redis.call('HGET', KEYS[6], ARGV[6] .. ':max_wait_seconds') or '0') then
+  redis.call('HSET', KEYS[6], ARGV[6] .. ':max_wait_seconds', waited)
+end
+return 1
+""" % (CLASS_SPAN, CLASS_SPAN)
+
+
+class LLMScheduler:
+    """
+    Semaphore phân tán có priority + fairness.
+
+    - acquire(): enqueue ticket vào ZSET chờ, poll tới khi ticket nằm trong
+      (cap - đang chạy) vị trí đầu → chuyển sang ZSET active (có lease)
+    - Lease hết hạn / process chết khi đang chờ → Redis tự dọn, không kẹt slot
+    - Redis lỗi → fallback semaphore trong process (giữ cap cục bộ, không có fairness)
+    """
+
+    def __init__(
+        self,
+        redis_client: Optional[redis.Redis] = None,
+        max_concurrency: Optional[int] = None,
+        lease_seconds: Optional[float] = None,
+        poll_interval: Optional[float] = None,
+        key_prefix: str = "llm:sched",
+    ):
+        self.redis = redis_client
+        self.max_concurrency = max_concurrency or settings.LLM_MAX_CONCURRENCY
+        self.lease_seconds = lease_seconds or settings.LLM_SCHEDULER_LEASE
+        self.poll_interval = poll_interval or settings.LLM_SCHEDULER_POLL_INTERVAL
+        self.stale_after = max(self.poll_interval * 50, 10.0)
+
+        self.keys = {
+            name: f"{key_prefix}:{name}"
+            for name in ("waiting", "seen", "active", "vclock", "tags", "enqueued", "metrics")
+        }
+
+        self._local = threading.BoundedSemaphore(self.max_concurrency)
+        self._redis_down_until = 0.0
+
+        if self.redis is not None:
+            self._enqueue = self.redis.register_script(_ENQUEUE)
+            self._try_acquire = self.redis.register_script(_TRY_ACQUIRE)
+
+    # =====================================================
+    # SYNC API
+    # =====================================================
+
+    @contextmanager
+    def slot(self, priority: Optional[str] = None, user: Optional[str] = None) -> Iterator[str]:
+        ticket = self.acquire(priority, user)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def acquire(
+        self,
+        priority: Optional[str] = None,
+        user: Optional[str] = None,
+        timeout: Optional[float] = None,
+    ) -> str:
+        priority, user = self._resolve_class(priority, user)
+        timeout = settings.LLM_SCHEDULER_MAX_WAIT if timeout is None else timeout
+        deadline = time.time() + timeout if timeout else None
+
+        if not self._redis_available():
+            return self._acquire_local(deadline)
+
+        ticket = f"{priority}:{user}:{uuid.uuid4().hex}"
+        try:
+            self._enqueue_ticket(ticket, priority, user)
+            delay = self.poll_interval
+            while True:
+                state = self._poll(ticket, priority)
+                if state == 1:
+                    return ticket
+                if state == -1:
+                    self._enqueue_ticket(ticket, priority, user)
+                if deadline and time.time() > deadline:
+                    self._abandon(ticket, priority)
+                    raise LLMQueueTimeout(f"LLM queue wait exceeded {timeout}s ({priority})")
+                time.sleep(delay * random.uniform(0.5, 1.5))
+                delay = min(delay * 1.5, self.poll_interval * 4)
+        except redis.RedisError as e:
+            self._mark_redis_down(e)
+            return self._acquire_local(deadline)
+
+    def release(self, ticket: str) -> None:
+        if ticket == "local":
+            self._local.release()
+            return
+        try:
+            self.redis.zrem(self.keys["active"], ticket)
+        except redis.RedisError as e:
+            # lease sẽ tự hết hạn
+            print(f"[LLM-SCHED] ⚠️ Release {ticket} failed: {e}")
+
+    # =====================================================
+    # ASYNC API (chạy lệnh Redis trên thread, không block event loop)
+    # =====================================================
+
+    @asynccontextmanager
+    async def slot_async(self, priority: Optional[str] = None, user: Optional[str] = None):
+        priority, user = self._resolve_class(priority, user)
+        if not self._redis_available():
+            # semaphore cục bộ: chờ trên thread để không block event loop
+            ticket = await asyncio.to_thread(self._acquire_local, None)
+        else:
+            ticket = await self._acquire_async(priority, user)
+        try:
+            yield ticket
+        finally:
+            await asyncio.to_thread(self.release, ticket)
+
+    async def _acquire_async(self, priority: str, user: str) -> str:
+        ticket = f"{priority}:{user}:{uuid.uuid4().hex}"
+        try:
+            await asyncio.to_thread(self._enqueue_ticket, ticket, priority, user)
+            while True:
+                state = await asyncio.to_thread(self._poll, ticket, priority)
+                if state == 1:
+                    return ticket
+                if state == -1:
+                    await asyncio.to_thread(self._enqueue_ticket, ticket, priority, user)
+                await asyncio.sleep(self.poll_interval * random.uniform(0.5, 1.5))
+        except redis.RedisError as e:
+            self._mark_redis_down(e)
+            return await asyncio.to_thread(self._acquire_local, None)
+
+    # =====================================================
+    # METRICS
+    # =====================================================
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Hàng chờ + thời gian chờ theo priority class (tổng hợp mọi process)
+        """
+        if not self._redis_available():
+            return {"backend": "local", "max_concurrency": self.max_concurrency}
+
+        try:
+            pipe = self.redis.pipeline()
+            pipe.zremrangebyscore(self.keys["active"], "-inf", time.time())
+            pipe.zcard(self.keys["active"])
+            for name, rank in PRIORITIES.items():
+                pipe.zcount(self.keys["waiting"], rank * CLASS_SPAN, (rank + 1) * CLASS_SPAN - 1)
+            pipe.hgetall(self.keys["metrics"])
+            replies = pipe.execute()
+        except redis.RedisError as e:
+            self._mark_redis_down(e)
+            return {"backend": "local", "max_concurrency": self.max_concurrency}
+
+        active = replies[1]
+        queued = dict(zip(PRIORITIES, replies[2:2 + len(PRIORITIES)]))
+        raw = replies[-1]
+
+        classes = {}
+        for name in PRIORITIES:
+            granted = int(raw.get(f"{name}:granted", 0))
+            wait = float(raw.get(f"{name}:wait_seconds", 0))
+            classes[name] = {
+                "queued": queued[name],
+                "granted": granted,
+                "avg_wait_seconds": round(wait / granted, 3) if granted else 0,
+                "max_wait_seconds": round(float(raw.get(f"{name}:max_wait_seconds", 0)), 3),
+                "timeouts": int(raw.get(f"{name}:timeouts", 0)),
+            }
+
+        return {
+            "backend": "redis",
+            "max_concurrency": self.max_concurrency,
+            "active": active,
+            "classes": classes,
+        }
+
+    # =====================================================
+    # INTERNAL
+    # =====================================================
+
+    @staticmethod
+    def _resolve_class(priority: Optional[str], user: Optional[str]) -> Tuple[str, str]:
+        ctx_priority, ctx_user = current_request_class()
+        priority = priority or ctx_priority
+        if priority not in PRIORITIES:
+            priority = "bulk"
+        return priority, user or ctx_user
+
+    def _enqueue_ticket(self, ticket: str, priority: str, user: str) -> None:
+        self._enqueue(
+            keys=[self.keys["waiting"], self.keys["seen"], self.keys["vclock"],
+                  self.keys["tags"], self.keys["enqueued"]],
+            args=[ticket, PRIORITIES[priority], f"{priority}:{user}", time.time(), 86400],
+        )
+
+    def _poll(self, ticket: str, priority: str) -> int:
+        now = time.time()
+        return int(self._try_acquire(
+            keys=[self.keys["waiting"], self.keys["seen"], self.keys["active"],
+                  self.keys["vclock"], self.keys["enqueued"], self.keys["metrics"]],
+            args=[ticket, now, self.max_concurrency, now + self.lease_seconds,
+                  self.stale_after, priority],
+        ))
+
+    def _abandon(self, ticket: str, priority: str) -> None:
+        pipe = self.redis.pipeline()
+        pipe.zrem(self.keys["waiting"], ticket)
+        pipe.hdel(self.keys["seen"], ticket)
+        pipe.hdel(self.keys["enqueued"], ticket)
+        pipe.hincrby(self.keys["metrics"], f"{priority}:timeouts", 1)
+        pipe.execute()
+
+    def _acquire_local(self, deadline: Optional[float]) -> str:
+        timeout = max(deadline - time.time(), 0) if deadline else None
+        if not self._local.acquire(timeout=timeout):
+            raise LLMQueueTimeout("LLM queue wait exceeded (local)")
+        return "local"
+
+    def _redis_available(self) -> bool:
+        return self.redis is not None and time.time() >= self._redis_down_until
+
+    def _mark_redis_down(self, error: Exception) -> None:
+        # tránh mỗi request đều chờ connect timeout khi Redis chết → thử lại sau 30s
+        self._redis_down_until = time.time() + 30
+        print(f"[LLM-SCHED] ⚠️ Redis unavailable, dùng semaphore cục bộ: {error}")
+
+
+# ======================================================
+# PROCESS-WIDE INSTANCE
+# ======================================================
+_scheduler: Optional[LLMScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_llm_scheduler() -> LLMScheduler:
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = LLMScheduler(
+                redis_client=redis.Redis(
+                    host=settings.REDIS_HOST,
+                    port=settings.REDIS_PORT,
+                    db=settings.REDIS_DB,
+                    decode_responses=True,
+                    socket_connect_timeout=2,
+                    # Redis chết → fallback ngay thay vì retry nhiều lần trên mỗi request
+                    retry=Retry(NoBackoff(), 1),
+                ),
+            )
+        return _scheduler
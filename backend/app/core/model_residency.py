@@ -0,0 +1,347 @@
+# backend/app/core/model_residency.py
+import json
+import os
+import socket
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+import redis
+from redis.backoff import NoBackoff
+from redis.retry import Retry
+
+from app.core.config import settings
+from app.core.llm_scheduler import current_request_class
+from app.utils.ollama_client import OllamaClient
+
+# load_duration (Ollama trả về trong response) lớn hơn ngưỡng này → request đã phải load model
+COLD_LOAD_SECONDS = 0.5
+MAX_EVENTS = 200
+
+EVENTS_KEY = "model_residency:events"
+METRICS_KEY = "model_residency:metrics"
+PINGER_KEY = "model_residency:pinger"
+
+EventCallback = Callable[[Dict[str, Any]], None]
+
+
+# ======================================================
+# KEEP_ALIVE THEO CALL CLASS
+# ======================================================
+def keep_alive_for(priority: Optional[str] = None) -> str:
+    """
+    keep_alive gửi kèm request theo call class (interactive / hunt / bulk);
+    không truyền → lấy class của llm_priority() hiện tại
+    """
+    call_class = priority or current_request_class()[0]
+    return settings.MODEL_KEEP_ALIVE.get(call_class, settings.OLLAMA_KEEP_ALIVE)
+
+
+def analysis_models() -> set:
+    """
+    Model chạy batch phân tích (OLLAMA_MODEL + các model của cascade)
+    """
+    models = {settings.OLLAMA_MODEL, settings.CASCADE_SMALL_MODEL, settings.CASCADE_LARGE_MODEL}
+    for profile in settings.CASCADE_PROFILES.values():
+        models.update((profile.get("small"), profile.get("large")))
+    return {m for m in models if m}
+
+
+def load_options(model: str) -> Optional[Dict[str, Any]]:
+    # Ollama load lại model nếu num_ctx khác lần load trước → warm-up / ping phải dùng
+    # đúng num_ctx của batch phân tích
+    if model in analysis_models():
+        return {"num_ctx": settings.OLLAMA_NUM_CTX}
+    return None
+
+
+class ModelResidency:
+    """
+    Giữ model nằm sẵn trong Ollama để batch đầu của job không phải trả giá load model.
+
+    - preload(): load các model MODEL_PRELOAD (gọi lúc Celery worker_process_init)
+    - ping định kỳ (MODEL_KEEPALIVE_INTERVAL) để gia hạn keep_alive; Redis lock
+      → mỗi chu kỳ chỉ một process ping
+    - poll /api/ps → event "loaded" / "evicted"; response có load_duration lớn → "cold_load"
+    - event lưu local + Redis list (API đọc được event của mọi worker), subscribe() để nghe
+    """
+
+    def __init__(
+        self,
+        client: Optional[OllamaClient] = None,
+        redis_client: Optional[redis.Redis] = None,
+        models: Optional[List[str]] = None,
+        interval: Optional[float] = None,
+    ):
+        # warm-up / ping không đi qua LLMScheduler (không chiếm slot của job)
+        self.client = client or OllamaClient(max_connections=2, scheduled=False)
+        self.redis = redis_client
+        self.models = list(models if models is not None else settings.MODEL_PRELOAD)
+        self.interval = settings.MODEL_KEEPALIVE_INTERVAL if interval is None else interval
+
+        self._lock = threading.Lock()
+        self._events: Deque[Dict[str, Any]] = deque(maxlen=MAX_EVENTS)
+        self._metrics: Dict[str, float] = {}
+        self._callbacks: List[EventCallback] = []
+        self._loaded: Optional[set] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # =====================================================
+    # LIFECYCLE
+    # =====================================================
+
+    def start(self) -> None:
+        """
+        Preload + vòng ping chạy nền (không chặn worker khởi động)
+        """
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="model-residency", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout=5)
+
+    def _run(self) -> None:
+        self.preload()
+        if self.interval <= 0:
+            return
+        while not self._stop.wait(self.interval):
+            try:
+                self.tick()
+            except Exception as e:
+                print(f"[RESIDENCY] ⚠️ Tick failed: {type(e).__name__}: {e}")
+
+    # =====================================================
+    # WARM-UP / KEEP-ALIVE
+    # =====================================================
+
+    def preload(self) -> Dict[str, float]:
+        """
+        Load từng model (prompt rỗng → Ollama chỉ load, không generate).
+        Trả về {model: giây load}
+        """
+        loaded: Dict[str, float] = {}
+        for model in self.models:
+            started = time.perf_counter()
+            try:
+                data = self._load(model)
+            except Exception as e:
+                print(f"[RESIDENCY] ❌ Preload {model} failed: {type(e).__name__}: {e}")
+                continue
+            load_seconds = data.get("load_duration", 0) / 1e9
+            loaded[model] = load_seconds
+            self._event("preload", model, load_seconds=load_seconds, seconds=time.perf_counter() - started)
+            print(f"[RESIDENCY] 🔥 Preloaded {model} (load {load_seconds:.2f}s)")
+
+        self.poll()
+        return loaded
+
+    def tick(self) -> None:
+        if self._claim_ping():
+            for model in self.models:
+                try:
+                    data = self._load(model)
+                except Exception as e:
+                    print(f"[RESIDENCY] ⚠️ Ping {model} failed: {type(e).__name__}: {e}")
+                    continue
+                self._incr("pings")
+                load_seconds = data.get("load_duration", 0) / 1e9
+                if load_seconds >= COLD_LOAD_SECONDS:
+                    # model đã bị evict giữa hai lần ping → ping vừa load lại
+                    self._event("reload", model, load_seconds=load_seconds)
+        self.poll()
+
+    def _load(self, model: str) -> Dict[str, Any]:
+        call_class = "bulk" if model in analysis_models() else "interactive"
+        return self.client.generate(
+            model,
+            "",
+            options=load_options(model),
+            keep_alive=keep_alive_for(call_class),
+        )
+
+    def _claim_ping(self) -> bool:
+        # nhiều worker process cùng chạy → chỉ một process ping mỗi chu kỳ
+        if self.redis is None:
+            return True
+        try:
+            ttl = max(int(self.interval) - 1, 1)
+            return bool(self.redis.set(PINGER_KEY, f"{socket.gethostname()}:{os.getpid()}", nx=True, ex=ttl))
+        except redis.RedisError:
+            return True
+
+    def poll(self) -> List[Dict[str, Any]]:
+        """
+        So sánh /api/ps với lần poll trước → event loaded / evicted
+        """
+        try:
+            running = self.client.ps().get("models") or []
+        except Exception as e:
+            print(f"[RESIDENCY] ⚠️ /api/ps failed: {type(e).__name__}: {e}")
+            return []
+
+        current = {m.get("name") or m.get("model") for m in running}
+        previous, self._loaded = self._loaded, current
+        if previous is not None:
+            for model in sorted(current - previous):
+                self._event("loaded", model)
+            for model in sorted(previous - current):
+                self._event("evicted", model)
+        return running
+
+    # =====================================================
+    # OBSERVE (response của request thật)
+    # =====================================================
+
+    def observe(self, model: str, response: Dict[str, Any], stats=None) -> float:
+        """
+        Đọc load_duration của response cuối (non-stream / chunk done) → per-job stats
+        + event cold_load khi request phải load model
+        """
+        load_seconds = (response.get("load_duration") or 0) / 1e9
+        if stats is not None:
+            stats.incr("model.calls")
+            stats.incr("model.load_seconds", load_seconds)
+        if load_seconds >= COLD_LOAD_SECONDS:
+            if stats is not None:
+                stats.incr("model.cold_loads")
+            self._event("cold_load", model, load_seconds=load_seconds)
+        return load_seconds
+
+    @staticmethod
+    def report(stats) -> Dict[str, Any]:
+        """
+        Cold-start của job cho AnalysisJob.summary
+        """
+        model = stats.section("model")
+        return {
+            "first_batch_seconds": round(stats.get("latency.first_batch_seconds"), 3),
+            "llm_calls": int(model.get("calls", 0)),
+            "cold_loads": int(model.get("cold_loads", 0)),
+            "model_load_seconds": round(model.get("load_seconds", 0), 3),
+        }
+
+    # =====================================================
+    # EVENTS / METRICS
+    # =====================================================
+
+    def subscribe(self, callback: EventCallback) -> None:
+        with self._lock:
+            self._callbacks.append(callback)
+
+    def _event(self, kind: str, model: str, **data) -> Dict[str, Any]:
+        event = {
+            "ts": time.time(),
+            "event": kind,
+            "model": model,
+            "worker": f"{socket.gethostname()}:{os.getpid()}",
+            **{k: round(v, 3) if isinstance(v, float) else v for k, v in data.items()},
+        }
+        with self._lock:
+            self._events.append(event)
+            callbacks = list(self._callbacks)
+        self._incr(kind)
+        if "load_seconds" in data:
+            self._incr(f"{kind}_seconds", data["load_seconds"])
+
+        if self.redis is not None:
+            try:
+                pipe = self.redis.pipeline()
+                pipe.lpush(EVENTS_KEY, json.dumps(event, ensure_ascii=False))
+                pipe.ltrim(EVENTS_KEY, 0, MAX_EVENTS - 1)
+                pipe.execute()
+            except redis.RedisError:
+                pass
+
+        for callback in callbacks:
+            try:
+                callback(event)
+            except Exception as e:
+                print(f"[RESIDENCY] ⚠️ Event callback failed: {e}")
+        return event
+
+    def _incr(self, key: str, amount: float = 1) -> None:
+        with self._lock:
+            self._metrics[key] = self._metrics.get(key, 0) + amount
+        if self.redis is not None:
+            try:
+                self.redis.hincrbyfloat(METRICS_KEY, key, amount)
+            except redis.RedisError:
+                pass
+
+    def events(self, limit: int = 50) -> List[Dict[str, Any]]:
+        if self.redis is not None:
+            try:
+                return [json.loads(raw) for raw in self.redis.lrange(EVENTS_KEY, 0, limit - 1)]
+            except redis.RedisError:
+                pass
+        with self._lock:
+            return list(self._events)[-limit:][::-1]
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Trạng thái cho API: model đang nằm trong Ollama, metrics, event gần nhất
+        """
+        metrics: Dict[str, float] = {}
+        if self.redis is not None:
+            try:
+                metrics = {k: float(v) for k, v in self.redis.hgetall(METRICS_KEY).items()}
+            except redis.RedisError:
+                metrics = {}
+        if not metrics:
+            with self._lock:
+                metrics = dict(self._metrics)
+
+        try:
+            loaded = [
+                {
+                    "model": m.get("name") or m.get("model"),
+                    "size_vram": m.get("size_vram"),
+                    "expires_at": m.get("expires_at"),
+                }
+                for m in self.client.ps().get("models") or []
+            ]
+        except Exception as e:
+            loaded = {"error": f"{type(e).__name__}: {e}"}
+
+        return {
+            "preload": self.models,
+            "keep_alive": dict(settings.MODEL_KEEP_ALIVE),
+            "ping_interval": self.interval,
+            "loaded": loaded,
+            "metrics": metrics,
+            "events": self.events(),
+        }
+
+
+# ======================================================
+# PROCESS-WIDE INSTANCE
+# ======================================================
+_residency: Optional[ModelResidency] = None
+_residency_lock = threading.Lock()
+
+
+def get_model_residency() -> ModelResidency:
+    global _residency
+    with _residency_lock:
+        if _residency is None:
+            _residency = ModelResidency(
+                redis_client=redis.Redis(
+                    host=settings.REDIS_HOST,
+                    port=settings.REDIS_PORT,
+                    db=settings.REDIS_DB,
+                    decode_responses=True,
+                    socket_connect_timeout=2,
+                    retry=Retry(NoBackoff(), 1),
+                ),
+            )
+        return _residency
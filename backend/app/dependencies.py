@@ -1,4 +1,5 @@
 # app/dependencies.py
+from typing import Optional
 from fastapi import Depends, HTTPException, Header
 from sqlalchemy.orm import Session
 from app.database.postgres import SessionLocal
@@ -50,3 +51,16 @@ def get_current_user(
         raise HTTPException(status_code=401, detail="Tài khoản đã bị khóa")
 
     return user
+
+
+# ----------------------
+# Get current user (không bắt buộc)
+# ----------------------
+def get_optional_user(
+    authorization: str = Header(None),
+    db: Session = Depends(get_db)
+) -> Optional[User]:
+    # không gửi token → None; có token thì phải hợp lệ như get_current_user
+    if not authorization:
+        return None
+    return get_current_user(authorization, db)
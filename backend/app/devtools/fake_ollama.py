@@ -0,0 +1,609 @@
+# backend/app/devtools/fake_ollama.py
+"""
+Fake Ollama server (deterministic) cho load test / regression test không cần GPU.
+
+- /api/chat, /api/generate: stream (NDJSON, chunked) và non-stream
+- Latency (time-to-first-token) theo phân phối cấu hình + tốc độ sinh token/giây
+- Prompt eval theo tốc độ prefill, có KV cache theo prefix (mỗi slot nhớ prompt gần nhất
+  như Ollama) → prefix cố định (system prompt) không bị tính lại
+- OLLAMA_NUM_PARALLEL giả lập bằng số slot xử lý đồng thời
+- Model residency: load model tốn load_seconds, hết keep_alive / vượt max_loaded → unload
+  (load_duration trong response, /api/ps liệt kê model đang load)
+- Tỉ lệ output JSON hỏng (cắt cụt / rác / bọc markdown) để test retry + salvage
+- Verdict suy ra từ nội dung dòng log → cùng input luôn cho cùng output
+
+Chạy:
+
+    cd backend
+    python -m app.devtools.fake_ollama --latency lognormal:0.8,0.4 --tokens-per-sec 40 --malformed-rate 0.05
+
+rồi trỏ pipeline vào (Celery worker / API đọc từ Settings):
+
+    OLLAMA_API_URL=http://127.0.0.1:11435/api/generate
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.threat_detector import ThreatDetector
+
+CHARS_PER_TOKEN = 4
+STREAM_TICK = 0.02  # giây giữa 2 chunk stream (gom nhiều token / chunk)
+
+_DENY = re.compile(r"\baction=(?:deny|drop|block|reject)\b", re.IGNORECASE)
+_AUTH_FAIL = re.compile(r"failed (?:login|password|auth)|authentication fail|invalid user", re.IGNORECASE)
+_SENSITIVE_PORT = re.compile(r"\bdst_port=(?:22|23|445|1433|3306|3389|5900)\b")
+_SRC = re.compile(r"\bsrc=(\d{1,3}(?:\.\d{1,3}){3})")
+_DST = re.compile(r"\bdst=(\d{1,3}(?:\.\d{1,3}){3})")
+_TIME = re.compile(r"\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}")
+_ACTION = re.compile(r"\baction=(\w+)", re.IGNORECASE)
+_PROTO = re.compile(r"\bprotocol=(\w+)", re.IGNORECASE)
+_NUMBERED_LINE = re.compile(r"^\s*\[?(\d+)[\]|:\t]\s?(.*)$")
+
+
+# ======================================================
+# LATENCY DISTRIBUTION
+# ======================================================
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """
+    "fixed:0.5" | "uniform:0.2,1.0" | "normal:0.8,0.2" | "lognormal:0.8,0.4" (median, sigma) | "exp:0.8"
+    """
+    kind, _, args = spec.partition(":")
+    params = [float(x) for x in args.split(",") if x.strip()]
+    kind = kind.strip().lower()
+
+    if kind == "fixed":
+        return lambda rng: params[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(params[0], params[1])
+    if kind == "normal":
+        return lambda rng: max(0.0, rng.gauss(params[0], params[1]))
+    if kind == "lognormal":
+        mu = math.log(params[0]) if params[0] > 0 else 0.0
+        return lambda rng: rng.lognormvariate(mu, params[1])
+    if kind == "exp":
+        return lambda rng: rng.expovariate(1 / params[0]) if params[0] > 0 else 0.0
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+# ======================================================
+# VERDICT TỪ NỘI DUNG LOG
+# ======================================================
+def parse_keep_alive(value: Any) -> Optional[float]:
+    """
+    keep_alive của Ollama → giây ("30m", "1h", "45s", 300, "0"); None = giữ mãi (số âm)
+    """
+    if value is None or value == "":
+        return 300.0
+    if isinstance(value, (int, float)):
+        return None if value < 0 else float(value)
+    text = str(value).strip()
+    match = re.fullmatch(r"(-?\d+(?:\.\d+)?)(ms|s|m|h)?", text)
+    if not match:
+        return 300.0
+    amount = float(match.group(1))
+    if amount < 0:
+        return None
+    return amount * {"ms": 0.001, "s": 1, "m": 60, "h": 3600, None: 1}[match.group(2)]
+
+
+def derive_verdict(line: str) -> Dict[str, Any]:
+    """
+    Verdict deterministic theo nội dung dòng (không có model thật).
+    confidence lấy từ hash của dòng → ổn định giữa các lần chạy, trải đều 55-99.
+    """
+    confidence = 55 + int(hashlib.sha1(line.encode("utf-8", "ignore")).hexdigest()[:4], 16) % 45
+    threat = ThreatDetector.first_match(line)
+
+    if threat:
+        risk, threat_type, is_threat = "high", "suspicious_activity", True
+        summary = f"{threat} pattern detected"
+    elif _AUTH_FAIL.search(line):
+        risk, threat_type, is_threat = "medium", "authentication_failure", True
+        summary = "Authentication failure"
+    elif _DENY.search(line) and _SENSITIVE_PORT.search(line):
+        risk, threat_type, is_threat = "medium", "suspicious_activity", True
+        summary = "Blocked connection to sensitive service port"
+    elif _DENY.search(line):
+        risk, threat_type, is_threat = "low", "normal", False
+        summary = "Blocked traffic"
+    else:
+        risk, threat_type, is_threat = "none", "normal", False
+        summary = "Normal traffic"
+
+    src = _SRC.search(line)
+    dst = _DST.search(line)
+    ts = _TIME.search(line)
+    action = _ACTION.search(line)
+    proto = _PROTO.search(line)
+    return {
+        "risk_level": risk,
+        "threat_type": threat_type,
+        "is_threat": is_threat,
+        "confidence": confidence,
+        "summary": summary,
+        "details": {
+            "source_ip": src.group(1) if src else None,
+            "dest_ip": dst.group(1) if dst else None,
+            "timestamp": ts.group(0) if ts else None,
+            "action": action.group(1) if action else "",
+            "protocol": proto.group(1) if proto else "",
+        },
+    }
+
+
+def extract_logs(prompt: str) -> Optional[List[str]]:
+    """
+    Lấy danh sách dòng log từ prompt của AIProcessor / threat hunt.
+    None → prompt không phải prompt phân tích log (chatbot, ...).
+    """
+    marker = prompt.find("INPUT LOGS:")
+    if marker >= 0:
+        rest = prompt[marker + len("INPUT LOGS:"):]
+        if rest.lstrip().startswith("["):
+            # prompt cũ: json.dumps(logs)
+            try:
+                logs, _ = json.JSONDecoder().raw_decode(rest.lstrip())
+                if isinstance(logs, list):
+                    return [str(x) for x in logs]
+            except json.JSONDecodeError:
+                pass
+        # payload dạng đánh số "<index>| <line>"
+        numbered = [
+            m.group(2)
+            for m in map(_NUMBERED_LINE.match, prompt[marker:].splitlines()[1:])
+            if m
+        ]
+        return numbered
+
+    marker = prompt.find("### Dữ liệu log")
+    if marker >= 0:
+        body = prompt[marker:].split("\n", 1)[1] if "\n" in prompt[marker:] else ""
+        return [line.strip() for line in body.splitlines() if line.strip()]
+
+    return None
+
+
+def build_content(prompt: str) -> str:
+    """
+    Output "model" cho prompt: {"results": [...]} cho AIProcessor,
+    JSON array cho threat hunt prompt, text thường cho chatbot
+    """
+    logs = extract_logs(prompt)
+    if logs is None:
+        return "This is a simulated response from the fake Ollama server."
+
+    if "### Dữ liệu log" in prompt and "INPUT LOGS:" not in prompt:
+        items = []
+        for line in logs:
+            v = derive_verdict(line)
+            items.append({
+                "timestamp": v["details"]["timestamp"],
+                "source_ip": v["details"]["source_ip"],
+                "dest_ip": v["details"]["dest_ip"],
+                "protocol": v["details"]["protocol"],
+                "action": v["details"]["action"],
+                "is_threat": v["is_threat"],
+                "threat_type": v["threat_type"] if v["is_threat"] else "None",
+                "ai_confidence": v["confidence"],
+                "evidence": v["summary"],
+            })
+        return json.dumps(items, ensure_ascii=False)
+
+    results = []
+    for i, line in enumerate(logs):
+        v = derive_verdict(line)
+        v["details"] = {k: v["details"][k] for k in ("source_ip", "timestamp", "action")}
+        results.append({"index": i, **v})
+    return json.dumps({"results": results}, ensure_ascii=False)
+
+
+def corrupt(content: str, rng: random.Random, constrained: bool = False) -> str:
+    """
+    Làm hỏng output giống lỗi thường gặp của LLM.
+    constrained (request có `format`) → grammar chặn text ngoài JSON, chỉ còn bị cắt
+    """
+    mode = "truncate" if constrained else rng.choice(("truncate", "garbage", "markdown"))
+    if mode == "truncate":
+        return content[: max(1, int(len(content) * rng.uniform(0.3, 0.9)))]
+    if mode == "garbage":
+        return "I'm sorry, I cannot analyze these logs right now."
+    return f"Here is the analysis:\n```json\n{content}\n```\nLet me know if you need more."
+
+
+# ======================================================
+# SERVER
+# ======================================================
+class FakeOllamaState:
+    """
+    Cấu hình + counters dùng chung giữa các handler thread
+    """
+
+    def __init__(
+        self,
+        latency: str = "fixed:0",
+        tokens_per_sec: float = 0.0,
+        malformed_rate: float = 0.0,
+        parallel: int = 4,
+        seed: int = 0,
+        prefill_tokens_per_sec: float = 0.0,
+        load_seconds: float = 0.0,
+        max_loaded: int = 0,
+    ):
+        self.latency_spec = latency
+        self.latency = parse_latency(latency)
+        self.tokens_per_sec = tokens_per_sec
+        self.prefill_tokens_per_sec = prefill_tokens_per_sec
+        self.malformed_rate = malformed_rate
+        self.parallel = parallel
+        self.seed = seed
+        self.slots = threading.BoundedSemaphore(max(parallel, 1))
+        self.load_seconds = load_seconds
+        self.max_loaded = max_loaded  # 0 = không giới hạn (giống OLLAMA_MAX_LOADED_MODELS)
+        # model → expires_at (monotonic), thứ tự LRU
+        self._resident: "OrderedDict[str, float]" = OrderedDict()
+        # prompt gần nhất của từng slot, theo model (KV cache reuse)
+        self._kv_cache: Dict[str, deque] = {}
+
+        self._lock = threading.Lock()
+        self.counters: Dict[str, float] = {
+            "requests": 0,
+            "streamed": 0,
+            "malformed": 0,
+            "connections": 0,
+            "prompt_tokens": 0,
+            "prompt_tokens_cached": 0,
+            "output_tokens": 0,
+            "busy_seconds": 0.0,
+            "queue_seconds": 0.0,
+            "model_loads": 0,
+            "model_evictions": 0,
+        }
+
+    def incr(self, key: str, amount: float = 1) -> None:
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self.counters)
+        return {
+            "config": {
+                "latency": self.latency_spec,
+                "tokens_per_sec": self.tokens_per_sec,
+                "prefill_tokens_per_sec": self.prefill_tokens_per_sec,
+                "malformed_rate": self.malformed_rate,
+                "parallel": self.parallel,
+                "seed": self.seed,
+                "load_seconds": self.load_seconds,
+                "max_loaded": self.max_loaded,
+            },
+            **{k: round(v, 3) if isinstance(v, float) else v for k, v in counters.items()},
+        }
+
+    def cached_prefix(self, model: str, prompt: str, keep_alive: bool = True) -> int:
+        """
+        Số ký tự đầu của prompt đã có trong KV cache (prefix chung dài nhất với
+        prompt gần nhất của một slot), rồi ghi prompt này vào cache
+        """
+        with self._lock:
+            recent = self._kv_cache.setdefault(model, deque(maxlen=max(self.parallel, 1)))
+            best = 0
+            for previous in recent:
+                n = min(len(previous), len(prompt))
+                i = 0
+                while i < n and previous[i] == prompt[i]:
+                    i += 1
+                best = max(best, i)
+            if keep_alive:
+                recent.append(prompt)
+            else:
+                # keep_alive=0 → model bị unload sau request, mất cache
+                self._kv_cache.pop(model, None)
+            return best
+
+    def ensure_loaded(self, model: str, keep_alive: Any) -> float:
+        """
+        Đánh dấu model được dùng; trả về số giây phải load (0 nếu model đang nằm sẵn)
+        """
+        now = time.monotonic()
+        ttl = parse_keep_alive(keep_alive)
+        with self._lock:
+            for name, expires_at in list(self._resident.items()):
+                if expires_at <= now:
+                    del self._resident[name]
+                    self._kv_cache.pop(name, None)
+                    self.counters["model_evictions"] += 1
+
+            load = 0.0
+            if model not in self._resident:
+                load = self.load_seconds
+                self.counters["model_loads"] += 1
+                while self.max_loaded > 0 and len(self._resident) >= self.max_loaded:
+                    evicted, _ = self._resident.popitem(last=False)
+                    self._kv_cache.pop(evicted, None)
+                    self.counters["model_evictions"] += 1
+
+            # keep_alive=0 → unload ngay sau request (giữ tới hết request hiện tại)
+            self._resident[model] = now + load + (ttl if ttl is not None else 10 ** 9)
+            self._resident.move_to_end(model)
+            return load
+
+    def resident_models(self) -> List[Dict[str, Any]]:
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "name": name,
+                    "model": name,
+                    "size_vram": 0,
+                    "expires_at": datetime.fromtimestamp(
+                        time.time() + min(expires_at - now, 10 ** 8), timezone.utc
+                    ).isoformat(),
+                }
+                for name, expires_at in self._resident.items()
+                if expires_at > now
+            ]
+
+    def rng_for(self, model: str, prompt: str) -> random.Random:
+        # seed theo nội dung request → cùng prompt luôn cùng latency / lỗi, bất kể thứ tự thread
+        digest = hashlib.sha1(f"{self.seed}|{model}|{prompt}".encode("utf-8", "ignore")).hexdigest()
+        return random.Random(int(digest[:16], 16))
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    state: FakeOllamaState  # gán qua make_server()
+
+    def log_message(self, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        self.state.incr("connections")
+
+    # =====================================================
+    # ROUTES
+    # =====================================================
+
+    def do_GET(self):
+        if self.path == "/api/version":
+            return self._send_json({"version": "0.0.0-fake"})
+        if self.path == "/api/tags":
+            return self._send_json({"models": []})
+        if self.path == "/api/ps":
+            return self._send_json({"models": self.state.resident_models()})
+        if self.path == "/fake/stats":
+            return self._send_json(self.state.snapshot())
+        if self.path == "/":
+            return self._send_text("Ollama is running")
+        self._send_json({"error": "not found"}, status=404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            return self._send_json({"error": "invalid JSON body"}, status=400)
+
+        if self.path == "/api/chat":
+            messages = body.get("messages") or []
+            prompt = "\n".join(str(m.get("content", "")) for m in messages)
+            self._complete(body, prompt, chat=True)
+        elif self.path == "/api/generate":
+            self._complete(body, str(body.get("prompt", "")), chat=False)
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    # =====================================================
+    # COMPLETION
+    # =====================================================
+
+    def _complete(self, body: Dict[str, Any], prompt: str, chat: bool) -> None:
+        state = self.state
+        model = body.get("model") or "fake"
+        stream = body.get("stream", True)  # giống Ollama: mặc định stream
+        rng = state.rng_for(model, prompt)
+
+        content = build_content(prompt) if prompt else ""
+        if content and rng.random() < state.malformed_rate:
+            content = corrupt(content, rng, constrained=bool(body.get("format")))
+            state.incr("malformed")
+
+        keep_alive = str(body.get("keep_alive", "5m")) not in ("0", "0s", "0m")
+        prompt_tokens = math.ceil(len(prompt) / CHARS_PER_TOKEN)
+        output_tokens = math.ceil(len(content) / CHARS_PER_TOKEN)
+        first_token = state.latency(rng)
+
+        state.incr("requests")
+        state.incr("prompt_tokens", prompt_tokens)
+        state.incr("output_tokens", output_tokens)
+
+        queued = time.perf_counter()
+        with state.slots:
+            started = time.perf_counter()
+            state.incr("queue_seconds", started - queued)
+
+            load = state.ensure_loaded(model, body.get("keep_alive", "5m"))
+            time.sleep(load)
+
+            # giống Ollama: prompt_eval_count chỉ tính phần không có trong KV cache
+            cached_tokens = state.cached_prefix(model, prompt, keep_alive) // CHARS_PER_TOKEN
+            eval_tokens = max(prompt_tokens - cached_tokens, 1)
+            prefill = eval_tokens / state.prefill_tokens_per_sec if state.prefill_tokens_per_sec > 0 else 0.0
+            state.incr("prompt_tokens_cached", prompt_tokens - eval_tokens)
+            time.sleep(first_token + prefill)
+
+            meta = {
+                "load_duration": int(load * 1e9),
+                "prompt_eval_count": eval_tokens,
+                "prompt_eval_duration": int((first_token + prefill) * 1e9),
+                "eval_count": output_tokens,
+            }
+            if stream:
+                state.incr("streamed")
+                self._stream(model, content, chat, meta, started)
+            else:
+                if state.tokens_per_sec > 0:
+                    time.sleep(output_tokens / state.tokens_per_sec)
+                self._send_json(self._message(model, content, chat, done=True, meta=meta, started=started))
+
+            state.incr("busy_seconds", time.perf_counter() - started)
+
+    def _stream(self, model: str, content: str, chat: bool, meta: Dict[str, Any], started: float) -> None:
+        # started: lúc nhận slot → total_duration gồm cả load + prefill như Ollama
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        tps = self.state.tokens_per_sec
+        per_chunk = max(1, int(tps * STREAM_TICK)) if tps > 0 else 64
+        step = per_chunk * CHARS_PER_TOKEN
+
+        try:
+            for pos in range(0, len(content), step):
+                piece = content[pos:pos + step]
+                self._write_chunk(self._message(model, piece, chat, done=False))
+                if tps > 0:
+                    time.sleep(per_chunk / tps)
+            self._write_chunk(self._message(model, "", chat, done=True, meta=meta, started=started))
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+    @staticmethod
+    def _message(
+        model: str,
+        content: str,
+        chat: bool,
+        done: bool,
+        meta: Optional[Dict[str, Any]] = None,
+        started: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        data: Dict[str, Any] = {
+            "model": model,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "done": done,
+        }
+        if chat:
+            data["message"] = {"role": "assistant", "content": content}
+        else:
+            data["response"] = content
+
+        if done:
+            total = time.perf_counter() - started if started else 0.0
+            data.update({
+                "done_reason": "stop",
+                "total_duration": int(total * 1e9),
+                "load_duration": 0,
+                **(meta or {}),
+                "eval_duration": max(
+                    int(total * 1e9)
+                    - (meta or {}).get("prompt_eval_duration", 0)
+                    - (meta or {}).get("load_duration", 0),
+                    0,
+                ),
+            })
+        return data
+
+    # =====================================================
+    # HTTP HELPERS
+    # =====================================================
+
+    def _write_chunk(self, data: Dict[str, Any]) -> None:
+        line = (json.dumps(data, ensure_ascii=False) + "\n").encode()
+        self.wfile.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+        self.wfile.flush()
+
+    def _send_json(self, data: Dict[str, Any], status: int = 200) -> None:
+        payload = json.dumps(data, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _send_text(self, text: str) -> None:
+        payload = text.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def make_server(host: str = "127.0.0.1", port: int = 0, **config) -> Tuple[ThreadingHTTPServer, FakeOllamaState]:
+    state = FakeOllamaState(**config)
+    handler = type("BoundFakeOllamaHandler", (FakeOllamaHandler,), {"state": state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server, state
+
+
+def start_in_thread(host: str = "127.0.0.1", port: int = 0, **config) -> Tuple[ThreadingHTTPServer, FakeOllamaState, str]:
+    """
+    Chạy server nền (benchmark / test), trả về (server, state, base_url).
+    Gọi server.shutdown() khi xong.
+    """
+    server, state = make_server(host, port, **config)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state, f"http://{host}:{server.server_port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Deterministic fake Ollama server")
+    parser.add_argument("--host", default=settings.FAKE_OLLAMA_HOST)
+    parser.add_argument("--port", type=int, default=settings.FAKE_OLLAMA_PORT)
+    parser.add_argument("--latency", default=settings.FAKE_OLLAMA_LATENCY,
+                        help="fixed:S | uniform:A,B | normal:MEAN,STD | lognormal:MEDIAN,SIGMA | exp:MEAN")
+    parser.add_argument("--tokens-per-sec", type=float, default=settings.FAKE_OLLAMA_TOKENS_PER_SEC,
+                        help="0 = output trả về ngay")
+    parser.add_argument("--prefill-tokens-per-sec", type=float, default=settings.FAKE_OLLAMA_PREFILL_TOKENS_PER_SEC,
+                        help="tốc độ eval prompt (phần không có trong KV cache); 0 = miễn phí")
+    parser.add_argument("--malformed-rate", type=float, default=settings.FAKE_OLLAMA_MALFORMED_RATE)
+    parser.add_argument("--parallel", type=int, default=settings.FAKE_OLLAMA_PARALLEL,
+                        help="số request xử lý đồng thời (giống OLLAMA_NUM_PARALLEL)")
+    parser.add_argument("--seed", type=int, default=settings.FAKE_OLLAMA_SEED)
+    parser.add_argument("--load-seconds", type=float, default=settings.FAKE_OLLAMA_LOAD_SECONDS,
+                        help="thời gian load model khi model chưa nằm trong memory")
+    parser.add_argument("--max-loaded", type=int, default=settings.FAKE_OLLAMA_MAX_LOADED,
+                        help="số model load cùng lúc (giống OLLAMA_MAX_LOADED_MODELS), 0 = không giới hạn")
+    args = parser.parse_args()
+
+    server, state = make_server(
+        args.host,
+        args.port,
+        latency=args.latency,
+        tokens_per_sec=args.tokens_per_sec,
+        prefill_tokens_per_sec=args.prefill_tokens_per_sec,
+        malformed_rate=args.malformed_rate,
+        parallel=args.parallel,
+        seed=args.seed,
+        load_seconds=args.load_seconds,
+        max_loaded=args.max_loaded,
+    )
+    print(f"[FAKE-OLLAMA] Listening on http://{args.host}:{server.server_port} {state.snapshot()['config']}")
+    print(f"[FAKE-OLLAMA] OLLAMA_API_URL=http://{args.host}:{server.server_port}/api/generate")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"[FAKE-OLLAMA] Stopped {state.snapshot()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -39,5 +39,6 @@ class AnalysisJob(Base):
     summary = Column(JSONB, nullable=True)
     timeline = Column(JSONB, nullable=True)
     analysis_text = Column(Text, nullable=True)
+    telemetry = Column(JSONB, nullable=True)  # LLMTelemetry.summary()
 
     creator = relationship("User", back_populates="created_jobs")
@@ -1,6 +1,6 @@
 # app/models/analysis_log.py
 
-from sqlalchemy import Column, Text, ForeignKey, Integer, text, DateTime
+from sqlalchemy import Column, Text, ForeignKey, Integer, String, text, DateTime
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import UUID
 import uuid
@@ -20,6 +20,9 @@ class AnalysisLog(Base):
     raw_log = Column(Text)
     parsed_result = Column(Text)
     threat_result = Column(Text)
+    # verdict trong parsed_result đến từ model / prompt nào (NULL = chưa có verdict dùng lại được)
+    model_name = Column(String(255), nullable=True)
+    prompt_version = Column(String(32), nullable=True)
     dataset_id = Column(
         Integer,
         ForeignKey("log_datasets.id"),
@@ -27,6 +30,8 @@ class AnalysisLog(Base):
     )
     
     time_stamp = Column(DateTime, index = True)
+    # số thứ tự dòng trong file của dataset (LineIndex) → lấy context quanh dòng
+    line_index = Column(Integer, nullable=True)
     
     created_by = Column(Integer, nullable = False)
 
@@ -27,7 +27,8 @@ class LogDataset(Base):
 
     # File info
     file_path = Column(String(500), nullable=False)
-    log_format = Column(String(50))  # raw, csv, json
+    log_format = Column(String(50))  # json, csv, kv, syslog_*, vendor, unknown (None / raw = chưa detect)
+    content_hash = Column(String(64), index=True)  # sha256 nội dung file → upload trùng dùng lại dataset
 
     # Time coverage
     time_range_start = Column(DateTime)
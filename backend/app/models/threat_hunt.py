@@ -157,6 +157,7 @@ class HuntExecution(Base):
     started_at = Column(DateTime)
     finished_at = Column(DateTime)
     error = Column(Text)
+    telemetry = Column(JSONB, nullable=True)  # LLMTelemetry.summary()
 
     hunt = relationship("HuntSession", back_populates="executions")
 
@@ -190,6 +191,8 @@ class HuntFinding(Base):
 
     mitre_technique = Column(String(100))
     evidence = Column(JSONB)
+    # dòng trong file của dataset (AnalysisLog.line_index) → GET /{hunt_id}/findings/{id}/context
+    line_index = Column(Integer, nullable=True)
 
     hunt = relationship("HuntSession", back_populates="findings")
 
@@ -3,8 +3,8 @@
 from typing import List
 
 def build_threat_hunt_prompt(log_entries: List[str], user_query: str = "") -> str:
-    max_lines = 1500
-    joined = "\n".join(log_entries[:max_lines])
+    # không cắt dòng ở đây: threat_service.chunk_lines chia chunk vừa context
+    joined = "\n".join(log_entries)
 
     query = user_query.strip() or (
         "Phân tích toàn bộ log và phát hiện TẤT CẢ hành vi: "
@@ -12,6 +12,8 @@ class AnalysisJobCreate(BaseModel):
     time_range_from: Optional[datetime] = None
     time_range_to: Optional[datetime] = None
     device_ids: Optional[List[int]] = None
+    # cùng nội dung file + model đã có job completed → trả về job đó thay vì phân tích lại
+    reuse_existing: bool = True
 
 class AnalysisJobOut(BaseModel):
     id: UUID
@@ -38,6 +40,7 @@ class AnalysisJobOut(BaseModel):
 
     summary: Optional[Dict[str, Any]] = None
     timeline: Optional[List[Dict[str, Any]]] = None
+    telemetry: Optional[Dict[str, Any]] = None
 
     analysis_text: Optional[str] = None
 
@@ -53,3 +56,8 @@ class LogOut(BaseModel):
 
     class Config:
         orm_mode = True
+
+
+class UploadInit(BaseModel):
+    filename: str
+    size: int  # tổng số byte của file
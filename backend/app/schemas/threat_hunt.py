@@ -68,6 +68,7 @@ class FindingItem(BaseModel):
 
     mitre_technique: Optional[str] = None
     evidence: Optional[dict] = None
+    line_index: Optional[int] = None
 
 
 class HuntFindingsResponse(BaseModel):
@@ -0,0 +1,28 @@
+# backend/app/schemas/verdict.py
+from typing import List, Literal, Optional
+
+from pydantic import BaseModel, Field
+
+
+class VerdictDetails(BaseModel):
+    source_ip: Optional[str] = None
+    timestamp: Optional[str] = None
+    action: Optional[str] = ""
+
+
+class BatchVerdict(BaseModel):
+    """
+    Một phần tử trong mảng "results" mà AIProcessor yêu cầu model trả về
+    """
+    index: int = Field(ge=0)
+    risk_level: Literal["none", "low", "medium", "high", "critical"]
+    threat_type: str
+    is_threat: bool
+    confidence: int = Field(ge=0, le=100)
+    summary: str
+    details: VerdictDetails = Field(default_factory=VerdictDetails)
+    recommendations: List[str] = Field(default_factory=list)
+
+
+class BatchVerdicts(BaseModel):
+    results: List[BatchVerdict]
@@ -1,10 +1,34 @@
 # backend/app/services/ai_processor.py
 
-import ollama
+import copy
+import hashlib
 import json
-import re
-from typing import List, Dict, Any
+import time
+from typing import List, Dict, Any, Callable, Optional, Tuple
+from pydantic import TypeAdapter, ValidationError
 from app.core.config import settings
+from app.schemas.verdict import BatchVerdict, BatchVerdicts
+from app.services.log_parser import LogParser
+from app.services.pipeline_stats import PipelineStats
+from app.utils.exceptions import OllamaConnectionError, OllamaResponseError
+from app.utils.json_stream import ResultStreamParser
+from app.utils.json_extract import extract_array
+from app.core.model_residency import get_model_residency, keep_alive_for
+from app.utils.ollama_client import get_ollama_client, last_queue_wait
+from app.services.llm_telemetry import record_llm_call
+
+# on_result(position trong batch, normalized result) - gọi ngay khi một result có verdict
+ResultCallback = Callable[[int, Dict[str, Any]], None]
+
+# Validator build 1 lần (pydantic-core), dùng cho OLLAMA_OUTPUT_FORMAT=json|schema
+_BATCH_ADAPTER = TypeAdapter(BatchVerdicts)
+_VERDICT_ADAPTER = TypeAdapter(BatchVerdict)
+OUTPUT_FORMATS = ("none", "json", "schema")
+
+# result["source"]: tầng nào cho ra verdict của dòng
+#   rule (prefilter) / cache (template) / cluster (Drain) / vector (nearest-neighbour)
+#   / llm (model trả trực tiếp) / fallback (_safe_fallback)
+VERDICT_SOURCES = ("rule", "cache", "cluster", "vector", "llm", "fallback")
 
 
 class AIProcessor:
@@ -23,72 +47,539 @@ class AIProcessor:
     # =====================================================
 
     @staticmethod
-    def analyze_batch(logs: List[str]) -> List[Dict[str, Any]]:
+    def analyze_batch(
+        logs: List[str],
+        stats: Optional[PipelineStats] = None,
+        retry_budget: Optional[int] = None,
+        on_result: Optional[ResultCallback] = None,
+        model: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Phân tích batch, kết quả luôn align với `logs`.
+        model=None → settings.OLLAMA_MODEL
+
+        OLLAMA_STREAMING=True → on_result được gọi cho từng dòng ngay khi object
+        tương ứng trong mảng "results" đóng ngoặc (không chờ hết batch).
+
+        Khi output của model hỏng một phần:
+        - giữ các result object hợp lệ, chỉ gửi lại các index còn thiếu
+        - lỗi lặp lại → chia đôi batch, cho đến khi mỗi dòng có verdict thật
+          hoặc hết retry_budget (số lần gọi thêm / batch) → _safe_fallback
+        """
         if not logs:
             print("[AI] ⚠️ Batch rỗng")
             return []
 
         print(f"[AI] 🚀 Bắt đầu phân tích batch {len(logs)} logs")
-        print(f"[AI] Model đang dùng: {settings.OLLAMA_MODEL}")
+        model = model or settings.OLLAMA_MODEL
+        print(f"[AI] Model đang dùng: {model}")
 
-        prompt = AIProcessor._build_batch_prompt(logs)
-        print(f"[AI] 📤 Gửi prompt đến Ollama (độ dài: {len(prompt)} ký tự)")
+        stats = stats or PipelineStats()
+        budget = [settings.AI_RETRY_BUDGET if retry_budget is None else retry_budget]
+        results: List[Optional[Dict[str, Any]]] = [None] * len(logs)
 
-        try:
-            print("[AI] ⏳ Đang gọi ollama.chat()...")
-            response = ollama.chat(
-                model=settings.OLLAMA_MODEL,
-                messages=[{"role": "user", "content": prompt}],
-                options={
-                    "temperature": 0.1,
-                    "num_ctx": 8192,  # tăng lên để tránh cắt prompt
-                },
-            )
+        AIProcessor._resolve(logs, list(range(len(logs))), results, budget, stats, on_result, model=model)
+
+        missing = [i for i, r in enumerate(results) if r is None]
+        if missing:
+            print(f"[AI] ⚠️ Dùng fallback cho {len(missing)}/{len(logs)} logs")
+            stats.incr("retry.fallback_lines", len(missing))
+
+        return [
+            r if r is not None else AIProcessor._safe_fallback(logs[i])
+            for i, r in enumerate(results)
+        ]
 
-            content = response["message"]["content"]
-            print(f"[AI] ✅ Ollama trả về (độ dài: {len(content)} ký tự):")
-            print("-" * 60)
-            print(content[:2000])  # in 2000 ký tự đầu
-            if len(content) > 2000:
-                print("... (còn lại bị cắt để hiển thị)")
-            print("-" * 60)
+    # =====================================================
+    # CASCADE (model nhỏ trước → leo thang lên model lớn)
+    # =====================================================
+
+    @staticmethod
+    def cascade_profile(name: Optional[str]) -> Optional[Dict[str, Any]]:
+        """
+        Profile cascade theo tên (AnalysisJob.model_name).
+        Không phải tên profile → None (job chạy một model như cũ).
+        """
+        profiles = {
+            "cascade": {
+                "small": settings.CASCADE_SMALL_MODEL,
+                "large": settings.CASCADE_LARGE_MODEL or settings.OLLAMA_MODEL,
+                "min_confidence": settings.CASCADE_MIN_CONFIDENCE,
+            },
+            **settings.CASCADE_PROFILES,
+        }
+        profile = profiles.get(name or "")
+        if not profile:
+            return None
+        return {
+            "name": name,
+            "small": profile.get("small", settings.CASCADE_SMALL_MODEL),
+            "large": profile.get("large") or settings.OLLAMA_MODEL,
+            "min_confidence": int(profile.get("min_confidence", settings.CASCADE_MIN_CONFIDENCE)),
+        }
 
-            content = AIProcessor._clean_json(content)
-            print(f"[AI] 🧹 Sau khi clean JSON: {content[:500]}...")
+    @staticmethod
+    def needs_escalation(result: Dict[str, Any], min_confidence: int) -> bool:
+        """
+        Dòng phải chạy lại trên model lớn: nghi là threat, confidence thấp, hoặc model nhỏ
+        không trả được verdict
+        """
+        return (
+            AIProcessor.is_fallback(result)
+            or bool(result.get("is_threat"))
+            or result.get("confidence", 0) < min_confidence
+        )
 
-            parsed = json.loads(content)
-            results = parsed.get("results", [])
+    @staticmethod
+    def analyze_cascade(
+        logs: List[str],
+        profile: Dict[str, Any],
+        stats: Optional[PipelineStats] = None,
+        on_result: Optional[ResultCallback] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Giống analyze_batch nhưng chạy model nhỏ cho cả batch trước,
+        chỉ gửi các dòng needs_escalation() lên model lớn.
 
-            if not isinstance(results, list):
-                raise ValueError(f"results không phải list: {results}")
+        on_result chỉ được gọi cho verdict cuối cùng (verdict model nhỏ sắp bị
+        thay thế thì không stream ra).
+        """
+        if not logs:
+            return []
 
-            print(f"[AI] ✅ Parse JSON thành công, có {len(results)} kết quả")
+        stats = stats or PipelineStats()
+        min_confidence = profile["min_confidence"]
+
+        def on_small(pos: int, result: Dict[str, Any]) -> None:
+            if on_result is not None and not AIProcessor.needs_escalation(result, min_confidence):
+                on_result(pos, result)
+
+        # model nhỏ: không retry — dòng parse hỏng leo thang luôn, rẻ hơn gọi lại.
+        # parse / residency vẫn ghi vào stats của job, riêng retry tách sang cascade.small_retry
+        started = time.perf_counter()
+        results = AIProcessor.analyze_batch(
+            logs, stats=stats.redirect("retry", "cascade.small_retry"), retry_budget=0,
+            on_result=on_small, model=profile["small"],
+        )
+        stats.incr("cascade.small_lines", len(logs))
+        stats.incr("cascade.small_seconds", time.perf_counter() - started)
+
+        escalate = [i for i, r in enumerate(results) if AIProcessor.needs_escalation(r, min_confidence)]
+        stats.incr("cascade.small_unparsed", sum(1 for i in escalate if AIProcessor.is_fallback(results[i])))
+        if not escalate:
+            return results
+
+        print(f"[AI] ⬆️ Cascade: {len(escalate)}/{len(logs)} dòng lên {profile['large']}")
+
+        def on_large(local_idx: int, result: Dict[str, Any]) -> None:
+            if on_result is not None:
+                on_result(escalate[local_idx], result)
+
+        started = time.perf_counter()
+        escalated = AIProcessor.analyze_batch(
+            [logs[i] for i in escalate], stats=stats, on_result=on_large, model=profile["large"],
+        )
+        stats.incr("cascade.large_lines", len(escalate))
+        stats.incr("cascade.large_seconds", time.perf_counter() - started)
+
+        for i, result in zip(escalate, escalated):
+            results[i] = result
+        return results
 
-            normalized: List[Dict] = []
-            for i, r in enumerate(results):
-                norm = AIProcessor._normalize_result(r, logs[i])
-                threat_status = "🚨 THREAT" if norm["is_threat"] else "✅ normal"
-                print(f"[AI] Log {i+1}: {threat_status} | risk={norm['risk_level']} | confidence={norm['confidence']} | type={norm['threat_type']}")
-                normalized.append(norm)
+    @staticmethod
+    def cascade_report(stats: PipelineStats, profile: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Số dòng mỗi tầng xử lý + speedup ước lượng so với chạy toàn bộ trên model lớn
+        (chi phí / dòng của model lớn đo trên chính các dòng được leo thang)
+        """
+        cascade = stats.section("cascade")
+        small_lines = int(cascade.get("small_lines", 0))
+        large_lines = int(cascade.get("large_lines", 0))
+        elapsed = cascade.get("small_seconds", 0) + cascade.get("large_seconds", 0)
 
-            return normalized
+        speedup = None
+        if large_lines and elapsed:
+            large_only = cascade["large_seconds"] / large_lines * small_lines
+            speedup = round(large_only / elapsed, 2)
 
-        except json.JSONDecodeError as e:
-            print(f"[AI] ❌ JSON parse failed: {e}")
-            print(f"[AI] Nội dung thô từ Ollama: {content if 'content' in locals() else 'N/A'}")
-        except ollama.ResponseError as e:
+        return {
+            "profile": profile["name"],
+            "small_model": profile["small"],
+            "large_model": profile["large"],
+            "min_confidence": profile["min_confidence"],
+            "small_lines": small_lines,
+            "resolved_by_small": small_lines - large_lines,
+            "escalated_lines": large_lines,
+            "small_unparsed": int(cascade.get("small_unparsed", 0)),
+            "escalation_rate": round(large_lines / small_lines * 100, 2) if small_lines else 0,
+            "llm_seconds": round(elapsed, 2),
+            "estimated_speedup": speedup,
+        }
+
+    @staticmethod
+    def _resolve(
+        logs: List[str],
+        positions: List[int],
+        results: List[Optional[Dict[str, Any]]],
+        budget: List[int],
+        stats: PipelineStats,
+        on_result: Optional[ResultCallback] = None,
+        failed_before: bool = False,
+        model: Optional[str] = None,
+    ) -> None:
+        """
+        Gửi logs[positions] lên model, điền vào results theo đúng index gốc
+        """
+        def accept(local_idx: int, raw: Dict[str, Any]) -> None:
+            pos = positions[local_idx]
+            if results[pos] is not None:
+                return
+            try:
+                results[pos] = AIProcessor._normalize_result(raw, logs[pos])
+            except (TypeError, ValueError) as e:
+                print(f"[AI] ⚠️ Result #{pos} không hợp lệ: {e}")
+                return
+            if on_result is not None:
+                on_result(pos, results[pos])
+
+        sub_logs = [logs[p] for p in positions]
+        parsed = AIProcessor._request_results(sub_logs, on_item=accept, model=model, stats=stats)
+
+        for local_idx, raw in parsed.items():
+            accept(local_idx, raw)
+
+        missing = [p for p in positions if results[p] is None]
+        if not missing:
+            if failed_before or len(positions) < len(logs):
+                stats.incr("retry.recovered_lines", len(positions))
+            return
+
+        if budget[0] <= 0:
+            print(f"[AI] ⚠️ Hết retry budget, còn thiếu {len(missing)} kết quả")
+            stats.incr("retry.exhausted_lines", len(missing))
+            return
+
+        if len(missing) < len(positions) or not failed_before:
+            # Có tiến triển (salvage được một phần) hoặc mới lỗi lần đầu → gửi lại phần thiếu
+            budget[0] -= 1
+            stats.incr("retry.resubmits")
+            print(f"[AI] 🔁 Gửi lại {len(missing)} log còn thiếu")
+            AIProcessor._resolve(
+                logs, missing, results, budget, stats, on_result,
+                failed_before=len(missing) == len(positions),
+                model=model,
+            )
+            return
+
+        if len(missing) == 1:
+            stats.incr("retry.exhausted_lines")
+            return
+
+        # Lỗi lặp lại trên cùng tập log → chia đôi
+        mid = len(missing) // 2
+        stats.incr("retry.bisections")
+        print(f"[AI] ✂️ Chia đôi {len(missing)} log → {mid} + {len(missing) - mid}")
+        for half in (missing[:mid], missing[mid:]):
+            if budget[0] <= 0:
+                stats.incr("retry.exhausted_lines", len(half))
+                continue
+            budget[0] -= 1
+            AIProcessor._resolve(logs, half, results, budget, stats, on_result, model=model)
+
+    @staticmethod
+    def _request_results(
+        logs: List[str],
+        on_item: Optional[Callable[[int, Dict[str, Any]], None]] = None,
+        model: Optional[str] = None,
+        stats: Optional[PipelineStats] = None,
+    ) -> Dict[int, Dict[str, Any]]:
+        """
+        Một lần gọi model. Trả về {index trong `logs`: raw result}
+        (rỗng nếu request lỗi hoặc không parse được gì)
+        """
+        model = model or settings.OLLAMA_MODEL
+        mode = AIProcessor.output_mode()
+        started = time.perf_counter()
+        messages = AIProcessor._build_messages(logs)
+        prompt_build = time.perf_counter() - started
+        options = {
+            "temperature": 0.1,
+            "num_ctx": settings.OLLAMA_NUM_CTX,  # AdaptiveBatcher gom batch vừa ngân sách này
+        }
+        print(f"[AI] 📤 Gửi prompt đến Ollama {model} ({len(logs)} logs, payload: {len(messages[-1]['content'])} ký tự)")
+
+        try:
+            if settings.OLLAMA_STREAMING:
+                items, complete = AIProcessor._stream_results(
+                    messages, options, len(logs), on_item, model, mode, stats, prompt_build
+                )
+            else:
+                print("[AI] ⏳ Đang gọi Ollama /api/chat...")
+                started = time.perf_counter()
+                response = get_ollama_client().chat(
+                    model=model,
+                    messages=messages,
+                    options=options,
+                    keep_alive=keep_alive_for(),
+                    format=AIProcessor._format_param(mode),
+                )
+                call_seconds = time.perf_counter() - started
+                get_model_residency().observe(model, response, stats)
+
+                content = response["message"]["content"]
+                print(f"[AI] ✅ Ollama trả về (độ dài: {len(content)} ký tự):")
+                print("-" * 60)
+                print(content[:2000])  # in 2000 ký tự đầu
+                if len(content) > 2000:
+                    print("... (còn lại bị cắt để hiển thị)")
+                print("-" * 60)
+
+                started = time.perf_counter()
+                if mode == "none":
+                    items, complete = AIProcessor._parse_results(content)
+                else:
+                    items, complete = AIProcessor._validate_results(content)
+                queue = last_queue_wait()
+                record_llm_call(response, call_seconds - queue, queue, prompt_build, time.perf_counter() - started)
+
+        except OllamaResponseError as e:
             print(f"[AI] ❌ Ollama ResponseError: {e}")
-            print(f"[AI] Status code: {e.status_code if hasattr(e, 'status_code') else 'N/A'}")
-        except ollama.RequestError as e:
+            print(f"[AI] Status code: {e.status_code or 'N/A'}")
+            AIProcessor._record_parse(stats, model, mode, len(logs), None)
+            return {}
+        except OllamaConnectionError as e:
             print(f"[AI] ❌ Ollama RequestError (không kết nối được): {e}")
+            AIProcessor._record_parse(stats, model, mode, len(logs), None)
+            return {}
         except Exception as e:
             print(f"[AI] ❌ Lỗi không xác định: {type(e).__name__}: {e}")
             import traceback
             traceback.print_exc()
+            AIProcessor._record_parse(stats, model, mode, len(logs), None)
+            return {}
+
+        aligned = AIProcessor._align_results(items, len(logs), positional=complete)
+        print(f"[AI] ✅ Parse được {len(aligned)}/{len(logs)} kết quả" + ("" if complete else " (salvage)"))
+        AIProcessor._record_parse(stats, model, mode, len(logs), len(aligned))
+        return aligned
+
+    @staticmethod
+    def _stream_results(
+        messages: List[Dict[str, str]],
+        options: Dict[str, Any],
+        size: int,
+        on_item: Optional[Callable[[int, Dict[str, Any]], None]],
+        model: Optional[str] = None,
+        mode: str = "none",
+        stats: Optional[PipelineStats] = None,
+        prompt_build: float = 0.0,
+    ) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Gọi /api/chat (stream=True), chuyển từng result object cho on_item ngay khi đóng.
+        Stream bị cắt giữa chừng → giữ các object đã hoàn chỉnh.
+        mode json/schema → từng object được validate trước khi nhận.
+        """
+        parser = ResultStreamParser()
+        parts: List[str] = []
+        items: List[Dict[str, Any]] = []
+        # parse chạy xen kẽ với stream → cộng dồn riêng để tách khỏi thời gian chờ token
+        parse_seconds = 0.0
+        started = time.perf_counter()
+
+        model = model or settings.OLLAMA_MODEL
+        print("[AI] ⏳ Đang stream Ollama /api/chat...")
+        try:
+            for chunk in get_ollama_client().chat_stream(
+                model=model,
+                messages=messages,
+                options=options,
+                keep_alive=keep_alive_for(),
+                format=AIProcessor._format_param(mode),
+            ):
+                piece = chunk["message"]["content"]
+                parts.append(piece)
+                if chunk.get("done"):
+                    get_model_residency().observe(model, chunk, stats)
+                    queue = last_queue_wait()
+                    record_llm_call(
+                        chunk, time.perf_counter() - started - queue - parse_seconds, queue, prompt_build, parse_seconds
+                    )
+
+                parse_started = time.perf_counter()
+                for item in parser.feed(piece):
+                    if mode != "none":
+                        item = AIProcessor._validate_item(item)
+                        if item is None:
+                            continue
+                    items.append(item)
+                    idx = AIProcessor._item_index(item, size)
+                    if idx is not None and on_item is not None:
+                        on_item(idx, item)
+                parse_seconds += time.perf_counter() - parse_started
+        except Exception as e:
+            if not items:
+                raise
+            print(f"[AI] ⚠️ Stream bị cắt sau {len(items)} kết quả: {type(e).__name__}: {e}")
+            return items, False
+
+        print(f"[AI] ✅ Stream xong ({sum(len(p) for p in parts)} ký tự, {len(items)} kết quả)")
+
+        if not items:
+            # model không trả đúng dạng {"results": [...]} → parse cả response như non-stream
+            content = "".join(parts)
+            if mode == "none":
+                return AIProcessor._parse_results(content)
+            return AIProcessor._validate_results(content)
+        return items, parser.done
+
+    @staticmethod
+    def _item_index(item: Dict[str, Any], size: int) -> Optional[int]:
+        try:
+            idx = int(item.get("index"))
+        except (TypeError, ValueError):
+            return None
+        return idx if 0 <= idx < size else None
+
+    # =====================================================
+    # STRUCTURED OUTPUT (format=json | JSON schema)
+    # =====================================================
+
+    @staticmethod
+    def output_mode() -> str:
+        mode = (settings.OLLAMA_OUTPUT_FORMAT or "none").lower()
+        return mode if mode in OUTPUT_FORMATS else "none"
+
+    @staticmethod
+    def _format_param(mode: str) -> Optional[Any]:
+        """
+        Giá trị `format` gửi Ollama: "json" hoặc JSON schema của {"results": [...]}
+        """
+        if mode == "schema":
+            return AIProcessor.RESULTS_SCHEMA
+        if mode == "json":
+            return "json"
+        return None
+
+    @staticmethod
+    def _validate_results(content: str) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Validate output bằng validator precompiled (không regex clean-up).
+        - Hợp lệ toàn bộ        → (results, True)
+        - JSON đúng, vài item sai → giữ item hợp lệ, (items, False) → retry phần thiếu
+        - JSON hỏng (bị cắt...)  → salvage từng object như mode "none"
+        """
+        try:
+            batch = _BATCH_ADAPTER.validate_json(content)
+            return [r.model_dump() for r in batch.results], True
+        except ValidationError as e:
+            if any(err["type"] != "json_invalid" for err in e.errors()):
+                try:
+                    parsed = json.loads(content)
+                except json.JSONDecodeError:
+                    parsed = None
+                raw_items = parsed.get("results") if isinstance(parsed, dict) else None
+                if isinstance(raw_items, list):
+                    items = [v for v in map(AIProcessor._validate_item, raw_items) if v is not None]
+                    print(f"[AI] ⚠️ Schema: {len(raw_items) - len(items)} result không hợp lệ")
+                    return items, False
+
+        print("[AI] ❌ Structured output không phải JSON hợp lệ → salvage")
+        items, _ = AIProcessor._parse_results(content)
+        return [v for v in map(AIProcessor._validate_item, items) if v is not None], False
+
+    @staticmethod
+    def _validate_item(item: Any) -> Optional[Dict[str, Any]]:
+        try:
+            return _VERDICT_ADAPTER.validate_python(item).model_dump()
+        except ValidationError:
+            return None
+
+    @staticmethod
+    def _record_parse(
+        stats: Optional[PipelineStats],
+        model: str,
+        mode: str,
+        lines: int,
+        parsed: Optional[int],
+    ) -> None:
+        """
+        parsed=None → request lỗi (HTTP / kết nối), không tính vào parse failure
+        """
+        if stats is None:
+            return
+        key = f"parse.{model}|{mode}"
+        if parsed is None:
+            stats.incr(f"{key}.request_errors")
+            return
+        stats.incr(f"{key}.requests")
+        stats.incr(f"{key}.lines", lines)
+        stats.incr(f"{key}.parsed_lines", parsed)
+        if parsed < lines:
+            stats.incr(f"{key}.failed_requests")
+
+    @staticmethod
+    def parse_report(stats: PipelineStats) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """
+        {model: {mode: {...}}} - tỉ lệ parse lỗi để so sánh none / json / schema
+        """
+        grouped: Dict[str, Dict[str, float]] = {}
+        for key, value in stats.section("parse").items():
+            name, counter = key.rsplit(".", 1)
+            grouped.setdefault(name, {})[counter] = value
+
+        report: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        for name, c in grouped.items():
+            model, mode = name.rsplit("|", 1)
+            requests = int(c.get("requests", 0))
+            lines = int(c.get("lines", 0))
+            parsed = int(c.get("parsed_lines", 0))
+            report.setdefault(model, {})[mode] = {
+                "requests": requests,
+                "request_errors": int(c.get("request_errors", 0)),
+                "failed_requests": int(c.get("failed_requests", 0)),
+                "request_failure_rate": round(c.get("failed_requests", 0) / requests * 100, 2) if requests else 0,
+                "lines": lines,
+                "line_failure_rate": round((lines - parsed) / lines * 100, 2) if lines else 0,
+            }
+        return report
+
+    @staticmethod
+    def _parse_results(content: str) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Trả về (result objects, parse_trọn_vẹn).
+        JSON hỏng / bị cắt → giữ các object hoàn chỉnh (xem utils/json_extract).
+        """
+        results, complete = extract_array(content, key="results")
+        if not complete:
+            print(f"[AI] ❌ JSON không hợp lệ → salvage được {len(results)} object")
+        return [r for r in results if isinstance(r, dict)], complete
+
+    @staticmethod
+    def _align_results(
+        items: List[Dict[str, Any]],
+        size: int,
+        positional: bool,
+    ) -> Dict[int, Dict[str, Any]]:
+        """
+        Gán result về index input: ưu tiên field "index",
+        chỉ dùng thứ tự khi parse trọn vẹn và không object nào có index
+        """
+        aligned: Dict[int, Dict[str, Any]] = {}
+        has_index = any("index" in item for item in items)
+
+        if not has_index:
+            if positional and len(items) == size:
+                return dict(enumerate(items))
+            if positional:
+                print(f"[AI] ⚠️ Model trả {len(items)} kết quả cho {size} logs, không có index")
+            return {}
 
-        # Fallback
-        print(f"[AI] ⚠️ Dùng fallback cho {len(logs)} logs")
-        return [AIProcessor._safe_fallback(log) for log in logs]
+        for item in items:
+            idx = AIProcessor._item_index(item, size)
+            if idx is not None and idx not in aligned:
+                aligned[idx] = item
+
+        return aligned
 
     # =====================================================
     # NORMALIZATION
@@ -110,8 +601,45 @@ class AIProcessor:
             "details": result.get("details", {}) or {},
             "recommendations": result.get("recommendations", []),
             "raw_log": raw_log,
+            "source": "llm",
         }
 
+    @staticmethod
+    def reuse_verdict(verdict: Dict[str, Any], raw_log: str, source: str) -> Dict[str, Any]:
+        """
+        Áp verdict của một dòng đại diện (cache / cluster / vector) cho dòng log khác:
+        giữ nguyên phân loại, lấy timestamp / source_ip theo chính dòng này.
+        source = tầng đã dùng lại verdict (xem VERDICT_SOURCES)
+        """
+        result = copy.deepcopy(verdict)
+        result["raw_log"] = raw_log
+        result["source"] = source
+
+        parsed = LogParser.parse_raw_log(raw_log)
+        details = result.get("details") or {}
+        details["timestamp"] = parsed.get("time")
+        details["source_ip"] = parsed.get("src")
+        result["details"] = details
+        return result
+
+    @staticmethod
+    def is_model_verdict(result: Dict[str, Any]) -> bool:
+        """
+        True nếu verdict do chính model trả về cho dòng này (không phải rule / verdict
+        dùng lại / fallback) → mới được ghi model_name + prompt_version và dùng lại
+        """
+        return result.get("source") == "llm" and not AIProcessor.is_fallback(result)
+
+    @staticmethod
+    def is_fallback(result: Dict[str, Any]) -> bool:
+        """
+        True nếu result là _safe_fallback (không phải verdict thật của model)
+        """
+        return (
+            result.get("confidence", 0) == 0
+            and str(result.get("summary", "")).startswith("AI analysis failed")
+        )
+
     # =====================================================
     # THREAT HUNTING ADAPTER
     # =====================================================
@@ -198,17 +726,20 @@ class AIProcessor:
     # PROMPT
     # =====================================================
 
-    @staticmethod
-    def _build_batch_prompt(logs: List[str]) -> str:
-        return f"""
-You are a cybersecurity log analysis AI for SOC Threat Hunting.
+    # Cố định cho mọi batch → Ollama giữ KV cache của prefix này giữa các lần gọi,
+    # mỗi batch chỉ phải eval phần payload log
+    SYSTEM_PROMPT = """You are a cybersecurity log analysis AI for SOC Threat Hunting.
 
 Analyze EACH log independently.
 DO NOT merge logs.
 Return STRICT JSON ONLY.
 No markdown. No explanation.
 
+The user message lists one log per line as `<index>| <raw log>`.
+Return exactly one result per log, with the same index.
+
 For each log return:
+- index: the log's index
 - risk_level: none | low | medium | high | critical
 - threat_type: authentication_failure | suspicious_activity | malware | ddos | normal | other
 - is_threat: boolean
@@ -219,39 +750,55 @@ For each log return:
     - timestamp
     - action
 
-INPUT LOGS:
-{json.dumps(logs, indent=2)}
-
 OUTPUT FORMAT:
-{{
+{
   "results": [
-    {{
+    {
+      "index": 0,
       "risk_level": "none",
       "threat_type": "normal",
       "is_threat": false,
       "confidence": 95,
       "summary": "Explanation",
-      "details": {{
+      "details": {
         "source_ip": null,
         "timestamp": null,
         "action": ""
-      }}
-    }}
+      }
+    }
   ]
-}}
-"""
+}"""
+
+    # JSON schema của {"results": [...]} cho OLLAMA_OUTPUT_FORMAT=schema
+    RESULTS_SCHEMA = BatchVerdicts.model_json_schema()
+
+    # Lưu kèm mỗi verdict (AnalysisLog.prompt_version, namespace verdict cache / vector index).
+    # Đổi SYSTEM_PROMPT → hash đổi → verdict cũ hết hiệu lực; đổi cách build payload /
+    # normalize result (hash không thấy) → tăng PROMPT_REVISION
+    PROMPT_REVISION = 1
+    PROMPT_VERSION = f"r{PROMPT_REVISION}-{hashlib.sha1(SYSTEM_PROMPT.encode()).hexdigest()[:8]}"
+
+    @staticmethod
+    def _build_batch_prompt(logs: List[str]) -> str:
+        """
+        User payload gọn: mỗi dòng "<index>| <log>" (không JSON-escape / indent)
+        """
+        lines = "\n".join(
+            f"{i}| {' '.join(log.splitlines())}" for i, log in enumerate(logs)
+        )
+        return f"INPUT LOGS:\n{lines}"
+
+    @staticmethod
+    def _build_messages(logs: List[str]) -> List[Dict[str, str]]:
+        return [
+            {"role": "system", "content": AIProcessor.SYSTEM_PROMPT},
+            {"role": "user", "content": AIProcessor._build_batch_prompt(logs)},
+        ]
 
     # =====================================================
     # HELPERS
     # =====================================================
 
-    @staticmethod
-    def _clean_json(text: str) -> str:
-        text = re.sub(r"^```json\s*", "", text)
-        text = re.sub(r"^```\s*", "", text)
-        text = re.sub(r"\s*```$", "", text)
-        return text.strip()
-
     @staticmethod
     def _safe_fallback(raw_log: str) -> Dict[str, Any]:
         return {
@@ -263,4 +810,5 @@ OUTPUT FORMAT:
             "details": {},
             "recommendations": [],
             "raw_log": raw_log,
+            "source": "fallback",
         }
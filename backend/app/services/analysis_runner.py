@@ -1,14 +1,34 @@
 from sqlalchemy.orm import Session
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
 from datetime import datetime
 from pathlib import Path
+from contextlib import nullcontext
+from functools import partial
+import contextvars
+import threading
 import traceback
+import time
 import json
 
 from app.models.log_dataset import LogDataset
 from app.models.analysis_job import AnalysisJob
 from app.models.analysis_log import AnalysisLog
 
+from app.core.config import settings
+from app.core.model_residency import ModelResidency
 from app.services.ai_processor import AIProcessor
+from app.services.batcher import AdaptiveBatcher
+from app.services.llm_telemetry import LLMTelemetry
+from app.services.pipeline_stats import PipelineStats
+from app.services.prefilter import RulePrefilter, get_prefilter
+from app.services.template_miner import DrainMiner
+from app.services.upload_service import file_sha256, stored_log_format
+from app.utils.exceptions import LogTooLargeError
+from app.utils.line_index import LineIndex
+from app.utils.log_reader import iter_log_lines
+from app.services.verdict_cache import VerdictCache, get_verdict_cache
+from app.services.vector_index import VectorIndex, get_vector_index
 from app.services.ws_publisher_sync import (
     publish_status,
     publish_log,
@@ -32,7 +52,8 @@ def run_analysis_job(
     job_id: str,
     db: Session,
     log_file_path: str,
-    chunk_size: int = 10,
+    chunk_size: int | None = None,
+    max_inflight: int | None = None,
 ):
     job_id_str = str(job_id)
     
@@ -44,13 +65,21 @@ def run_analysis_job(
     # ======================================================
     # CREATE DATASET
     # ======================================================
+    try:
+        content_hash = file_sha256(log_file_path)
+    except OSError:
+        content_hash = None
+
     dataset = LogDataset(
         name=job.job_name,
         description=f"Dataset created from analysis job {job.id}",
         source_type="firewall",
         environment="prod",
+        created_by=job.created_by,
         file_path=log_file_path,
-        log_format="raw",
+        content_hash=content_hash,
+        # format đoán lúc upload; file upload từ bản cũ → None, hunt đoán lúc parse lần đầu
+        log_format=stored_log_format(log_file_path),
         time_range_start=job.time_range_from,
         time_range_end=job.time_range_to,
         created_from_job=job.id,
@@ -61,6 +90,9 @@ def run_analysis_job(
 
     print(f"[RUNNER] Dataset {dataset.id} created for job {job.id}")
 
+    # telemetry LLM theo batch → AnalysisJob.telemetry (kể cả khi job failed)
+    telemetry = LLMTelemetry()
+
     log_path = Path(log_file_path)
     if not log_path.exists():
         publish_error(job_id_str, f"Log file not found: {log_file_path}")
@@ -76,7 +108,11 @@ def run_analysis_job(
         publish_status(job_id_str, "running")
         print(f"[RUNNER] Job {job_id_str} started")
 
+        # line index (build lần đầu quét file) → biết trước tổng số dòng cho progress
+        total_lines = _count_lines(log_path)
+
         total_logs = 0
+        position = 0
         detected_threats = 0
         analysis_results = []
         timeline = []
@@ -90,69 +126,143 @@ def run_analysis_job(
             "unknown": 0,
         }
 
-        batch_logs = []
-        batch_indexes = []
+        if max_inflight is None:
+            max_inflight = settings.ANALYSIS_MAX_INFLIGHT_BATCHES
+        # chunk_size (nếu truyền) chỉ còn là trần số dòng / batch
+        batcher = AdaptiveBatcher(max_size=chunk_size)
+        print(
+            f"[RUNNER] Token budget {batcher.token_budget}/batch, "
+            f"size cap {batcher.size_cap}, max in-flight={max_inflight}"
+        )
+
+        stats = PipelineStats()
+
+        # model_name của job trùng tên cascade profile → model nhỏ trước, leo thang lên model lớn
+        cascade = AIProcessor.cascade_profile(job.model_name)
+        if cascade:
+            print(f"[RUNNER] Cascade {cascade['name']}: {cascade['small']} → {cascade['large']}")
+
+        # Streaming: publish từng dòng ngay khi model trả xong object của dòng đó
+        streamed = None
+        on_result = None
+        if settings.OLLAMA_STREAMING:
+            streamed = _StreamedResults()
+
+            def on_result(_, result):
+                if streamed.add(result):
+                    publish_log(job_id_str, _format_log_line(result))
+
+        # Vector tier: index nearest-neighbour theo source_type + model (load lazy)
+        # model ghi kèm verdict (AnalysisLog.model_name) → hunt / vector index chỉ dùng lại verdict cùng model
+        verdict_model = cascade["name"] if cascade else settings.OLLAMA_MODEL
+
+        vector_index = None
+        if settings.VECTOR_INDEX_ENABLED:
+            vector_index = get_vector_index(
+                verdict_model,
+                dataset.source_type,
+                db=db,
+            )
+
+        tiers = dict(
+            source_type=dataset.source_type,
+            cascade=cascade,
+            vector_index=vector_index,
+            telemetry=telemetry,
+        )
+        analyze_fn = _build_analyze_fn(stats, batcher, on_result=on_result, **tiers)
 
         # ======================================================
-        # READ LOG FILE
+        # CLUSTERING (Drain) → chỉ gửi vài dòng đại diện / template lên LLM
         # ======================================================
-        with open(log_path, "r", encoding="utf-8", errors="ignore") as f:
-            for idx, line in enumerate(f):
-                line = line.strip()
-                if not line:
-                    continue
-
-                total_logs += 1
-                batch_logs.append(line)
-                batch_indexes.append(idx)
-
-                if len(batch_logs) >= chunk_size:
-                    detected_threats = _process_batch(
-                        job_id=job_id_str,
-                        dataset_id=dataset.id,
-                        batch_logs=batch_logs,
-                        batch_indexes=batch_indexes,
-                        analysis_results=analysis_results,
-                        timeline=timeline,
-                        risk_distribution=risk_distribution,
-                        db=db,
-                        publish_log_fn=publish_log,
-                        detected_threats=detected_threats,
-                    )
-
-                    # Publish progress
-                    publish_summary(job_id_str, {
-                        "processed": total_logs,
-                        "detected_threats": detected_threats,
-                        "risk_distribution": risk_distribution,
-                    })
-
-                    batch_logs.clear()
-                    batch_indexes.clear()
+        if settings.ANALYSIS_CLUSTERING_ENABLED:
+            publish_log(job_id_str, "[CLUSTER] Mining log templates...")
+            analyze_fn = _cluster_stage(
+                log_path=log_path,
+                batcher=batcher,
+                analyze_fn=analyze_fn,
+                max_inflight=max_inflight,
+                stats=stats,
+                # dòng đại diện không thuộc batch nào của lượt 2 → không stream
+                representative_fn=_build_analyze_fn(stats, batcher, **tiers),
+            )
+            publish_log(
+                job_id_str,
+                f"[CLUSTER] {int(stats.get('cluster.clusters'))} templates, "
+                f"{int(stats.get('cluster.representatives'))} representatives analyzed",
+            )
 
         # ======================================================
-        # PROCESS REMAINING
+        # READ LOG FILE + DISPATCH BATCHES (kết quả trả về theo thứ tự file)
         # ======================================================
-        if batch_logs:
+        batches = batcher.pack(_iter_lines(log_path))
+
+        for batch_logs, batch_indexes, results, error in _dispatch_batches(
+            batches, analyze_fn, max_inflight, streamed=streamed
+        ):
+            total_logs += len(batch_logs)
+            if batch_indexes:
+                position = batch_indexes[-1] + 1
+
+            if error is not None:
+                publish_log(job_id_str, f"[ERROR] Batch AI failed: {error}")
+                continue
+
             detected_threats = _process_batch(
                 job_id=job_id_str,
                 dataset_id=dataset.id,
                 batch_logs=batch_logs,
                 batch_indexes=batch_indexes,
+                results=results,
                 analysis_results=analysis_results,
                 timeline=timeline,
                 risk_distribution=risk_distribution,
                 db=db,
                 publish_log_fn=publish_log,
                 detected_threats=detected_threats,
+                streamed=streamed,
+                telemetry=telemetry,
+                model_name=verdict_model,
             )
 
+            # Publish progress: position / total_lines cùng đơn vị (vị trí dòng trong file,
+            # kể cả dòng rỗng); processed chỉ đếm dòng có nội dung
+            publish_summary(job_id_str, {
+                "processed": total_logs,
+                "position": position,
+                "total_lines": total_lines,
+                "detected_threats": detected_threats,
+                "risk_distribution": risk_distribution,
+            })
+
         print(f"[RUNNER] Processing completed: {total_logs} logs, {detected_threats} threats")
 
+        # verdict mới của job → append vào index trên disk cho các job sau
+        if vector_index is not None:
+            try:
+                vector_index.flush()
+            except OSError as e:
+                print(f"[RUNNER] ⚠️ Vector index flush failed: {e}")
+
         # ======================================================
         # AGGREGATE
         # ======================================================
         aggregated = AIProcessor.aggregate_threats(analysis_results)
+        if settings.VERDICT_CACHE_ENABLED:
+            aggregated["cache"] = VerdictCache.report(stats)
+        if vector_index is not None:
+            aggregated["vector"] = VectorIndex.report(stats)
+        if settings.ANALYSIS_CLUSTERING_ENABLED:
+            aggregated["clustering"] = _cluster_report(stats)
+        if settings.PREFILTER_ENABLED:
+            aggregated["prefilter"] = RulePrefilter.report(stats)
+        aggregated["tiers"] = {k: int(v) for k, v in stats.section("tiers").items()}
+        aggregated["batching"] = AdaptiveBatcher.report(stats)
+        aggregated["retries"] = {k: int(v) for k, v in stats.section("retry").items()}
+        aggregated["parsing"] = AIProcessor.parse_report(stats)
+        aggregated["residency"] = ModelResidency.report(stats)
+        if cascade:
+            aggregated["cascade"] = AIProcessor.cascade_report(stats, cascade)
         timeline.sort(key=lambda x: RISK_ORDER.get(x.get("risk_level", "unknown"), 99))
 
         # ======================================================
@@ -178,6 +288,7 @@ def run_analysis_job(
             job.total_logs = total_logs
             job.detected_threats = detected_threats
             job.summary = aggregated
+            job.telemetry = telemetry.summary()
             job.timeline = timeline[:50]
             job.analysis_text = _build_report(
                 total_logs,
@@ -260,6 +371,7 @@ def run_analysis_job(
             if job:
                 job.status = "failed"
                 job.finished_at = datetime.utcnow()
+                job.telemetry = telemetry.summary()
                 db.commit()
                 print(f"[RUNNER] ✅ Job marked as failed in DB")
             else:
@@ -271,6 +383,274 @@ def run_analysis_job(
             traceback.print_exc()
 
 
+# ======================================================
+# READ + DISPATCH BATCHES
+# ======================================================
+def _iter_lines(log_path: Path):
+    """
+    Yield (line_index, line) cho các dòng không rỗng của file log (plain / gz / bz2 / zst)
+    """
+    yield from iter_log_lines(log_path)
+
+
+def _count_lines(log_path: Path) -> int | None:
+    """
+    Số vị trí dòng của file (kể cả dòng rỗng, cùng đơn vị với line_index).
+    None nếu không build được index; file nén vượt trần → LogTooLargeError (job failed)
+    """
+    try:
+        with LineIndex(log_path) as index:
+            return len(index)
+    except LogTooLargeError as e:
+        raise LogTooLargeError(f"Log file too large to analyze: {e}") from None
+    except (OSError, RuntimeError) as e:
+        print(f"[RUNNER] ⚠️ Line index unavailable: {e}")
+        return None
+
+
+def _analyze_batch(
+    batch_logs: list[str],
+    stats: PipelineStats | None = None,
+    batcher: AdaptiveBatcher | None = None,
+    on_result=None,
+    cascade: dict | None = None,
+    telemetry: LLMTelemetry | None = None,
+) -> list[dict]:
+    """
+    AI call only - safe to run on a worker thread (no DB)
+    """
+    if stats is not None:
+        stats.incr("tiers.llm", len(batch_logs))
+
+    started = time.perf_counter()
+    with telemetry.batch(len(batch_logs)) if telemetry is not None else nullcontext() as record:
+        if cascade:
+            results = AIProcessor.analyze_cascade(batch_logs, cascade, stats=stats, on_result=on_result)
+        else:
+            results = AIProcessor.analyze_batch(batch_logs, stats=stats, on_result=on_result)
+        if record is not None:
+            record["fallback_lines"] = sum(1 for r in results if AIProcessor.is_fallback(r))
+
+    if stats is not None:
+        # batch LLM đầu tiên của job → chịu cold-start nếu model chưa được load
+        stats.set_once("latency.first_batch_seconds", time.perf_counter() - started)
+
+    if batcher is not None:
+        batcher.observe(batch_logs, results, time.perf_counter() - started, stats)
+    return results
+
+
+def _build_analyze_fn(
+    stats: PipelineStats,
+    batcher: AdaptiveBatcher | None = None,
+    source_type: str | None = None,
+    on_result=None,
+    cascade: dict | None = None,
+    vector_index: VectorIndex | None = None,
+    telemetry: LLMTelemetry | None = None,
+):
+    """
+    Ghép các tầng trước LLM thành một hàm analyze(batch_logs) → results:
+    prefilter (rule) → verdict cache → vector nearest-neighbour → LLM (một model hoặc cascade)
+    """
+    analyze_fn = partial(
+        _analyze_batch, stats=stats, batcher=batcher, on_result=on_result, cascade=cascade,
+        telemetry=telemetry,
+    )
+
+    if vector_index is not None:
+        analyze_fn = partial(
+            vector_index.analyze_batch,
+            analyze_fn=analyze_fn,
+            threshold=settings.VECTOR_SIM_THRESHOLD,
+            stats=stats,
+        )
+
+    if settings.VERDICT_CACHE_ENABLED:
+        analyze_fn = partial(
+            get_verdict_cache().analyze_batch,
+            analyze_fn=analyze_fn,
+            namespace=f"{cascade['name'] if cascade else settings.OLLAMA_MODEL}@{AIProcessor.PROMPT_VERSION}",
+            stats=stats,
+        )
+
+    if settings.PREFILTER_ENABLED:
+        analyze_fn = partial(
+            get_prefilter(source_type).analyze_batch,
+            analyze_fn=analyze_fn,
+            stats=stats,
+        )
+
+    return analyze_fn
+
+
+def _cluster_stage(
+    log_path: Path,
+    batcher: AdaptiveBatcher,
+    analyze_fn,
+    max_inflight: int,
+    stats: PipelineStats,
+    representative_fn=None,
+):
+    """
+    Lượt 1: mine template (Drain) + giữ tối đa K dòng đại diện mỗi cluster,
+    phân tích các đại diện (representative_fn, mặc định analyze_fn)
+    và lấy verdict rủi ro cao nhất cho từng cluster.
+
+    Trả về analyze_fn cho lượt 2: dòng khớp cluster → dùng verdict của cluster,
+    dòng không khớp → gửi tiếp xuống analyze_fn.
+    """
+    # Template tree lưu cạnh file log → job sau trên cùng dataset dùng lại
+    tree_path = f"{log_path}.drain.json"
+    miner = DrainMiner.load_or_create(
+        tree_path,
+        sim_threshold=settings.DRAIN_SIM_THRESHOLD,
+        depth=settings.DRAIN_DEPTH,
+        max_children=settings.DRAIN_MAX_CHILDREN,
+        max_clusters=settings.DRAIN_MAX_CLUSTERS,
+    )
+    per_cluster = settings.CLUSTER_REPRESENTATIVES
+    representatives: dict[int, list[str]] = {}
+
+    for _, line in _iter_lines(log_path):
+        cluster = miner.add(line)
+        reps = representatives.setdefault(cluster.cluster_id, [])
+        if len(reps) < per_cluster and line not in reps:
+            reps.append(line)
+
+        # bỏ đại diện của cluster đã bị evict để giữ memory có giới hạn
+        if len(representatives) > 2 * miner.max_clusters:
+            representatives = {
+                cid: reps for cid, reps in representatives.items() if miner.get(cid)
+            }
+
+    representatives = {
+        cid: reps for cid, reps in representatives.items() if miner.get(cid)
+    }
+    miner.save(tree_path)
+
+    rep_items = [(cid, line) for cid, reps in representatives.items() for line in reps]
+    stats.incr("cluster.clusters", len(representatives))
+    stats.incr("cluster.representatives", len(rep_items))
+    print(f"[RUNNER] Drain: {len(representatives)} clusters, {len(rep_items)} representatives")
+
+    # batch_indexes ở đây mang cluster id của từng dòng đại diện
+    rep_batches = batcher.pack((cid, line) for cid, line in rep_items)
+
+    verdicts: dict[int, dict] = {}
+    for _, cluster_ids, results, error in _dispatch_batches(
+        rep_batches, representative_fn or analyze_fn, max_inflight
+    ):
+        if error is not None:
+            print(f"[RUNNER] ⚠️ Representative batch failed: {error}")
+            continue
+
+        for cid, verdict in zip(cluster_ids, results):
+            if AIProcessor.is_fallback(verdict):
+                continue
+            current = verdicts.get(cid)
+            if current is None or (
+                RISK_ORDER.get(verdict.get("risk_level", "unknown"), 99)
+                < RISK_ORDER.get(current.get("risk_level", "unknown"), 99)
+            ):
+                verdicts[cid] = verdict
+
+    return partial(
+        _cluster_analyze,
+        miner=miner,
+        verdicts=verdicts,
+        analyze_fn=analyze_fn,
+        stats=stats,
+    )
+
+
+def _cluster_analyze(
+    batch_logs: list[str],
+    miner: DrainMiner,
+    verdicts: dict[int, dict],
+    analyze_fn,
+    stats: PipelineStats,
+) -> list[dict]:
+    results: list[dict | None] = [None] * len(batch_logs)
+    unmatched = []
+
+    for i, line in enumerate(batch_logs):
+        cluster = miner.match(line)
+        verdict = verdicts.get(cluster.cluster_id) if cluster else None
+        if verdict is not None:
+            results[i] = AIProcessor.reuse_verdict(verdict, line, "cluster")
+        else:
+            unmatched.append(i)
+
+    stats.incr("cluster.lines_labelled", len(batch_logs) - len(unmatched))
+    stats.incr("tiers.cluster", len(batch_logs) - len(unmatched))
+
+    if unmatched:
+        stats.incr("cluster.lines_unmatched", len(unmatched))
+        fresh = analyze_fn([batch_logs[i] for i in unmatched])
+        for i, result in zip(unmatched, fresh):
+            results[i] = result
+
+    return [
+        r if r is not None else AIProcessor._safe_fallback(batch_logs[i])
+        for i, r in enumerate(results)
+    ]
+
+
+def _cluster_report(stats: PipelineStats) -> dict:
+    cluster = stats.section("cluster")
+    return {
+        "clusters": int(cluster.get("clusters", 0)),
+        "representatives": int(cluster.get("representatives", 0)),
+        "lines_labelled": int(cluster.get("lines_labelled", 0)),
+        "lines_unmatched": int(cluster.get("lines_unmatched", 0)),
+        "llm_lines": int(cluster.get("representatives", 0) + cluster.get("lines_unmatched", 0)),
+    }
+
+
+def _dispatch_batches(batches, analyze_fn, max_inflight: int = 1, streamed: "_StreamedResults | None" = None):
+    """
+    Yield (batch_logs, batch_indexes, results, error) in file order.
+
+    - max_inflight <= 1 → gọi tuần tự như cũ
+    - max_inflight > 1  → giữ tối đa N batch đang chờ Ollama trên thread pool,
+      nhưng kết quả vẫn trả về đúng thứ tự để commit / publish tuần tự
+    - streamed → result stream ra trong batch được ghi theo line index của batch đó
+    """
+    def _run(batch_logs, batch_indexes):
+        if streamed is None:
+            return analyze_fn(batch_logs)
+        return streamed.analyze(batch_logs, batch_indexes, analyze_fn)
+
+    if max_inflight <= 1:
+        for batch_logs, batch_indexes in batches:
+            try:
+                yield batch_logs, batch_indexes, _run(batch_logs, batch_indexes), None
+            except Exception as e:
+                yield batch_logs, batch_indexes, None, e
+        return
+
+    def _collect(entry):
+        batch_logs, batch_indexes, future = entry
+        try:
+            return batch_logs, batch_indexes, future.result(), None
+        except Exception as e:
+            return batch_logs, batch_indexes, None, e
+
+    with ThreadPoolExecutor(max_workers=max_inflight, thread_name_prefix="ai-batch") as pool:
+        pending = deque()
+
+        for batch_logs, batch_indexes in batches:
+            # copy context → thread con giữ llm_priority() của job
+            future = pool.submit(contextvars.copy_context().run, _run, batch_logs, batch_indexes)
+            pending.append((batch_logs, batch_indexes, future))
+            if len(pending) >= max_inflight:
+                yield _collect(pending.popleft())
+
+        while pending:
+            yield _collect(pending.popleft())
+
+
 # ======================================================
 # PROCESS BATCH + SAVE ANALYSIS LOGS
 # ======================================================
@@ -279,22 +659,20 @@ def _process_batch(
     dataset_id: int,
     batch_logs: list[str],
     batch_indexes: list[int],
+    results: list[dict],
     analysis_results: list,
     timeline: list,
     risk_distribution: dict,
     db: Session,
     publish_log_fn,
     detected_threats: int,
+    streamed: "_StreamedResults | None" = None,
+    telemetry: LLMTelemetry | None = None,
+    model_name: str | None = None,
 ) -> int:
     """
-    Process a batch of logs with AI and save to database
+    Save AI results of a batch to database (results đã có sẵn từ _dispatch_batches)
     """
-    try:
-        results = AIProcessor.analyze_batch(batch_logs)
-    except Exception as e:
-        publish_log_fn(job_id, f"[ERROR] Batch AI failed: {e}")
-        return detected_threats
-
     # ==============================
     # Build list of AnalysisLog objects
     # ==============================
@@ -312,12 +690,18 @@ def _process_batch(
         analysis_results.append(result)
 
         # Create AnalysisLog object
+        # chỉ verdict model trả trực tiếp mới ghi model: verdict của rule / cache / cluster / vector
+        # và fallback không được hunt / vector index dùng lại như verdict của LLM
+        reusable = model_name is not None and AIProcessor.is_model_verdict(result)
         log_row = AnalysisLog(
             job_id=job_id,
             dataset_id=dataset_id,
             raw_log=raw_log,
             parsed_result=json.dumps(result, ensure_ascii=False),
             threat_result=summary if is_threat else None,
+            model_name=model_name if reusable else None,
+            prompt_version=AIProcessor.PROMPT_VERSION if reusable else None,
+            line_index=line_idx,
         )
         log_objects.append(log_row)
 
@@ -332,17 +716,19 @@ def _process_batch(
                 "raw_log": raw_log[:120],
             })
 
-        publish_log_fn(
-            job_id,
-            f"[{risk.upper()}] {raw_log[:80]} → {summary}"
-        )
+        # dòng đã được publish lúc stream thì không publish lại
+        if streamed is None or not streamed.pop(line_idx):
+            publish_log_fn(job_id, _format_log_line(result, raw_log))
 
     # ==============================
     # Bulk insert để performance tốt hơn
     # ==============================
     try:
+        started = time.perf_counter()
         db.bulk_save_objects(log_objects)
         db.flush()  # Ghi vào DB
+        if telemetry is not None:
+            telemetry.record_flush(time.perf_counter() - started)
         print(f"[RUNNER] 💾 Saved {len(log_objects)} analysis logs to DB")
     except Exception as e:
         print(f"[RUNNER] ⚠️ Failed to save analysis logs: {e}")
@@ -352,6 +738,62 @@ def _process_batch(
     return detected_threats
 
 
+def _format_log_line(result: dict, raw_log: str | None = None) -> str:
+    raw_log = raw_log if raw_log is not None else result.get("raw_log", "")
+    risk = result.get("risk_level", "unknown")
+    return f"[{risk.upper()}] {raw_log[:80]} → {result.get('summary', '')}"
+
+
+# raw_log → line index (theo thứ tự file) của batch đang chạy trên thread hiện tại
+_streaming_batch: contextvars.ContextVar[dict[str, deque] | None] = contextvars.ContextVar(
+    "streaming_batch", default=None
+)
+
+
+class _StreamedResults:
+    """
+    Line index của các dòng đã publish trong lúc stream,
+    để _process_batch không publish lại cùng dòng
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._lines: set[int] = set()
+
+    def analyze(self, batch_logs: list[str], batch_indexes: list[int], analyze_fn) -> list[dict]:
+        pending: dict[str, deque] = {}
+        for line, line_idx in zip(batch_logs, batch_indexes):
+            pending.setdefault(line, deque()).append(line_idx)
+
+        token = _streaming_batch.set(pending)
+        try:
+            return analyze_fn(batch_logs)
+        finally:
+            _streaming_batch.reset(token)
+
+    def add(self, result: dict) -> bool:
+        """
+        Ghi nhận dòng của result → False nếu không thuộc batch nào đang chạy
+        (khi đó _process_batch sẽ publish)
+        """
+        pending = _streaming_batch.get()
+        if pending is None:
+            return False
+        with self._lock:
+            queue = pending.get(result.get("raw_log"))
+            if not queue:
+                return False
+            self._lines.add(queue.popleft())
+            return True
+
+    def pop(self, line_idx: int) -> bool:
+        with self._lock:
+            if line_idx in self._lines:
+                self._lines.discard(line_idx)
+                return True
+            return False
+
+
 def _build_report(
     total_logs: int,
     detected_threats: int,
@@ -0,0 +1,153 @@
+# backend/app/services/batcher.py
+import math
+import threading
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.ai_processor import AIProcessor
+from app.services.pipeline_stats import PipelineStats
+
+
+class AdaptiveBatcher:
+    """
+    Chia log thành batch theo ngân sách token thay vì số dòng cố định.
+
+    - Ước lượng token prompt + output cho từng dòng, gom đến khi đầy
+      `num_ctx * context_fill` (tránh tràn context → _safe_fallback)
+    - Giới hạn số dòng / batch (size_cap) tự điều chỉnh theo quan sát:
+        * batch lỗi parse (fallback)  → giảm một nửa
+        * latency vượt target         → giảm 25%
+        * nhanh + không lỗi           → tăng dần
+    """
+
+    # ~3.5 ký tự / token cho log ASCII (ước lượng bảo thủ, không cần tokenizer)
+    CHARS_PER_TOKEN = 3.5
+    # mỗi dòng trong INPUT LOGS: "<index>| " + xuống dòng
+    LINE_OVERHEAD_CHARS = 7
+
+    def __init__(
+        self,
+        num_ctx: Optional[int] = None,
+        context_fill: Optional[float] = None,
+        output_tokens_per_line: Optional[int] = None,
+        min_size: Optional[int] = None,
+        max_size: Optional[int] = None,
+        initial_size: Optional[int] = None,
+        target_latency: Optional[float] = None,
+    ):
+        self.num_ctx = num_ctx or settings.OLLAMA_NUM_CTX
+        self.context_fill = context_fill or settings.BATCH_CONTEXT_FILL
+        self.output_tokens_per_line = output_tokens_per_line or settings.BATCH_OUTPUT_TOKENS_PER_LINE
+        self.min_size = max(min_size or settings.BATCH_MIN_LINES, 1)
+        self.max_size = max(max_size or settings.BATCH_MAX_LINES, self.min_size)
+        self.target_latency = target_latency or settings.BATCH_TARGET_LATENCY
+
+        initial = initial_size or settings.BATCH_INITIAL_LINES
+        self.size_cap = min(max(initial, self.min_size), self.max_size)
+
+        # phần cố định của prompt (system: instruction + schema + example)
+        self.prompt_overhead_tokens = self.estimate_tokens(
+            AIProcessor.SYSTEM_PROMPT + AIProcessor._build_batch_prompt([])
+        )
+
+        self._lock = threading.Lock()
+
+    # =====================================================
+    # TOKEN ESTIMATION
+    # =====================================================
+
+    @classmethod
+    def estimate_tokens(cls, text: str) -> int:
+        return math.ceil(len(text) / cls.CHARS_PER_TOKEN)
+
+    def line_cost(self, line: str) -> int:
+        """
+        Token của một dòng = input (trong prompt) + output (1 result object)
+        """
+        input_tokens = math.ceil((len(line) + self.LINE_OVERHEAD_CHARS) / self.CHARS_PER_TOKEN)
+        return input_tokens + self.output_tokens_per_line
+
+    @property
+    def token_budget(self) -> int:
+        return int(self.num_ctx * self.context_fill) - self.prompt_overhead_tokens
+
+    # =====================================================
+    # PACKING
+    # =====================================================
+
+    def pack(self, items: Iterable[Tuple[int, str]]) -> Iterator[Tuple[List[str], List[int]]]:
+        """
+        Gom (index, line) thành (batch_logs, batch_indexes).
+        size_cap được đọc lại cho mỗi batch → thay đổi có hiệu lực ngay.
+        """
+        batch_logs: List[str] = []
+        batch_indexes: List[int] = []
+        used = 0
+
+        for idx, line in items:
+            cost = self.line_cost(line)
+
+            if batch_logs and (
+                used + cost > self.token_budget or len(batch_logs) >= self.size_cap
+            ):
+                yield batch_logs, batch_indexes
+                batch_logs, batch_indexes, used = [], [], 0
+
+            batch_logs.append(line)
+            batch_indexes.append(idx)
+            used += cost
+
+        if batch_logs:
+            yield batch_logs, batch_indexes
+
+    # =====================================================
+    # FEEDBACK
+    # =====================================================
+
+    def observe(
+        self,
+        batch_logs: List[str],
+        results: List[Dict[str, Any]],
+        latency: float,
+        stats: Optional[PipelineStats] = None,
+    ) -> None:
+        """
+        Ghi nhận một lần gọi LLM và điều chỉnh size_cap
+        """
+        if not batch_logs:
+            return
+
+        failures = sum(1 for r in results if AIProcessor.is_fallback(r))
+        failures += max(len(batch_logs) - len(results), 0)
+        failure_rate = failures / len(batch_logs)
+
+        with self._lock:
+            before = self.size_cap
+            if failure_rate > 0.5:
+                self.size_cap = max(self.min_size, self.size_cap // 2)
+            elif latency > self.target_latency:
+                self.size_cap = max(self.min_size, int(self.size_cap * 0.75))
+            elif failure_rate == 0 and latency < self.target_latency / 2:
+                self.size_cap = min(self.max_size, self.size_cap + 2)
+            after = self.size_cap
+
+        if stats is not None:
+            stats.incr("batching.llm_batches")
+            stats.incr("batching.llm_lines", len(batch_logs))
+            stats.incr("batching.failed_lines", failures)
+            stats.incr("batching.llm_seconds", latency)
+
+        if after != before:
+            print(f"[BATCHER] size_cap {before} → {after} (latency={latency:.1f}s, fail={failure_rate:.0%})")
+
+    @staticmethod
+    def report(stats: PipelineStats) -> Dict[str, Any]:
+        batching = stats.section("batching")
+        batches = int(batching.get("llm_batches", 0))
+        lines = int(batching.get("llm_lines", 0))
+        return {
+            "llm_batches": batches,
+            "avg_batch_size": round(lines / batches, 2) if batches else 0,
+            "parse_failure_rate": round(batching.get("failed_lines", 0) / lines * 100, 2) if lines else 0,
+            "avg_batch_latency": round(batching.get("llm_seconds", 0) / batches, 2) if batches else 0,
+        }
@@ -1,13 +1,25 @@
 # backend/app/services/chatbot_service.py
-from app.utils.ollama_client import call_ollama
+from app.core.model_residency import get_model_residency, keep_alive_for
+from app.utils.ollama_client import get_ollama_client
 from app.prompts.chatbot_prompt import build_chatbot_prompt
 
 class ChatbotService:
 
     @staticmethod
-    def stream(user_message: str, history: list, model="qwen2.5:3b"):
+    def stream(user_message: str, history: list, model="qwen2.5:3b", user_id=None):
         prompt = build_chatbot_prompt(user_message, history)
 
-        # call_ollama(model, prompt) => iterator chunk
-        for chunk in call_ollama(model, prompt, stream=True):
-            yield chunk
+        # client dùng chung (keep-alive) => iterator chunk
+        # interactive: được ưu tiên hơn hunt / bulk analysis trên LLMScheduler.
+        # Truyền thẳng (không dùng llm_priority): StreamingResponse chạy mỗi next() trên context khác
+        try:
+            user = str(user_id) if user_id is not None else None
+            for chunk in get_ollama_client().generate_stream(
+                model, prompt, priority="interactive", user=user, keep_alive=keep_alive_for("interactive"),
+            ):
+                if chunk.get("done"):
+                    get_model_residency().observe(model, chunk)
+                if "response" in chunk:
+                    yield chunk["response"]
+        except Exception as e:
+            print("[Ollama Error]", e)
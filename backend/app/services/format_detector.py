@@ -0,0 +1,212 @@
+# backend/app/services/format_detector.py
+import csv
+import json
+import random
+import re
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.log_parser import LogParser, tokenize_kv
+from app.utils.line_index import LineIndex
+
+# ======================================================
+# CANDIDATE FORMATS
+# ======================================================
+# Thứ tự = độ đặc hiệu (điểm bằng nhau → format đứng trước thắng).
+_SYSLOG_5424 = re.compile(
+    r"<(?P<pri>\d{1,3})>1 (?P<timestamp>\S+) (?P<host>\S+) (?P<app>\S+) (?P<procid>\S+) (?P<msgid>\S+) (?P<msg>.*)"
+)
+_SYSLOG_3164 = re.compile(
+    r"(?:<(?P<pri>\d{1,3})>)?(?P<timestamp>[A-Z][a-z]{2} [ \d]\d \d{2}:\d{2}:\d{2}) (?P<host>\S+) "
+    r"(?P<tag>[^\s:\[]+)(?:\[(?P<pid>\d+)\])?: (?P<msg>.*)"
+)
+_SYSLOG_PATTERNS = {"syslog_rfc5424": _SYSLOG_5424, "syslog_rfc3164": _SYSLOG_3164}
+
+FORMATS = (
+    "json",
+    "syslog_rfc5424",
+    "csv",
+    "kv",
+    "syslog_rfc3164",
+    "fortigate",
+    "paloalto",
+    "cisco",
+    "checkpoint",
+)
+VENDOR_FORMATS = tuple(LogParser.FIREWALL_PATTERNS)
+
+# đã detect nhưng không format nào đủ điểm (lưu lại, không detect lại).
+# "raw" là giá trị dataset của bản cũ ghi sẵn khi chưa có detection → coi như chưa detect
+UNRECOGNIZED = "unknown"
+UNDETECTED = (None, "raw")
+
+# Pattern vendor trong LogParser rất rộng (cisco / checkpoint khớp gần như mọi dòng có khoảng trắng)
+# → dòng chỉ được tính cho vendor khi có thêm dấu hiệu đặc trưng của vendor đó
+_VENDOR_SIGNATURES = {
+    "paloalto": re.compile(r"\b(?:TRAFFIC|THREAT|SYSTEM|CONFIG|GLOBALPROTECT)\b"),
+    "cisco": re.compile(r"%(?:ASA|PIX|FTD|FWSM)-\d-\d+"),
+    "checkpoint": re.compile(r"(?i)check ?point|\bfw_subproduct\b|\bproduct[=:]"),
+}
+
+_CSV_DELIMITERS = (",", ";", "\t", "|")
+_CSV_HEADER_CELL = re.compile(r"[A-Za-z_@][\w .@-]*")
+
+
+def _is_json(line: str) -> bool:
+    if not line.startswith("{"):
+        return False
+    try:
+        return isinstance(json.loads(line), dict)
+    except ValueError:
+        return False
+
+
+def _is_kv(line: str) -> bool:
+    # ít nhất 2 cặp key=value ngoài header (time / level / facility)
+    fields = tokenize_kv(line)
+    return len(fields.keys() - {"time", "level", "facility"}) >= 2
+
+
+def _csv_header(head: List[str]) -> Optional[Tuple[str, List[str]]]:
+    """
+    (delimiter, tên cột) nếu dòng đầu trông như header CSV (>= 3 cột, không phải số / IP)
+    """
+    first = next((line for line in head if line.strip()), "")
+    for delimiter in _CSV_DELIMITERS:
+        if first.count(delimiter) < 2:
+            continue
+        cells = next(csv.reader([first], delimiter=delimiter))
+        if all(_CSV_HEADER_CELL.fullmatch(cell.strip()) for cell in cells):
+            return delimiter, [cell.strip() for cell in cells]
+    return None
+
+
+class FormatDetector:
+    """
+    Đoán format của file log từ mẫu: HEAD dòng đầu + PROBES đoạn ở vị trí ngẫu nhiên
+    (đọc qua LineIndex, không quét cả file). Mỗi format được chấm điểm = tỉ lệ dòng mẫu
+    khớp; format có điểm cao nhất (>= FORMAT_DETECT_MIN_SCORE) được ghi vào
+    LogDataset.log_format, không đủ điểm → UNRECOGNIZED.
+    """
+
+    def __init__(
+        self,
+        head_lines: Optional[int] = None,
+        probes: Optional[int] = None,
+        probe_lines: Optional[int] = None,
+        seed: Optional[int] = None,
+    ):
+        self.head_lines = head_lines or settings.FORMAT_DETECT_HEAD_LINES
+        self.probes = settings.FORMAT_DETECT_PROBES if probes is None else probes
+        self.probe_lines = probe_lines or settings.FORMAT_DETECT_PROBE_LINES
+        self.rng = random.Random(settings.FORMAT_DETECT_SEED if seed is None else seed)
+
+    def detect(self, path: str) -> Dict[str, Any]:
+        head, body = self.sample(path)
+        scores = self.score(head, body)
+        best = max(FORMATS, key=lambda name: scores[name])  # max() giữ format đứng trước khi bằng điểm
+
+        log_format = best if scores[best] >= settings.FORMAT_DETECT_MIN_SCORE else UNRECOGNIZED
+        result = {
+            "log_format": log_format,
+            "score": round(scores[best], 3),
+            "sampled_lines": len(head) + len(body),
+            "scores": {name: round(value, 3) for name, value in scores.items() if value > 0},
+        }
+        print(f"[FORMAT] {path}: {log_format} (score {result['score']}, {result['sampled_lines']} lines)")
+        return result
+
+    # =====================================================
+    # SAMPLE
+    # =====================================================
+
+    def sample(self, path: str) -> Tuple[List[str], List[str]]:
+        """
+        (HEAD dòng đầu, các dòng lấy ở PROBES offset ngẫu nhiên sau phần head)
+        """
+        with LineIndex(path) as index:
+            total = len(index)
+            head = index.read(0, self.head_lines)
+
+            body: List[str] = []
+            span = total - self.head_lines - self.probe_lines
+            if span > 0 and self.probes > 0:
+                starts = sorted(self.rng.sample(range(self.head_lines, self.head_lines + span), min(self.probes, span)))
+                for lines in index.read_ranges([(start, start + self.probe_lines) for start in starts]):
+                    body.extend(lines)
+
+        return (
+            [line.strip() for line in head if line.strip()],
+            [line.strip() for line in body if line.strip()],
+        )
+
+    # =====================================================
+    # SCORE
+    # =====================================================
+
+    def score(self, head: List[str], body: List[str]) -> Dict[str, float]:
+        lines = head + body
+        scores = {name: 0.0 for name in FORMATS}
+        if not lines:
+            return scores
+
+        total = len(lines)
+        scores["json"] = sum(map(_is_json, lines)) / total
+        scores["kv"] = sum(map(_is_kv, lines)) / total
+        for name, pattern in _SYSLOG_PATTERNS.items():
+            scores[name] = sum(1 for line in lines if pattern.match(line)) / total
+        for name in VENDOR_FORMATS:
+            pattern = LogParser._COMPILED[name]
+            signature = _VENDOR_SIGNATURES.get(name)
+            scores[name] = sum(
+                1 for line in lines
+                if pattern.match(line) and (signature is None or signature.search(line))
+            ) / total
+
+        # CSV: header ở dòng đầu, các dòng còn lại cùng số cột
+        header = _csv_header(head)
+        if header is not None:
+            delimiter, columns = header
+            rows = lines[1:]
+            if rows:
+                matched = sum(1 for row in csv.reader(rows, delimiter=delimiter) if len(row) == len(columns))
+                scores["csv"] = matched / len(rows)
+        return scores
+
+
+# ======================================================
+# PARSER THEO FORMAT ĐÃ PHÁT HIỆN
+# ======================================================
+def get_format_parser(log_format: Optional[str], path: Optional[str] = None) -> Callable[[str], Dict[str, Any]]:
+    """
+    Hàm parse một dòng → dict cho LogDataset.log_format (csv cần path để đọc header).
+    UNRECOGNIZED / "raw" / không biết → tokenizer key=value (rỗng nếu dòng không có key=value).
+    """
+    if log_format == "json":
+        def parse_json(line: str) -> Dict[str, Any]:
+            try:
+                value = json.loads(line)
+            except ValueError:
+                return {}
+            return value if isinstance(value, dict) else {}
+        return parse_json
+
+    if log_format == "csv" and path is not None:
+        with LineIndex(path) as index:
+            header = _csv_header(index.read(0, 10))
+        if header is not None:
+            delimiter, columns = header
+
+            def parse_csv(line: str) -> Dict[str, Any]:
+                row = next(csv.reader([line], delimiter=delimiter), [])
+                return dict(zip(columns, row)) if len(row) == len(columns) and row != columns else {}
+            return parse_csv
+
+    pattern = _SYSLOG_PATTERNS.get(log_format) or LogParser._COMPILED.get(log_format or "")
+    if pattern is not None:
+        def parse_pattern(line: str) -> Dict[str, Any]:
+            match = pattern.match(line)
+            return match.groupdict() if match else {}
+        return parse_pattern
+
+    return tokenize_kv
@@ -2,7 +2,7 @@ from datetime import datetime
 from typing import List, Dict, Any
 from pathlib import Path
 import re
-from datetime import datetime
+from datetime import datetime, timezone
 
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import NoResultFound
@@ -22,6 +22,9 @@ from app.schemas.threat_hunt import (
     HuntConclusionCreate,
 )
 from app.models.user import User
+from app.services.format_detector import UNDETECTED, FormatDetector, get_format_parser
+from app.utils.line_index import line_context
+from app.utils.log_reader import iter_log_lines
 
 VERDICT_MAP = {
     "confirmed_threat": "true_positive",
@@ -36,6 +39,24 @@ RISK_MAP = {
 }
 
 TIMESTAMP_REGEX = r"^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})"
+# field thời gian theo parser của từng format (kv / syslog / json / vendor / csv)
+TIMESTAMP_FIELDS = ("time", "timestamp", "@timestamp", "datetime", "date")
+
+
+def _line_timestamp(fields: Dict[str, Any], line: str):
+    for key in TIMESTAMP_FIELDS:
+        value = fields.get(key)
+        if isinstance(value, str) and value:
+            try:
+                ts = datetime.fromisoformat(value.replace("Z", "+00:00"))
+            except ValueError:
+                continue
+            if ts.tzinfo is not None:
+                ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+            return ts
+
+    m = re.search(TIMESTAMP_REGEX, line)
+    return datetime.strptime(m.group(1), "%Y-%m-%d %H:%M:%S") if m else None
 
 class HuntService:
     """
@@ -102,33 +123,36 @@ class HuntService:
         if not file_path.exists():
             raise FileNotFoundError(dataset.file_path)
 
+        # format (kv / json / csv / syslog / vendor) đoán lúc upload; dataset chưa có
+        # (file của bản cũ) → đoán một lần ở đây và lưu lại → parser riêng của format thay vì regex chung
+        if dataset.log_format in UNDETECTED:
+            try:
+                dataset.log_format = FormatDetector().detect(str(file_path))["log_format"]
+            except (OSError, RuntimeError) as e:
+                print(f"[HUNT] ⚠️ Format detection failed: {e}")
+
         buffer = []
         total = 0
-
-        with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-            for line in f:
-                line = line.strip()
-                if not line:
-                    continue
-
-                ts = None
-                m = re.search(TIMESTAMP_REGEX, line)
-                if m:
-                    ts = datetime.strptime(m.group(1), "%Y-%m-%d %H:%M:%S")
-
-                buffer.append(
-                    AnalysisLog(
-                        dataset_id=dataset.id,
-                        timestamp=ts,
-                        raw_log=line,
-                    )
+        parse = get_format_parser(dataset.log_format, str(file_path))
+
+        # .gz / .bz2 / .zst giải nén dạng stream trong lúc đọc
+        for idx, line in iter_log_lines(file_path):
+            ts = _line_timestamp(parse(line), line)
+
+            buffer.append(
+                AnalysisLog(
+                    dataset_id=dataset.id,
+                    timestamp=ts,
+                    raw_log=line,
+                    line_index=idx,
                 )
-                total += 1
+            )
+            total += 1
 
-                if len(buffer) >= 1000:
-                    db.bulk_save_objects(buffer)
-                    db.commit()
-                    buffer.clear()
+            if len(buffer) >= 1000:
+                db.bulk_save_objects(buffer)
+                db.commit()
+                buffer.clear()
 
         if buffer:
             db.bulk_save_objects(buffer)
@@ -313,6 +337,37 @@ class HuntService:
             "summary": self._build_summary(items),
         }
 
+    def finding_context(
+        self,
+        db: Session,
+        hunt_id: int,
+        finding_id: int,
+        before: int = 5,
+        after: int = 5,
+    ) -> Dict[str, Any]:
+        """
+        Các dòng xung quanh finding trong file của dataset (đọc qua line index, không quét lại file)
+        """
+        hunt = self._get_hunt_or_404(db, hunt_id)
+        finding = (
+            db.query(HuntFinding)
+            .filter(HuntFinding.id == finding_id, HuntFinding.hunt_id == hunt_id)
+            .one_or_none()
+        )
+        if not finding:
+            raise NoResultFound("Finding not found")
+        if finding.line_index is None:
+            raise HTTPException(status_code=404, detail="Finding has no line reference")
+
+        dataset = db.query(LogDataset).filter(LogDataset.id == hunt.dataset_id).one_or_none()
+        if not dataset:
+            raise NoResultFound(f"Dataset {hunt.dataset_id} not found")
+
+        context = line_context(dataset.file_path, finding.line_index, before, after)
+        context["finding_id"] = finding.id
+        context["dataset_id"] = dataset.id
+        return context
+
     # =====================================================
     # CONCLUSION
     # =====================================================
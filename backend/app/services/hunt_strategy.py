@@ -0,0 +1,253 @@
+# backend/app/services/hunt_strategy.py
+import math
+import random
+import re
+from typing import Any, Dict, Iterable, List, Optional
+
+from app.core.config import settings
+from app.services.prefilter import get_prefilter
+from app.services.template_miner import DrainMiner
+from app.services.threat_detector import ThreatDetector
+
+DEPTHS = ("quick", "standard", "deep")
+
+_SOURCE_IP = re.compile(r"\b(?:src|srcip|src_ip|source_ip|client)=\"?([0-9a-fA-F:.]+)")
+_BLOCKED = re.compile(r"\baction=\"?(?:deny|denied|block|blocked|drop|dropped|reject|rejected)\b", re.IGNORECASE)
+
+# "hình dạng" dòng: mọi chữ số → 0 (timestamp, id, IP, port...) → key cache cho phân stratum
+_DIGITS = str.maketrans("123456789", "000000000")
+_SHAPE_CACHE_SIZE = 100_000
+
+# z của khoảng tin cậy 95%
+_Z95 = 1.96
+
+
+class _Stratum:
+    """
+    Reservoir sample (Algorithm R) của một stratum + số dòng thực tế
+    """
+
+    __slots__ = ("size", "sample")
+
+    def __init__(self):
+        self.size = 0
+        self.sample: List[int] = []
+
+    def offer(self, index: int, capacity: int, rng: random.Random) -> None:
+        self.size += 1
+        if len(self.sample) < capacity:
+            self.sample.append(index)
+            return
+        slot = rng.randrange(self.size)
+        if slot < capacity:
+            self.sample[slot] = index
+
+
+class HuntStrategy:
+    """
+    Chọn dòng gửi lên LLM theo HuntExecution.depth:
+
+    - deep     → mọi dòng
+    - standard → RulePrefilter: dòng allow-list bỏ qua, suspicious / ambiguous → LLM
+    - quick    → stratified sample: mọi dòng DENY/BLOCK + khớp THREAT_RULES (tới trần),
+                 K dòng / template (Drain), K dòng / source IP; coverage() ước lượng
+                 số dòng threat trên toàn dataset từ tỉ lệ threat của từng stratum
+    """
+
+    def __init__(self, depth: Optional[str], source_type: Optional[str] = None, seed: Optional[int] = None):
+        self.depth = depth if depth in DEPTHS else "standard"
+        self.source_type = source_type
+        self.rng = random.Random(settings.HUNT_QUICK_SEED if seed is None else seed)
+
+        self.total = 0
+        self.selected: List[int] = []
+        self.skipped = 0
+
+        # quick: stratum của từng dòng được chọn + verdict LLM trả về
+        self._strata: Dict[str, _Stratum] = {}
+        self._stratum_of: Dict[int, str] = {}
+        self._sources_total = 0
+        self._sources_sampled = 0
+        self._threats: Dict[int, bool] = {}
+
+    # =====================================================
+    # SELECT
+    # =====================================================
+
+    def select(self, lines: List[str]) -> List[int]:
+        """
+        Index (theo thứ tự file) các dòng cần gửi lên LLM
+        """
+        self.total = len(lines)
+        if self.depth == "deep":
+            self.selected = list(range(self.total))
+        elif self.depth == "standard":
+            self.selected = self._select_standard(lines)
+        else:
+            self.selected = self._select_quick(lines)
+
+        self.skipped = self.total - len(self.selected)
+        print(
+            f"[HUNT] Depth {self.depth}: {len(self.selected)}/{self.total} lines → LLM "
+            f"({self.skipped} skipped)"
+        )
+        return self.selected
+
+    def _select_standard(self, lines: List[str]) -> List[int]:
+        prefilter = get_prefilter(self.source_type)
+        return [i for i, line in enumerate(lines) if prefilter.classify(line)[0] != "allow"]
+
+    def _select_quick(self, lines: List[str]) -> List[int]:
+        miner = DrainMiner(
+            sim_threshold=settings.DRAIN_SIM_THRESHOLD,
+            depth=settings.DRAIN_DEPTH,
+            max_children=settings.DRAIN_MAX_CHILDREN,
+            max_clusters=settings.DRAIN_MAX_CLUSTERS,
+        )
+        per_template = settings.HUNT_QUICK_PER_TEMPLATE
+        per_source = settings.HUNT_QUICK_PER_SOURCE
+        max_flagged = settings.HUNT_QUICK_MAX_FLAGGED
+
+        strata = self._strata
+        sources: Dict[str, _Stratum] = {}
+        # Drain + regex ~100µs/dòng; dòng cùng hình dạng (chỉ khác chữ số) → cùng stratum,
+        # chỉ phân loại một lần (sampling, không phải verdict → sai lệch hiếm gặp chấp nhận được)
+        shapes: Dict[str, str] = {}
+
+        for i, line in enumerate(lines):
+            shape = line.translate(_DIGITS)
+            key = shapes.get(shape)
+            if key is None:
+                # DENY/BLOCK + payload khớp THREAT_RULES → lấy hết (tới trần HUNT_QUICK_MAX_FLAGGED)
+                if _BLOCKED.search(line) or ThreatDetector.first_match(line):
+                    key = "flagged"
+                else:
+                    key = f"template:{miner.add(line).cluster_id}"
+                if len(shapes) >= _SHAPE_CACHE_SIZE:
+                    shapes.clear()
+                shapes[shape] = key
+
+            if key == "flagged":
+                capacity = max_flagged
+            else:
+                capacity = per_template
+                match = _SOURCE_IP.search(line)
+                if match:
+                    source = sources.get(match.group(1))
+                    if source is None:
+                        source = sources[match.group(1)] = _Stratum()
+                    source.offer(i, per_source, self.rng)
+
+            stratum = strata.get(key)
+            if stratum is None:
+                stratum = strata[key] = _Stratum()
+            stratum.offer(i, capacity, self.rng)
+
+        for key, stratum in strata.items():
+            for i in stratum.sample:
+                self._stratum_of[i] = key
+
+        # dòng chọn theo source IP được tính vào stratum template của nó (oversample),
+        # quá nhiều source → chọn ngẫu nhiên HUNT_QUICK_MAX_SOURCES source
+        self._sources_total = len(sources)
+        picked = list(sources.values())
+        if len(picked) > settings.HUNT_QUICK_MAX_SOURCES:
+            picked = self.rng.sample(picked, settings.HUNT_QUICK_MAX_SOURCES)
+        self._sources_sampled = len(picked)
+
+        for source in picked:
+            for i in source.sample:
+                if i not in self._stratum_of:
+                    self._stratum_of[i] = self._template_key(miner, shapes, lines[i])
+
+        return sorted(self._stratum_of)
+
+    @staticmethod
+    def _template_key(miner: DrainMiner, shapes: Dict[str, str], line: str) -> str:
+        key = shapes.get(line.translate(_DIGITS))
+        if key is not None:
+            return key
+        cluster = miner.match(line)
+        return f"template:{cluster.cluster_id}" if cluster else "template:evicted"
+
+    # =====================================================
+    # OBSERVE + COVERAGE
+    # =====================================================
+
+    def observe(self, indexes: Iterable[int], results: Iterable[Dict[str, Any]]) -> None:
+        for i, result in zip(indexes, results):
+            self._threats[i] = bool(result.get("is_threat"))
+
+    def coverage(self) -> Dict[str, Any]:
+        """
+        Báo cáo coverage cho completion event / HuntExecution.telemetry
+        """
+        analyzed = len(self._threats)
+        report: Dict[str, Any] = {
+            "depth": self.depth,
+            "lines_total": self.total,
+            "lines_selected": len(self.selected),
+            "lines_analyzed": analyzed,
+            "coverage_pct": round(analyzed / self.total * 100, 2) if self.total else 100.0,
+            "threat_lines_found": sum(self._threats.values()),
+        }
+
+        if self.depth == "standard":
+            # dòng allow-list đã được rule phân loại → vẫn tính là được xét
+            report["prefiltered_lines"] = self.skipped
+            report["evaluated_pct"] = (
+                round((analyzed + self.skipped) / self.total * 100, 2) if self.total else 100.0
+            )
+        elif self.depth == "quick":
+            report.update(self._estimate())
+
+        return report
+
+    def _estimate(self) -> Dict[str, Any]:
+        """
+        Ước lượng stratified: N_h * p̂_h trên từng stratum (p̂_h = tỉ lệ threat trong mẫu),
+        CI 95% theo xấp xỉ chuẩn có finite population correction.
+        Stratum không thấy threat nào → cận trên rule-of-three (3/n_h) cho phần chưa xét.
+        """
+        sampled: Dict[str, List[bool]] = {}
+        for i, is_threat in self._threats.items():
+            sampled.setdefault(self._stratum_of.get(i, "template:evicted"), []).append(is_threat)
+
+        estimate = 0.0
+        variance = 0.0
+        unseen_upper = 0.0
+        templates = 0
+        templates_sampled = 0
+
+        for key, stratum in self._strata.items():
+            if key.startswith("template:"):
+                templates += 1
+            hits = sampled.get(key) or []
+            n = len(hits)
+            if n == 0:
+                continue
+            if key.startswith("template:"):
+                templates_sampled += 1
+
+            # dòng của source IP có thể làm mẫu lớn hơn reservoir → chặn ở N_h
+            size = max(stratum.size, n)
+            p = sum(hits) / n
+            estimate += size * p
+            if n > 1 and size > n:
+                variance += size ** 2 * (1 - n / size) * p * (1 - p) / (n - 1)
+            if p == 0:
+                unseen_upper += (size - n) * min(1.0, 3 / n)
+
+        flagged = self._strata.get("flagged")
+        margin = _Z95 * math.sqrt(variance)
+        return {
+            "flagged_lines": flagged.size if flagged else 0,
+            "flagged_sampled": len(flagged.sample) if flagged else 0,
+            "templates": templates,
+            "templates_sampled": templates_sampled,
+            "source_ips": self._sources_total,
+            "source_ips_sampled": self._sources_sampled,
+            "estimated_threat_lines": round(estimate),
+            "estimated_threat_lines_ci95": [max(round(estimate - margin), 0), round(estimate + margin)],
+            "unseen_threat_lines_upper95": round(unseen_upper),
+        }
@@ -0,0 +1,167 @@
+# backend/app/services/llm_telemetry.py
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from app.core.config import settings
+
+# Batch đang chạy trên thread / context hiện tại → AIProcessor ghi từng lần gọi Ollama vào đây
+_current_batch: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar(
+    "llm_telemetry_batch", default=None
+)
+
+# field thời gian (nanosecond) trong response cuối của Ollama
+_OLLAMA_DURATIONS = {
+    "total_duration": "ollama_seconds",
+    "load_duration": "load_seconds",
+    "prompt_eval_duration": "prompt_eval_seconds",
+    "eval_duration": "eval_seconds",
+}
+
+
+def record_llm_call(
+    response: Dict[str, Any],
+    call_seconds: float,
+    queue_seconds: float = 0.0,
+    prompt_build_seconds: float = 0.0,
+    parse_seconds: float = 0.0,
+) -> None:
+    """
+    Ghi một lần gọi Ollama vào batch hiện tại (không có batch nào đang mở → bỏ qua)
+    """
+    record = _current_batch.get()
+    if record is None:
+        return
+
+    record["llm_calls"] += 1
+    record["prompt_tokens"] += int(response.get("prompt_eval_count") or 0)
+    record["output_tokens"] += int(response.get("eval_count") or 0)
+    for field, key in _OLLAMA_DURATIONS.items():
+        record[key] += (response.get(field) or 0) / 1e9
+    record["call_seconds"] += call_seconds
+    record["queue_seconds"] += queue_seconds
+    record["prompt_build_seconds"] += prompt_build_seconds
+    record["parse_seconds"] += parse_seconds
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    pos = (len(ordered) - 1) * q
+    lo = int(pos)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (pos - lo)
+
+
+class LLMTelemetry:
+    """
+    Telemetry theo batch LLM của một job / hunt execution.
+
+    - batch(): mở record cho một batch; mọi lần gọi Ollama (kể cả retry / bisect, cascade)
+      trong context đó cộng dồn token + thời gian của Ollama, queue wait, build prompt, parse
+    - record_flush(): thời gian ghi kết quả xuống DB
+    - summary(): tokens/sec, p50/p95 batch latency, fallback rate, phân rã thời gian
+      + tối đa TELEMETRY_MAX_BATCHES record chi tiết
+    """
+
+    def __init__(self, max_batches: Optional[int] = None):
+        self.max_batches = settings.TELEMETRY_MAX_BATCHES if max_batches is None else max_batches
+        self._lock = threading.Lock()
+        self._batches: List[Dict[str, Any]] = []
+        self._latencies: List[float] = []
+        self._totals: Dict[str, float] = {}
+        self._flush: List[float] = []
+        self._started = time.monotonic()
+
+    @contextmanager
+    def batch(self, lines: int) -> Iterator[Dict[str, Any]]:
+        """
+        with telemetry.batch(len(batch)) as rec:
+            results = ...
+            rec["fallback_lines"] = ...
+        """
+        record: Dict[str, Any] = {
+            "lines": lines,
+            "fallback_lines": 0,
+            "llm_calls": 0,
+            "prompt_tokens": 0,
+            "output_tokens": 0,
+            "call_seconds": 0.0,
+            "queue_seconds": 0.0,
+            "prompt_build_seconds": 0.0,
+            "parse_seconds": 0.0,
+            **{key: 0.0 for key in _OLLAMA_DURATIONS.values()},
+        }
+        token = _current_batch.set(record)
+        started = time.perf_counter()
+        try:
+            yield record
+        finally:
+            _current_batch.reset(token)
+            record["seconds"] = time.perf_counter() - started
+            self._add(record)
+
+    def _add(self, record: Dict[str, Any]) -> None:
+        with self._lock:
+            self._latencies.append(record["seconds"])
+            for key, value in record.items():
+                self._totals[key] = self._totals.get(key, 0) + value
+            if len(self._batches) < self.max_batches:
+                self._batches.append({
+                    k: round(v, 4) if isinstance(v, float) else v for k, v in record.items()
+                })
+
+    def record_flush(self, seconds: float) -> None:
+        with self._lock:
+            self._flush.append(seconds)
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            totals = dict(self._totals)
+            latencies = list(self._latencies)
+            flush = list(self._flush)
+            batches = list(self._batches)
+
+        lines = int(totals.get("lines", 0))
+        prompt_tokens = int(totals.get("prompt_tokens", 0))
+        output_tokens = int(totals.get("output_tokens", 0))
+        prompt_eval = totals.get("prompt_eval_seconds", 0)
+        eval_seconds = totals.get("eval_seconds", 0)
+
+        return {
+            "batches": len(latencies),
+            "lines": lines,
+            "llm_calls": int(totals.get("llm_calls", 0)),
+            "fallback_rate": round(totals.get("fallback_lines", 0) / lines * 100, 2) if lines else 0,
+            "batch_latency": {
+                "p50": round(_percentile(latencies, 0.50), 3),
+                "p95": round(_percentile(latencies, 0.95), 3),
+                "max": round(max(latencies), 3) if latencies else 0,
+                "mean": round(sum(latencies) / len(latencies), 3) if latencies else 0,
+            },
+            "tokens": {
+                "prompt": prompt_tokens,
+                "output": output_tokens,
+                "prompt_per_sec": round(prompt_tokens / prompt_eval, 1) if prompt_eval else 0,
+                "output_per_sec": round(output_tokens / eval_seconds, 1) if eval_seconds else 0,
+            },
+            # tổng thời gian theo từng giai đoạn (cộng trên mọi batch, batch song song thì > wall)
+            "seconds": {
+                "wall": round(time.monotonic() - self._started, 3),
+                "batches": round(sum(latencies), 3),
+                "queue": round(totals.get("queue_seconds", 0), 3),
+                "prompt_build": round(totals.get("prompt_build_seconds", 0), 3),
+                "http": round(totals.get("call_seconds", 0), 3),
+                "ollama_total": round(totals.get("ollama_seconds", 0), 3),
+                "load": round(totals.get("load_seconds", 0), 3),
+                "prompt_eval": round(prompt_eval, 3),
+                "eval": round(eval_seconds, 3),
+                "parse": round(totals.get("parse_seconds", 0), 3),
+                "db_flush": round(sum(flush), 3),
+            },
+            "db_flush_p95": round(_percentile(flush, 0.95), 4),
+            "per_batch": batches,
+        }
@@ -1,5 +1,196 @@
 import re
-from typing import List, Dict, Any
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+# ======================================================
+# KEY=VALUE TOKENIZER
+# ======================================================
+# Format firewall trong các file upload:
+#   2025-11-30 10:00:00 INFO FIREWALL id=1 action=DENY src=... dst=... src_port=... dst_port=...
+#   protocol=TCP rule=R1 msg="connection denied"
+# Một lượt cho cả dòng thay vì re.search từng field. Dòng cùng file hầu như cùng thứ tự key
+# → KVTokenizer học "layout" (thứ tự key, value nào trong nháy) từ dòng trước và compile một
+# regex neo đầu dòng cho layout đó: dòng sau chỉ cần một lần match(). Lệch layout → tách
+# tổng quát (split theo dấu nháy rồi khoảng trắng) và học layout mới.
+# Value trong "..." được lấy trọn nên "user=admin" nằm trong msg không bị nhận nhầm thành field.
+_KV = re.compile(r'(\w+)=("[^"\\]*(?:\\.[^"\\]*)*"?|[^\s"]*)')
+_HEADER = re.compile(r"(\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2})(?: ([A-Z]+) ([A-Z][\w-]*)(?= ))?")
+_TIMESTAMP = re.compile(r"\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}")
+
+_HEADER_LAYOUTS = (
+    "",
+    r"(?P<time>\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2})",
+    r"(?P<time>\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}) (?P<level>[A-Z]+) (?P<facility>[A-Z][\w-]*)",
+)
+_HEADER_FIELDS = frozenset({"time", "level", "facility"})
+_QUOTED_VALUE = r'"(?P<{}>[^"\\]*(?:\\.[^"\\]*)*)"'
+_BARE_VALUE = r'(?P<{}>[^\s"]*)'
+_MAX_LAYOUTS = 256
+
+# field kiểu số (giữ nguyên string nếu không phải số nguyên)
+_INT_FIELDS = frozenset({
+    "id", "src_port", "dst_port", "sport", "dport", "srcport", "dstport",
+    "bytes", "sent", "rcvd", "packets", "duration", "len",
+})
+
+
+class KVTokenizer:
+    """
+    Parse dòng key=value thành dict có kiểu:
+    header (time / level / facility) + mọi cặp key=value, port / id → int,
+    value trong "..." bỏ dấu nháy (\\" → ")
+    """
+
+    def __init__(self):
+        # (regex với named group = key, key kiểu int, key có value trong nháy)
+        self._layout: Optional[Tuple[re.Pattern, Tuple[str, ...], Tuple[str, ...]]] = None
+        self._compiled: Dict[Tuple, Tuple] = {}
+
+    def tokenize(self, line: str) -> Dict[str, Any]:
+        layout = self._layout
+        if layout is not None:
+            match = layout[0].match(line)
+            if match:
+                fields = match.groupdict()
+                for name in layout[1]:
+                    value = fields[name]
+                    if value.isdigit():
+                        fields[name] = int(value)
+                for name in layout[2]:
+                    value = fields[name]
+                    if "\\" in value:
+                        fields[name] = value.replace('\\"', '"')
+                return fields
+
+        fields, key = _tokenize_general(line)
+        if key is not None:
+            self._layout = self._compile(key)
+        return fields
+
+    def pick(self, line: str, *names: str) -> Tuple[Optional[str], ...]:
+        """
+        Chỉ lấy vài field (string, không ép kiểu) → khớp layout thì không cần dựng cả dict
+        """
+        layout = self._layout
+        if layout is not None:
+            match = layout[0].match(line)
+            if match:
+                index = layout[0].groupindex
+                return tuple(match.group(name) if name in index else None for name in names)
+
+        fields = self.tokenize(line)
+        return tuple(None if fields.get(name) is None else str(fields[name]) for name in names)
+
+    def _compile(self, key: Tuple) -> Tuple:
+        layout = self._compiled.get(key)
+        if layout is None:
+            header, pairs = key
+            parts = [_HEADER_LAYOUTS[header]]
+            for name, quoted in pairs:
+                parts.append(" +" if parts[-1] else " *")
+                parts.append(f"{name}=" + (_QUOTED_VALUE if quoted else _BARE_VALUE).format(name))
+            layout = (
+                re.compile("".join(parts) + r"\s*\Z"),
+                tuple(name for name, quoted in pairs if not quoted and name in _INT_FIELDS),
+                tuple(name for name, quoted in pairs if quoted),
+            )
+            if len(self._compiled) >= _MAX_LAYOUTS:
+                self._compiled.clear()
+            self._compiled[key] = layout
+        return layout
+
+
+def _tokenize_general(line: str) -> Tuple[Dict[str, Any], Optional[Tuple]]:
+    """
+    Tách tổng quát. Trả về (fields, layout key); layout key = None nếu dòng không học được
+    layout (có chữ lẻ ngoài key=value, key trùng, nháy escape / thiếu nháy đóng...)
+    """
+    fields: Dict[str, Any] = {}
+    header = _HEADER.match(line)
+    header_kind = 0
+    rest = line
+    if header:
+        fields["time"] = header.group(1)
+        header_kind = 1
+        if header.group(2):
+            fields["level"] = header.group(2)
+            fields["facility"] = header.group(3)
+            header_kind = 2
+        rest = line[header.end():]
+
+    if '\\"' in rest:
+        for key, value in _KV.findall(rest):
+            if value[:1] == '"':
+                value = value[1:-1] if len(value) > 1 and value[-1] == '"' else value[1:]
+                value = value.replace('\\"', '"')
+            elif key in _INT_FIELDS and value.isdigit():
+                value = int(value)
+            fields[key] = value
+        return fields, None
+
+    pairs: List[Tuple[str, bool]] = []
+    learnable = rest.count('"') % 2 == 0
+
+    # phần tử lẻ của split('"') là nội dung trong nháy (dòng bị cắt → thiếu nháy đóng vẫn đúng)
+    pending = None
+    segments = rest.split('"') if '"' in rest else (rest,)
+    for n, segment in enumerate(segments):
+        if n % 2:
+            if pending is None:
+                learnable = False
+            else:
+                fields[pending] = segment
+                pairs.append((pending, True))
+                pending = None
+            continue
+
+        key = None
+        for token in segment.split():
+            key, eq, value = token.partition("=")
+            if not eq or not key.isidentifier():
+                key = None
+                learnable = False
+                continue
+            if key in _INT_FIELDS and value.isdigit():
+                fields[key] = int(value)
+            else:
+                fields[key] = value
+            pairs.append((key, False))
+        # key= đứng ngay trước dấu nháy mở → value là đoạn trong nháy kế tiếp
+        if key is not None and segment.endswith("=") and n + 1 < len(segments):
+            pending = key
+            pairs.pop()
+        else:
+            pending = None
+
+    names = {name for name, _ in pairs}
+    if not learnable or not pairs or len(names) != len(pairs) or names & _HEADER_FIELDS:
+        return fields, None
+    return fields, (header_kind, tuple(pairs))
+
+
+_tokenizer = KVTokenizer()
+
+
+def tokenize_kv(line: str) -> Dict[str, Any]:
+    """
+    KVTokenizer dùng chung của process (layout học từ các dòng gọi trước)
+    """
+    return _tokenizer.tokenize(line)
+
+
+def tokenize_kv_batch(lines: Union[Iterable[str], str, bytes]) -> List[Dict[str, Any]]:
+    """
+    Parse cả batch: list dòng hoặc buffer (str / bytes) nhiều dòng, dòng rỗng bị bỏ qua.
+    Tokenizer riêng cho batch → layout không bị các luồng khác đổi giữa chừng.
+    """
+    if isinstance(lines, bytes):
+        lines = lines.decode("utf-8", errors="ignore")
+    if isinstance(lines, str):
+        lines = lines.split("\n")
+
+    tokenize = KVTokenizer().tokenize
+    return [tokenize(line) for line in lines if line and not line.isspace()]
+
 
 class LogParser:
     """
@@ -13,6 +204,8 @@ class LogParser:
         "cisco": r"(?P<datetime>\S+) (?P<facility>\S+) (?P<msg>.+)",
         "checkpoint": r"(?P<datetime>\S+) (?P<msg>.+)",
     }
+    # compile một lần lúc import (parse() gọi cho từng dòng)
+    _COMPILED = {name: re.compile(pattern) for name, pattern in FIREWALL_PATTERNS.items()}
 
     @staticmethod
     def parse(raw_log: str, firewall_type: str = "fortigate") -> Dict[str, Any]:
@@ -20,11 +213,11 @@ class LogParser:
         Parse một dòng log thành dict.
         Nếu không match pattern, trả về raw log trong field 'raw'.
         """
-        pattern = LogParser.FIREWALL_PATTERNS.get(firewall_type.lower())
+        pattern = LogParser._COMPILED.get(firewall_type.lower())
         if not pattern:
             return {"raw": raw_log}
 
-        match = re.match(pattern, raw_log)
+        match = pattern.match(raw_log)
         if match:
             return match.groupdict()
         else:
@@ -35,21 +228,47 @@ class LogParser:
         """
         Parse một batch log
         """
-        return [LogParser.parse(line, firewall_type) for line in logs]
+        pattern = LogParser._COMPILED.get(firewall_type.lower())
+        if not pattern:
+            return [{"raw": line} for line in logs]
+
+        results = []
+        for line in logs:
+            match = pattern.match(line)
+            results.append(match.groupdict() if match else {"raw": line})
+        return results
+
+    # =====================================================
+    # KEY=VALUE (format firewall của file upload)
+    # =====================================================
+
+    @staticmethod
+    def parse_kv(raw_log: str) -> Dict[str, Any]:
+        return tokenize_kv(raw_log) if raw_log else {}
 
     @staticmethod
-    def parse_raw_log(raw_log: str):
+    def parse_kv_batch(lines: Union[Iterable[str], str, bytes]) -> List[Dict[str, Any]]:
+        return tokenize_kv_batch(lines)
+
+    @staticmethod
+    def parse_raw_log(raw_log: str) -> Dict[str, Any]:
+        """
+        time / action / src cho verdict dùng lại (cache, prefilter) và dashboard
+        """
         if not raw_log:
             return {}
 
+        time, action, src = _tokenizer.pick(raw_log, "time", "action", "src")
+        if time is None:
+            # timestamp không nằm đầu dòng (syslog prefix...)
+            match = _TIMESTAMP.search(raw_log)
+            time = match.group(0) if match else None
+
         return {
-            "time": re.search(r"\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}", raw_log).group(0)
-                if re.search(r"\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}", raw_log) else None,
-            "action": re.search(r"action=(\w+)", raw_log).group(1)
-                if re.search(r"action=(\w+)", raw_log) else "unknown",
-            "src": re.search(r"src=([\d\.]+)", raw_log).group(1)
-                if re.search(r"src=([\d\.]+)", raw_log) else None,
+            "time": time,
+            "action": action or "unknown",
+            "src": src,
             "threat": "Firewall Event"
         }
-        
-logParser = LogParser()
\ No newline at end of file
+
+logParser = LogParser()
@@ -0,0 +1,76 @@
+# backend/app/services/pipeline_stats.py
+import threading
+from typing import Dict
+
+
+class PipelineStats:
+    """
+    Per-job counters cho pipeline phân tích (cache, tier, retry...).
+
+    - Thread-safe: các batch in-flight cập nhật từ worker thread
+    - Key dạng "nhóm.tên" (vd: "cache.hits") → section(...) gom theo nhóm
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = {}
+
+    def incr(self, key: str, n: float = 1) -> None:
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + n
+
+    def set_once(self, key: str, value: float) -> bool:
+        """
+        Ghi giá trị nếu key chưa có (vd: latency batch đầu tiên). True nếu đã ghi.
+        """
+        with self._lock:
+            if key in self._counters:
+                return False
+            self._counters[key] = value
+            return True
+
+    def get(self, key: str, default: float = 0) -> float:
+        with self._lock:
+            return self._counters.get(key, default)
+
+    def section(self, prefix: str) -> Dict[str, float]:
+        """
+        Trả về các counter thuộc nhóm `prefix` (bỏ tiền tố)
+        """
+        head = f"{prefix}."
+        with self._lock:
+            return {
+                k[len(head):]: v
+                for k, v in self._counters.items()
+                if k.startswith(head)
+            }
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self._counters)
+
+    def redirect(self, prefix: str, target: str) -> "PipelineStats":
+        """
+        View ghi chung counter với stats này, riêng nhóm `prefix` được ghi sang nhóm `target`
+        (vd: retry của model nhỏ trong cascade không lẫn vào retry của job)
+        """
+        return _RedirectedStats(self, prefix, target)
+
+
+class _RedirectedStats(PipelineStats):
+    def __init__(self, base: PipelineStats, prefix: str, target: str):
+        self._lock = base._lock
+        self._counters = base._counters
+        self._head = f"{prefix}."
+        self._target = f"{target}."
+
+    def _key(self, key: str) -> str:
+        if key.startswith(self._head):
+            return self._target + key[len(self._head):]
+        return key
+
+    def incr(self, key: str, n: float = 1) -> None:
+        super().incr(self._key(key), n)
+
+    def set_once(self, key: str, value: float) -> bool:
+        return super().set_once(self._key(key), value)
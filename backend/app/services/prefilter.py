@@ -0,0 +1,210 @@
+# backend/app/services/prefilter.py
+import json
+import re
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.ai_processor import AIProcessor
+from app.services.log_parser import LogParser
+from app.services.pipeline_stats import PipelineStats
+from app.services.threat_detector import ThreatDetector
+
+# ======================================================
+# ALLOW-LIST RULES THEO SOURCE TYPE
+# ======================================================
+# Mỗi rule là danh sách điều kiện (regex) phải cùng khớp trên một dòng.
+# Chỉ áp dụng khi dòng KHÔNG khớp bất kỳ THREAT_RULES nào (không có payload đáng ngờ)
+# và không chứa từ khóa cảnh báo (_ALERT_MSG / _ALERT_WORDS).
+_ALLOWED = r"\baction=(?:allow|accept|pass|permit)\b"
+
+# từ khóa firewall / IDS / proxy dùng khi đã gắn cờ (beacon, c2, malware...) → không bao giờ allow-list
+_ALERT_KEYWORDS = (
+    r"\b(?:c2|c&c|beacon\w*|malware|botnet|trojan|ransom\w*|backdoor|exfil\w*|"
+    r"threat|alert|attack|exploit|intrusion|suspicious|scan\w*|phish\w*|tunnel\w*|blacklist\w*|ioc)\b"
+)
+# dòng key=value: chỉ xét trong msg (tên field như "threat_id" không tính)
+_ALERT_MSG = re.compile(r"\bmsg=\"?[^\"]*" + _ALERT_KEYWORDS, re.IGNORECASE)
+# dòng không có msg= (proxy / access log): xét cả dòng (URL, category...)
+_ALERT_WORDS = re.compile(_ALERT_KEYWORDS, re.IGNORECASE)
+
+PREFILTER_PROFILES: Dict[str, List[Dict[str, Any]]] = {
+    "firewall": [
+        {
+            "name": "DNS-PUBLIC-RESOLVER",
+            "match": [
+                _ALLOWED,
+                r"\bdst=(?:8\.8\.8\.8|8\.8\.4\.4|1\.1\.1\.1|1\.0\.0\.1|9\.9\.9\.9|208\.67\.222\.222)\b",
+                r"\bdst_port=53\b",
+            ],
+        },
+        {
+            "name": "NTP-ALLOW",
+            "match": [_ALLOWED, r"\bdst_port=123\b", r"\bprotocol=udp\b"],
+        },
+    ],
+    # HTTPS qua proxy chỉ được allow khi đích tin cậy (xem _trusted_https_rules)
+    "proxy": [],
+}
+
+
+def _alerted(line: str) -> bool:
+    return bool((_ALERT_MSG if "msg=" in line else _ALERT_WORDS).search(line))
+
+
+def _trusted_https_rules() -> Dict[str, Dict[str, Any]]:
+    """
+    HTTPS (443) được allow chỉ khi đích nằm trong PREFILTER_HTTPS_TRUSTED_DSTS:
+    - firewall: dst=<trusted> dst_port=443 protocol=tcp
+    - proxy:    CONNECT <trusted>:443 trả 200 (status squid "TCP_TUNNEL/200" hoặc access log '..." 200 ')
+    Danh sách rỗng → không có rule (C2 / exfil qua 443 luôn phải lên LLM).
+    """
+    dsts = [d.strip() for d in settings.PREFILTER_HTTPS_TRUSTED_DSTS if d.strip()]
+    if not dsts:
+        return {}
+    alternation = "|".join(re.escape(d) for d in dsts)
+    return {
+        "firewall": {
+            "name": "HTTPS-TRUSTED-DST",
+            "match": [
+                _ALLOWED,
+                r"\bdst=(?:" + alternation + r")(?=\s|$)",
+                r"\bdst_port=443\b",
+                r"\bprotocol=tcp\b",
+            ],
+        },
+        "proxy": {
+            "name": "HTTPS-CONNECT-TRUSTED",
+            "match": [
+                r"\bCONNECT (?:" + alternation + r"):443(?=[\s\"]|$)",
+                r"(?:\b[A-Z_]+/200|\" 200)(?=\s|$)",
+            ],
+        },
+    }
+
+
+def _load_profiles() -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Profile mặc định + override từ PREFILTER_RULES_FILE (JSON cùng cấu trúc)
+    """
+    profiles = dict(PREFILTER_PROFILES)
+    for source_type, rule in _trusted_https_rules().items():
+        profiles[source_type] = [*profiles.get(source_type, []), rule]
+    if settings.PREFILTER_RULES_FILE:
+        try:
+            with open(settings.PREFILTER_RULES_FILE, "r", encoding="utf-8") as f:
+                profiles.update(json.load(f))
+        except (OSError, ValueError) as e:
+            print(f"[PREFILTER] ⚠️ Không đọc được {settings.PREFILTER_RULES_FILE}: {e}")
+    return profiles
+
+
+class RulePrefilter:
+    """
+    Tier 1 trước AIProcessor:
+
+    - Dòng khớp THREAT_RULES (1 alternation precompiled) → suspicious → LLM
+    - Có từ khóa cảnh báo (beacon, c2, malware...)       → ambiguous → LLM
+    - Dòng khớp allow-list của source type              → verdict "none" ngay
+    - Còn lại (ambiguous)                                → LLM
+    """
+
+    def __init__(self, source_type: str, rules: List[Dict[str, Any]]):
+        self.source_type = source_type
+        self.rules: List[Tuple[str, List[re.Pattern]]] = [
+            (rule["name"], [re.compile(p, re.IGNORECASE) for p in rule["match"]])
+            for rule in rules
+        ]
+
+    # =====================================================
+    # CLASSIFY
+    # =====================================================
+
+    def classify(self, line: str) -> Tuple[str, Optional[str]]:
+        """
+        Trả về ("suspicious", threat) | ("allow", rule_name) | ("ambiguous", None)
+        """
+        threat = ThreatDetector.first_match(line)
+        if threat:
+            return "suspicious", threat
+        if _alerted(line):
+            return "ambiguous", None
+
+        for name, patterns in self.rules:
+            if all(p.search(line) for p in patterns):
+                return "allow", name
+
+        return "ambiguous", None
+
+    def analyze_batch(
+        self,
+        logs: List[str],
+        analyze_fn: Callable[[List[str]], List[Dict[str, Any]]],
+        stats: Optional[PipelineStats] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Giống analyze_fn(logs) nhưng chỉ gửi dòng suspicious / ambiguous xuống tầng sau
+        """
+        stats = stats or PipelineStats()
+        results: List[Optional[Dict[str, Any]]] = [None] * len(logs)
+        forward: List[int] = []
+
+        for i, line in enumerate(logs):
+            decision, rule = self.classify(line)
+            stats.incr(f"prefilter.{decision}")
+            if decision == "allow":
+                results[i] = self._benign_verdict(line, rule)
+            else:
+                forward.append(i)
+
+        stats.incr("tiers.rule", len(logs) - len(forward))
+
+        if forward:
+            fresh = analyze_fn([logs[i] for i in forward])
+            for i, result in zip(forward, fresh):
+                results[i] = result
+
+        # tầng sau trả thiếu kết quả → fallback, không để None
+        return [
+            r if r is not None else AIProcessor._safe_fallback(logs[i])
+            for i, r in enumerate(results)
+        ]
+
+    @staticmethod
+    def _benign_verdict(raw_log: str, rule: str) -> Dict[str, Any]:
+        parsed = LogParser.parse_raw_log(raw_log)
+        return {
+            "risk_level": "none",
+            "threat_type": "normal",
+            "is_threat": False,
+            "confidence": 90,
+            "summary": f"Allowed traffic matched prefilter rule {rule}",
+            "details": {
+                "source_ip": parsed.get("src"),
+                "timestamp": parsed.get("time"),
+                "action": parsed.get("action"),
+            },
+            "recommendations": [],
+            "raw_log": raw_log,
+            "source": "rule",
+        }
+
+    @staticmethod
+    def report(stats: PipelineStats) -> Dict[str, int]:
+        return {k: int(v) for k, v in stats.section("prefilter").items()}
+
+
+# ======================================================
+# INSTANCE THEO SOURCE TYPE
+# ======================================================
+_prefilters: Dict[str, RulePrefilter] = {}
+_prefilters_lock = threading.Lock()
+
+
+def get_prefilter(source_type: Optional[str]) -> RulePrefilter:
+    source_type = (source_type or "firewall").lower()
+    with _prefilters_lock:
+        if source_type not in _prefilters:
+            rules = _load_profiles().get(source_type, [])
+            _prefilters[source_type] = RulePrefilter(source_type, rules)
+        return _prefilters[source_type]
@@ -0,0 +1,212 @@
+# backend/app/services/template_miner.py
+import json
+import os
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from app.services.verdict_cache import log_template
+
+WILDCARD = "<*>"
+
+
+class LogCluster:
+    """
+    Một template log (Drain) + số dòng đã khớp
+    """
+
+    __slots__ = ("cluster_id", "tokens", "size", "path")
+
+    def __init__(self, cluster_id: int, tokens: List[str], path: List[str], size: int = 0):
+        self.cluster_id = cluster_id
+        self.tokens = tokens
+        self.path = path  # đường đi trong parse tree (để save / load đúng vị trí)
+        self.size = size
+
+    @property
+    def template(self) -> str:
+        return " ".join(self.tokens)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.cluster_id,
+            "tokens": self.tokens,
+            "path": self.path,
+            "size": self.size,
+        }
+
+
+class DrainMiner:
+    """
+    Online log template miner (Drain parse tree).
+
+    - Một lượt duy nhất, memory giới hạn bởi max_clusters (LRU eviction)
+    - Tree: số token → `depth - 2` token đầu → danh sách cluster
+    - add(line)   → cập nhật template (lượt mining)
+    - match(line) → chỉ tìm cluster, không cập nhật (lượt gán verdict)
+    - save / load → tái sử dụng template tree giữa các job trên cùng LogDataset
+    """
+
+    def __init__(
+        self,
+        sim_threshold: float = 0.7,
+        depth: int = 4,
+        max_children: int = 100,
+        max_clusters: int = 5000,
+    ):
+        self.sim_threshold = sim_threshold
+        self.depth = max(depth, 3)
+        self.max_children = max_children
+        self.max_clusters = max_clusters
+
+        self._root: Dict[str, Any] = {}
+        self._clusters: "OrderedDict[int, LogCluster]" = OrderedDict()
+        self._next_id = 1
+
+    # =====================================================
+    # PUBLIC API
+    # =====================================================
+
+    @property
+    def clusters(self) -> List[LogCluster]:
+        return list(self._clusters.values())
+
+    def get(self, cluster_id: int) -> Optional[LogCluster]:
+        return self._clusters.get(cluster_id)
+
+    def add(self, line: str) -> LogCluster:
+        tokens = self._tokenize(line)
+        leaf, path = self._descend(tokens, create=True)
+
+        cluster = self._best_match(leaf, tokens)
+        if cluster is None:
+            cluster = LogCluster(self._next_id, tokens, path)
+            self._next_id += 1
+            leaf.append(cluster.cluster_id)
+            self._clusters[cluster.cluster_id] = cluster
+            self._evict_if_needed()
+        else:
+            cluster.tokens = [
+                t if t == c else WILDCARD
+                for t, c in zip(tokens, cluster.tokens)
+            ]
+
+        cluster.size += 1
+        self._clusters.move_to_end(cluster.cluster_id)
+        return cluster
+
+    def match(self, line: str) -> Optional[LogCluster]:
+        tokens = self._tokenize(line)
+        leaf, _ = self._descend(tokens, create=False)
+        if leaf is None:
+            return None
+        return self._best_match(leaf, tokens)
+
+    # =====================================================
+    # PERSISTENCE
+    # =====================================================
+
+    def save(self, path: str) -> None:
+        data = {
+            "sim_threshold": self.sim_threshold,
+            "depth": self.depth,
+            "max_children": self.max_children,
+            "max_clusters": self.max_clusters,
+            "next_id": self._next_id,
+            "clusters": [c.to_dict() for c in self._clusters.values()],
+        }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "DrainMiner":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+        miner = cls(
+            sim_threshold=data["sim_threshold"],
+            depth=data["depth"],
+            max_children=data["max_children"],
+            max_clusters=data["max_clusters"],
+        )
+        miner._next_id = data["next_id"]
+
+        for item in data["clusters"]:
+            cluster = LogCluster(item["id"], item["tokens"], item["path"], item["size"])
+            node = miner._root
+            for key in cluster.path[:-1]:
+                node = node.setdefault(key, {})
+            node.setdefault(cluster.path[-1], []).append(cluster.cluster_id)
+            miner._clusters[cluster.cluster_id] = cluster
+
+        return miner
+
+    @classmethod
+    def load_or_create(cls, path: str, **kwargs) -> "DrainMiner":
+        if path and os.path.exists(path):
+            try:
+                return cls.load(path)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"[DRAIN] ⚠️ Không load được template tree {path}: {e}")
+        return cls(**kwargs)
+
+    # =====================================================
+    # INTERNAL
+    # =====================================================
+
+    @staticmethod
+    def _tokenize(line: str) -> List[str]:
+        return log_template(line).split()
+
+    def _descend(self, tokens: List[str], create: bool):
+        """
+        Đi xuống parse tree, trả về (leaf cluster-id list, path)
+        """
+        path = [str(len(tokens))]
+        node = self._root
+
+        for token in tokens[: self.depth - 2]:
+            if not create and path[-1] not in node:
+                return None, path
+            node = node.setdefault(path[-1], {})
+
+            key = WILDCARD if any(ch.isdigit() for ch in token) else token
+            if key not in node:
+                if not create and WILDCARD not in node:
+                    return None, path
+                if not create or len(node) >= self.max_children:
+                    key = WILDCARD
+            path.append(key)
+
+        if path[-1] not in node:
+            if not create:
+                return None, path
+        leaf = node.setdefault(path[-1], [])
+        return leaf, path
+
+    def _best_match(self, leaf: List[int], tokens: List[str]) -> Optional[LogCluster]:
+        best, best_sim = None, -1.0
+
+        for cluster_id in leaf:
+            cluster = self._clusters.get(cluster_id)
+            if cluster is None or len(cluster.tokens) != len(tokens):
+                continue
+
+            same = sum(1 for t, c in zip(tokens, cluster.tokens) if t == c or c == WILDCARD)
+            sim = same / len(tokens) if tokens else 1.0
+            if sim > best_sim:
+                best, best_sim = cluster, sim
+
+        return best if best is not None and best_sim >= self.sim_threshold else None
+
+    def _evict_if_needed(self) -> None:
+        while len(self._clusters) > self.max_clusters:
+            _, cluster = self._clusters.popitem(last=False)
+
+            node = self._root
+            for key in cluster.path[:-1]:
+                node = node.get(key, {})
+            leaf = node.get(cluster.path[-1])
+            if leaf and cluster.cluster_id in leaf:
+                leaf.remove(cluster.cluster_id)
@@ -1,6 +1,6 @@
 # backend/app/services/threat_detector.py
 import re
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 
 class ThreatDetector:
     """
@@ -16,6 +16,30 @@ class ThreatDetector:
         "XSS": r"(<script>|</script>|javascript:)",
     }
 
+    # Precompile 1 lần: từng rule + 1 alternation gộp tất cả (dùng cho prefilter)
+    COMPILED_RULES = {
+        name: re.compile(pattern, re.IGNORECASE)
+        for name, pattern in THREAT_RULES.items()
+    }
+    _RULE_GROUPS = {f"rule{i}": name for i, name in enumerate(THREAT_RULES)}
+    COMBINED_PATTERN = re.compile(
+        "|".join(
+            f"(?P<rule{i}>{pattern})"
+            for i, pattern in enumerate(THREAT_RULES.values())
+        ),
+        re.IGNORECASE,
+    )
+
+    @staticmethod
+    def first_match(raw_log: str) -> Optional[str]:
+        """
+        Quét 1 lượt bằng alternation gộp, trả về tên threat đầu tiên khớp (hoặc None)
+        """
+        match = ThreatDetector.COMBINED_PATTERN.search(raw_log)
+        if not match:
+            return None
+        return ThreatDetector._RULE_GROUPS[match.lastgroup]
+
     @staticmethod
     def detect(parsed_log: Dict[str, Any], raw_log: str = "") -> Dict[str, Any]:
         """
@@ -29,8 +53,8 @@ class ThreatDetector:
         details: Dict[str, str] = {}
 
         # check each rule
-        for threat_name, pattern in ThreatDetector.THREAT_RULES.items():
-            if re.search(pattern, raw_log, re.IGNORECASE):
+        for threat_name, pattern in ThreatDetector.COMPILED_RULES.items():
+            if pattern.search(raw_log):
                 threats_found.append(threat_name)
                 details[threat_name] = raw_log[:200]  # chỉ lấy preview
 
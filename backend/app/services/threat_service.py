@@ -1,31 +1,193 @@
 # backend/app/services/threat_service.py
-from typing import List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+import contextvars
+import math
 import os
-from app.utils.ollama_client import call_ollama
+import time
+from app.core.config import settings
+from app.core.model_residency import get_model_residency, keep_alive_for
+from app.utils.ollama_client import get_ollama_client
 from app.utils.ai_parser import parse_ai_result
+from app.utils.log_reader import iter_log_lines
 from app.prompts.threat_prompt import build_threat_hunt_prompt
 
+# ~3.5 ký tự / token (giống AdaptiveBatcher)
+CHARS_PER_TOKEN = 3.5
+# số evidence giữ lại / source IP trong bước reduce
+EVIDENCE_PER_IP = 5
+
+
 def read_log_file_to_lines(path: str) -> List[str]:
     if not path or not os.path.exists(path):
         return []
-    with open(path, "r", encoding="utf-8", errors="ignore") as f:
-        return [line.strip() for line in f.readlines() if line.strip()]
+    return [line for _, line in iter_log_lines(path)]
+
 
-def hunt_threats_from_lines(lines: List[str], model: str = "qwen3:8b", user_query: str = "") -> List[dict]:
+def hunt_threats_from_lines(lines: List[str], model: str = "qwen3:8b", user_query: str = "") -> Dict[str, Any]:
     """
     Gọi AI để thực hiện threat hunting trên danh sách dòng logs.
+    Không cắt bớt dòng: chia chunk vừa context, phân tích song song rồi gộp lại.
+
+    Trả về nguyên kết quả map-reduce {"items", "by_source_ip", "chunks"}:
+    chunk lỗi chỉ thể hiện ở chunks.failed / covered_lines, không thấy được từ items.
+    """
+    return hunt_threats_map_reduce(lines, model=model, user_query=user_query)
+
+
+# ======================================================
+# MAP-REDUCE HUNT
+# ======================================================
+def hunt_threats_map_reduce(
+    lines: List[str],
+    model: str = "qwen3:8b",
+    user_query: str = "",
+    max_workers: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    - map:    chunk theo ngân sách token (prompt + output phải vừa num_ctx), gọi model song song
+    - merge:  nối các JSON array theo thứ tự chunk, gắn line_index khi model trả đủ dòng
+    - reduce: gom evidence theo source_ip xuyên suốt các chunk
+
+    Trả về {"items", "by_source_ip", "chunks"}.
     """
     print("Hunting threats using model:", model)
     print("Number of log lines:", len(lines))
-    prompt = build_threat_hunt_prompt(lines, user_query)
-    raw = call_ollama(model, prompt, timeout=300)
-    print("Raw AI response length:", len(raw), "content preview:", raw[:500])
+
+    chunks = chunk_lines(lines, user_query)
+    workers = max(1, min(max_workers or settings.HUNT_MAP_WORKERS, len(chunks) or 1))
+    print(f"[HUNT] {len(chunks)} chunks, {workers} workers")
+
+    started = time.monotonic()
+    partials: List[Optional[List[dict]]] = [None] * len(chunks)
+
+    # copy_context: giữ llm_priority / user của task gọi vào cho từng thread
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="hunt-map") as pool:
+        futures = [
+            pool.submit(contextvars.copy_context().run, _hunt_chunk, chunk, offset, model, user_query)
+            for offset, chunk in chunks
+        ]
+        for i, future in enumerate(futures):
+            try:
+                partials[i] = future.result()
+            except Exception as e:
+                print(f"[HUNT] ❌ Chunk {i} failed: {type(e).__name__}: {e}")
+
+    items: List[dict] = []
+    for part in partials:
+        items.extend(part or [])
+
+    failed = sum(1 for part in partials if part is None)
+    print(
+        f"[HUNT] Parsed {len(items)} items from {len(chunks) - failed}/{len(chunks)} chunks "
+        f"in {time.monotonic() - started:.1f}s"
+    )
+
+    return {
+        "items": items,
+        "by_source_ip": reduce_by_source_ip(items),
+        "chunks": {
+            "total": len(chunks),
+            "failed": failed,
+            "lines": len(lines),
+            "covered_lines": sum(len(c) for (_, c), p in zip(chunks, partials) if p is not None),
+        },
+    }
+
+
+def chunk_lines(lines: List[str], user_query: str = "") -> List[tuple]:
+    """
+    Chia lines thành [(offset, chunk)] sao cho prompt + output mỗi chunk vừa
+    num_ctx * BATCH_CONTEXT_FILL, tối đa HUNT_CHUNK_MAX_LINES dòng / chunk
+    """
+    overhead = math.ceil(len(build_threat_hunt_prompt([], user_query)) / CHARS_PER_TOKEN)
+    budget = max(int(settings.OLLAMA_NUM_CTX * settings.BATCH_CONTEXT_FILL) - overhead, 1)
+    max_lines = max(settings.HUNT_CHUNK_MAX_LINES, 1)
+
+    chunks: List[tuple] = []
+    current: List[str] = []
+    offset = 0
+    used = 0
+
+    for i, line in enumerate(lines):
+        cost = math.ceil((len(line) + 1) / CHARS_PER_TOKEN) + settings.HUNT_OUTPUT_TOKENS_PER_LINE
+        if current and (used + cost > budget or len(current) >= max_lines):
+            chunks.append((offset, current))
+            current, used, offset = [], 0, i
+        current.append(line)
+        used += cost
+
+    if current:
+        chunks.append((offset, current))
+    return chunks
+
+
+def _hunt_chunk(chunk: List[str], offset: int, model: str, user_query: str) -> List[dict]:
+    prompt = build_threat_hunt_prompt(chunk, user_query)
+    data = get_ollama_client().generate(
+        model,
+        prompt,
+        options={
+            "temperature": 0.1,
+            "num_ctx": settings.OLLAMA_NUM_CTX,
+            "num_predict": len(chunk) * settings.HUNT_OUTPUT_TOKENS_PER_LINE * 2,
+        },
+        keep_alive=keep_alive_for(),
+    )
+    get_model_residency().observe(model, data)
+    raw = data.get("response", "")
     parsed = parse_ai_result(raw)
-    print(f"Parsed {len(parsed)} threat items from AI response.")
-    # Normalize fields: ensure ai_confidence int
-    for item in parsed:
+    print(f"[HUNT] Chunk @{offset}: {len(chunk)} lines → {len(parsed)} items ({len(raw)} chars)")
+
+    # model trả đủ một object / dòng → map được về dòng gốc
+    aligned = len(parsed) == len(chunk)
+    for i, item in enumerate(parsed):
+        # Normalize fields: ensure ai_confidence int
         try:
             item["ai_confidence"] = int(item.get("ai_confidence", 0))
         except Exception:
             item["ai_confidence"] = 0
+        if aligned:
+            item["line_index"] = offset + i
     return parsed
+
+
+def reduce_by_source_ip(items: List[dict]) -> Dict[str, Dict[str, Any]]:
+    """
+    Gom kết quả của mọi chunk theo source_ip: số dòng, số threat, loại threat,
+    confidence cao nhất, khoảng thời gian và vài evidence tiêu biểu
+    """
+    by_ip: Dict[str, Dict[str, Any]] = {}
+
+    for item in items:
+        ip = str(item.get("source_ip") or "unknown")
+        entry = by_ip.setdefault(ip, {
+            "lines": 0,
+            "threats": 0,
+            "threat_types": {},
+            "max_confidence": 0,
+            "first_seen": None,
+            "last_seen": None,
+            "evidence": [],
+        })
+        entry["lines"] += 1
+
+        ts = item.get("timestamp")
+        if ts:
+            ts = str(ts)
+            entry["first_seen"] = min(entry["first_seen"] or ts, ts)
+            entry["last_seen"] = max(entry["last_seen"] or ts, ts)
+
+        if not item.get("is_threat"):
+            continue
+
+        entry["threats"] += 1
+        threat_type = str(item.get("threat_type") or "Unknown")
+        entry["threat_types"][threat_type] = entry["threat_types"].get(threat_type, 0) + 1
+        entry["max_confidence"] = max(entry["max_confidence"], item.get("ai_confidence", 0))
+        evidence = item.get("evidence")
+        if evidence and evidence not in entry["evidence"] and len(entry["evidence"]) < EVIDENCE_PER_IP:
+            entry["evidence"].append(evidence)
+
+    # IP có nhiều threat nhất lên đầu
+    return dict(sorted(by_ip.items(), key=lambda kv: (-kv[1]["threats"], -kv[1]["lines"])))
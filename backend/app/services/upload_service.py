@@ -0,0 +1,317 @@
+# backend/app/services/upload_service.py
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.analysis_job import AnalysisJob
+from app.models.log_dataset import LogDataset
+from app.services.format_detector import FormatDetector
+from app.utils.exceptions import LogTooLargeError, UploadError
+from app.utils.line_index import build_line_index
+
+HASH_SUFFIX = ".sha256"
+FORMAT_SUFFIX = ".format"
+PARTIAL_DIR = ".partial"
+
+_UPLOAD_ID = re.compile(r"[0-9a-f]{32}")
+_SAFE_EXT = re.compile(r"[^a-z0-9.]+")
+
+# hash đang tính dở của upload resumable: upload_id → (offset đã hash, hasher)
+# (process khác nhận chunk tiếp theo / API restart → complete() hash lại từ file)
+_hashers: Dict[str, Tuple[int, Any]] = {}
+_busy: set = set()
+_state_lock = threading.Lock()
+
+
+def stored_sha256(path: str) -> Optional[str]:
+    """
+    sha256 ghi trong file .sha256 lúc upload; None nếu chưa có (không đọc file log)
+    """
+    try:
+        with open(f"{path}{HASH_SUFFIX}", "r", encoding="ascii") as f:
+            digest = f.read().strip()
+    except OSError:
+        return None
+    return digest if len(digest) == 64 else None
+
+
+def stored_log_format(path: str) -> Optional[str]:
+    """
+    Format đoán lúc upload (file .format); None nếu chưa có (upload của bản cũ / detect lỗi)
+    """
+    try:
+        with open(f"{path}{FORMAT_SUFFIX}", "r", encoding="ascii") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def file_sha256(path: str) -> str:
+    """
+    sha256 của file log: đọc file .sha256 ghi lúc upload, không có thì hash theo chunk
+    """
+    digest = stored_sha256(path)
+    if digest is not None:
+        return digest
+
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(settings.UPLOAD_CHUNK_SIZE), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+class UploadService:
+    """
+    Ghi file upload xuống disk theo chunk cố định, không giữ cả file trong memory:
+
+    - save_upload(): multipart UploadFile → đọc UPLOAD_CHUNK_SIZE / lần, sha256 cùng lúc,
+      vượt max_size → dừng ngay + xóa file tạm
+    - resumable (file nhiều GB): begin() → write_chunk(offset) ... → complete();
+      status() trả offset đã nhận để client gửi tiếp sau khi mất kết nối
+    - file lưu theo sha256 (content-addressed) → upload trùng nội dung dùng lại file cũ
+    """
+
+    def __init__(self, upload_dir: str, chunk_size: Optional[int] = None):
+        self.upload_dir = Path(upload_dir)
+        self.partial_dir = self.upload_dir / PARTIAL_DIR
+        self.chunk_size = chunk_size or settings.UPLOAD_CHUNK_SIZE
+        self.partial_dir.mkdir(parents=True, exist_ok=True)
+
+    # =====================================================
+    # ONE-SHOT (multipart)
+    # =====================================================
+
+    async def save_upload(self, file, max_size: Optional[int] = None) -> Dict[str, Any]:
+        """
+        file: UploadFile (hoặc object có async read(n))
+        """
+        max_size = settings.UPLOAD_MAX_SIZE if max_size is None else max_size
+        tmp_path = self.partial_dir / f"{uuid.uuid4().hex}.part"
+        hasher = hashlib.sha256()
+        size = 0
+
+        try:
+            with open(tmp_path, "wb") as out:
+                while True:
+                    chunk = await file.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > max_size:
+                        raise UploadError(f"File too large (max {max_size // (1024 * 1024)}MB)", 413)
+                    hasher.update(chunk)
+                    out.write(chunk)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+        # _finalize build line index (quét cả file) → chạy trên thread, không chặn event loop
+        return await asyncio.to_thread(self._finalize, tmp_path, hasher.hexdigest(), size, file.filename)
+
+    # =====================================================
+    # RESUMABLE
+    # =====================================================
+
+    def begin(self, filename: str, size: int) -> Dict[str, Any]:
+        if size < 0 or size > settings.UPLOAD_RESUMABLE_MAX_SIZE:
+            raise UploadError(
+                f"File too large (max {settings.UPLOAD_RESUMABLE_MAX_SIZE // (1024 ** 3)}GB)", 413
+            )
+
+        upload_id = uuid.uuid4().hex
+        meta = {"filename": filename, "size": size, "created_at": time.time()}
+        self._meta_path(upload_id).write_text(json.dumps(meta), encoding="utf-8")
+        self._part_path(upload_id).touch()
+        with _state_lock:
+            _hashers[upload_id] = (0, hashlib.sha256())
+
+        print(f"[UPLOAD] Resumable upload {upload_id} started: {filename} ({size} bytes)")
+        return self.status(upload_id)
+
+    def status(self, upload_id: str) -> Dict[str, Any]:
+        meta = self._load_meta(upload_id)
+        return {
+            "upload_id": upload_id,
+            "filename": meta["filename"],
+            "size": meta["size"],
+            "offset": self._part_path(upload_id).stat().st_size,
+            "chunk_size": self.chunk_size,
+        }
+
+    async def write_chunk(self, upload_id: str, offset: int, chunks: AsyncIterator[bytes]) -> Dict[str, Any]:
+        """
+        Append body của request (stream) vào file .part; offset phải bằng số byte đã nhận
+        """
+        meta = self._load_meta(upload_id)
+        with _state_lock:
+            if upload_id in _busy:
+                raise UploadError("Another chunk of this upload is being written", 409)
+            _busy.add(upload_id)
+
+        part_path = self._part_path(upload_id)
+        try:
+            current = part_path.stat().st_size
+            if offset != current:
+                raise UploadError(f"Offset mismatch: expected {current}", 409)
+
+            with _state_lock:
+                hashed, hasher = _hashers.get(upload_id, (-1, None))
+            if hashed != current:
+                hasher = None  # hash dở dang không khớp → complete() hash lại từ file
+
+            written = current
+            with open(part_path, "ab") as out:
+                try:
+                    async for chunk in chunks:
+                        if not chunk:
+                            continue
+                        if written + len(chunk) > meta["size"]:
+                            raise UploadError(f"Chunk exceeds declared size {meta['size']}", 413)
+                        out.write(chunk)
+                        written += len(chunk)
+                        if hasher is not None:
+                            hasher.update(chunk)
+                except BaseException:
+                    # bỏ phần chunk dở → client gửi lại từ offset cũ
+                    out.truncate(current)
+                    hasher = None
+                    raise
+                finally:
+                    with _state_lock:
+                        if hasher is not None:
+                            _hashers[upload_id] = (written, hasher)
+                        else:
+                            _hashers.pop(upload_id, None)
+        finally:
+            with _state_lock:
+                _busy.discard(upload_id)
+
+        return self.status(upload_id)
+
+    def complete(self, upload_id: str) -> Dict[str, Any]:
+        meta = self._load_meta(upload_id)
+        part_path = self._part_path(upload_id)
+        size = part_path.stat().st_size
+        if size != meta["size"]:
+            raise UploadError(f"Upload incomplete: {size}/{meta['size']} bytes", 409)
+
+        with _state_lock:
+            hashed, hasher = _hashers.pop(upload_id, (-1, None))
+        digest = hasher.hexdigest() if hashed == size else file_sha256(str(part_path))
+
+        try:
+            result = self._finalize(part_path, digest, size, meta["filename"])
+        except UploadError:
+            # file bị từ chối (_finalize đã xóa) → bỏ luôn upload
+            self._meta_path(upload_id).unlink(missing_ok=True)
+            raise
+        self._meta_path(upload_id).unlink(missing_ok=True)
+        return result
+
+    # =====================================================
+    # DEDUP
+    # =====================================================
+
+    @staticmethod
+    def find_dataset(db: Session, content_hash: str, user_id: Optional[int] = None) -> Optional[LogDataset]:
+        """
+        Dataset mới nhất có cùng nội dung (cùng user nếu truyền user_id)
+        """
+        query = db.query(LogDataset).filter(LogDataset.content_hash == content_hash)
+        if user_id is not None:
+            query = query.filter(LogDataset.created_by == user_id)
+        return query.order_by(LogDataset.id.desc()).first()
+
+    @staticmethod
+    def find_completed_job(
+        db: Session,
+        content_hash: str,
+        model_name: str,
+        user_id: Optional[int] = None,
+    ) -> Optional[AnalysisJob]:
+        """
+        Job đã phân tích xong cùng nội dung file + cùng model → không cần phân tích lại
+        """
+        query = (
+            db.query(AnalysisJob)
+            .join(LogDataset, LogDataset.created_from_job == AnalysisJob.id)
+            .filter(
+                LogDataset.content_hash == content_hash,
+                AnalysisJob.model_name == model_name,
+                AnalysisJob.status == "completed",
+            )
+        )
+        if user_id is not None:
+            query = query.filter(AnalysisJob.created_by == user_id)
+        return query.order_by(AnalysisJob.finished_at.desc()).first()
+
+    # =====================================================
+    # INTERNAL
+    # =====================================================
+
+    def _finalize(self, tmp_path: Path, digest: str, size: int, filename: Optional[str]) -> Dict[str, Any]:
+        ext = _SAFE_EXT.sub("", Path(filename or "").suffix.lower())
+        final_path = self.upload_dir / f"{digest}{ext}"
+
+        duplicate = final_path.exists()
+        if duplicate:
+            tmp_path.unlink(missing_ok=True)
+            print(f"[UPLOAD] ♻️ Duplicate content {digest[:12]} → reuse {final_path.name}")
+        else:
+            os.replace(tmp_path, final_path)
+            Path(f"{final_path}{HASH_SUFFIX}").write_text(digest, encoding="ascii")
+            print(f"[UPLOAD] 💾 Saved {final_path.name} ({size} bytes)")
+            # line index (offset từng dòng) build luôn lúc file vừa ghi còn trong page cache
+            try:
+                build_line_index(final_path)
+            except LogTooLargeError as e:
+                # file nén bung ra vượt trần → không nhận (giới hạn upload chỉ tính byte nén)
+                for leftover in (final_path, Path(f"{final_path}{HASH_SUFFIX}")):
+                    leftover.unlink(missing_ok=True)
+                raise UploadError(str(e), 413) from None
+            except (OSError, RuntimeError) as e:
+                print(f"[UPLOAD] ⚠️ Line index not built: {e}")
+            else:
+                # đoán format một lần trên index vừa build → dataset tạo từ file này có sẵn log_format
+                try:
+                    log_format = FormatDetector().detect(str(final_path))["log_format"]
+                    Path(f"{final_path}{FORMAT_SUFFIX}").write_text(log_format, encoding="ascii")
+                except (OSError, RuntimeError) as e:
+                    print(f"[UPLOAD] ⚠️ Format detection failed: {e}")
+
+        return {
+            "filepath": str(final_path),
+            "filename": filename,
+            "size": size,
+            "sha256": digest,
+            "duplicate": duplicate,
+        }
+
+    def _check_id(self, upload_id: str) -> None:
+        if not _UPLOAD_ID.fullmatch(upload_id or ""):
+            raise UploadError("Invalid upload id", 400)
+
+    def _meta_path(self, upload_id: str) -> Path:
+        self._check_id(upload_id)
+        return self.partial_dir / f"{upload_id}.json"
+
+    def _part_path(self, upload_id: str) -> Path:
+        self._check_id(upload_id)
+        return self.partial_dir / f"{upload_id}.part"
+
+    def _load_meta(self, upload_id: str) -> Dict[str, Any]:
+        try:
+            return json.loads(self._meta_path(upload_id).read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            raise UploadError(f"Upload {upload_id} not found", 404) from None
@@ -0,0 +1,397 @@
+# backend/app/services/vector_index.py
+import json
+import os
+import re
+import threading
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.analysis_log import AnalysisLog
+from app.models.log_dataset import LogDataset
+from app.services.ai_processor import AIProcessor
+from app.services.pipeline_stats import PipelineStats
+from app.services.verdict_cache import log_template
+
+# ======================================================
+# HASHED N-GRAM VECTORIZER
+# ======================================================
+# Template cache chỉ khớp tuyệt đối; cùng một kiểu tấn công nhưng khác URL / username
+# vẫn miss. Char n-gram trên template (đã mask timestamp, id, port, host octet)
+# cho vector gần nhau với những dòng "gần giống".
+_DIGITS = re.compile(r"\d+")
+
+
+def _features(line: str, ngram: int) -> List[str]:
+    text = _DIGITS.sub("0", log_template(line).lower())
+    grams = [text[i:i + ngram] for i in range(max(len(text) - ngram + 1, 1))]
+    # token nguyên vẹn (key=value, action...) nặng hơn n-gram lẻ
+    grams.extend(f"w:{tok}" for tok in text.split())
+    return grams
+
+
+def vectorize(lines: List[str], dim: int, ngram: int = 3) -> np.ndarray:
+    """
+    (len(lines), dim) float32, L2-normalized → dot product = cosine similarity.
+    Dùng crc32 (không dùng hash() vì bị salt theo process).
+    """
+    out = np.zeros((len(lines), dim), dtype=np.float32)
+    for row, line in enumerate(lines):
+        vec = out[row]
+        for gram in _features(line, ngram):
+            h = zlib.crc32(gram.encode("utf-8", errors="ignore"))
+            vec[h % dim] += 1.0 if h & 0x80000000 else -1.0
+
+    norms = np.linalg.norm(out, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    out /= norms
+    return out
+
+
+class VectorIndex:
+    """
+    Index nearest-neighbour các dòng đã có verdict (tier giữa verdict cache và LLM).
+
+    - Brute-force cosine trên ma trận NumPy (vài chục nghìn dòng là đủ nhanh)
+    - Lưu .npz theo source_type + model, load lazy, append dần khi job chạy xong
+    - Chỉ reuse verdict khi similarity >= threshold
+    """
+
+    # dòng gần như trùng với dòng đã có thì không thêm (giữ index nhỏ)
+    DEDUP_SIMILARITY = 0.995
+
+    def __init__(
+        self,
+        dim: int = 1024,
+        ngram: int = 3,
+        max_size: int = 20000,
+        path: Optional[Path] = None,
+    ):
+        self.dim = dim
+        self.ngram = ngram
+        self.max_size = max_size
+        self.path = path
+
+        self._lock = threading.Lock()
+        # buffer tăng gấp đôi khi đầy, chỉ _buf[:len(self)] là dữ liệu thật
+        self._buf = np.zeros((0, dim), dtype=np.float32)
+        self._verdicts: List[str] = []
+        self._pending = 0  # số dòng thêm từ lần save / load gần nhất
+        self._mtime: Optional[float] = None
+
+    def __len__(self) -> int:
+        return len(self._verdicts)
+
+    # =====================================================
+    # SEARCH / ADD
+    # =====================================================
+
+    def search(self, vectors: np.ndarray) -> Tuple[np.ndarray, List[Optional[str]]]:
+        """
+        Trả về (similarity, verdict JSON của neighbour gần nhất) cho từng vector.
+        Lấy verdict trong cùng lock vì _trim có thể dịch vị trí các dòng.
+        """
+        with self._lock:
+            size = len(self._verdicts)
+            if not size or not len(vectors):
+                return np.zeros(len(vectors), dtype=np.float32), [None] * len(vectors)
+            sims = vectors @ self._buf[:size].T
+            best = sims.argmax(axis=1)
+            neighbours = [self._verdicts[b] for b in best]
+
+        return sims[np.arange(len(vectors)), best], neighbours
+
+    def add(self, vectors: np.ndarray, verdicts: List[Dict[str, Any]], chunk: int = 512) -> int:
+        """
+        Thêm các dòng mới (bỏ qua dòng gần như trùng). Trả về số dòng được thêm.
+        """
+        added = 0
+        for start in range(0, len(vectors), chunk):
+            vecs = vectors[start:start + chunk]
+            sims, _ = self.search(vecs)
+            inner = vecs @ vecs.T
+
+            keep: List[int] = []
+            for j in range(len(vecs)):
+                if sims[j] >= self.DEDUP_SIMILARITY:
+                    continue
+                if keep and inner[j, keep].max() >= self.DEDUP_SIMILARITY:
+                    continue
+                keep.append(j)
+
+            if keep:
+                self._append(vecs[keep], [
+                    json.dumps(
+                        {k: v for k, v in verdicts[start + j].items() if k != "raw_log"},
+                        ensure_ascii=False,
+                    )
+                    for j in keep
+                ])
+                added += len(keep)
+        return added
+
+    def _append(self, vecs: np.ndarray, verdicts: List[str]) -> None:
+        with self._lock:
+            size = len(self._verdicts)
+            needed = size + len(vecs)
+            if needed > len(self._buf):
+                grown = np.zeros((max(needed, 2 * len(self._buf), 256), self.dim), dtype=np.float32)
+                grown[:size] = self._buf[:size]
+                self._buf = grown
+            self._buf[size:needed] = vecs
+            self._verdicts.extend(verdicts)
+            self._pending += len(verdicts)
+            self._trim()
+
+    def _trim(self) -> None:
+        # vượt max_size → bỏ các dòng cũ nhất (gọi khi đang giữ lock)
+        size = len(self._verdicts)
+        overflow = size - self.max_size
+        if overflow > 0:
+            self._buf[:self.max_size] = self._buf[overflow:size]
+            del self._verdicts[:overflow]
+            self._pending = min(self._pending, self.max_size)
+
+    # =====================================================
+    # NEAREST-NEIGHBOUR ANALYZE
+    # =====================================================
+
+    def analyze_batch(
+        self,
+        logs: List[str],
+        analyze_fn: Callable[[List[str]], List[Dict[str, Any]]],
+        threshold: float,
+        stats: Optional[PipelineStats] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Giống analyze_fn(logs) nhưng dòng có neighbour đủ gần dùng lại verdict của neighbour.
+        Verdict mới từ LLM được thêm vào index ngay (batch sau của cùng job dùng được).
+        """
+        stats = stats or PipelineStats()
+        vectors = vectorize(logs, self.dim, self.ngram)
+        sims, neighbours = self.search(vectors)
+
+        results: List[Optional[Dict[str, Any]]] = [None] * len(logs)
+        missing: List[int] = []
+        similarity_sum = 0.0
+        for i, line in enumerate(logs):
+            if neighbours[i] is not None and sims[i] >= threshold:
+                results[i] = AIProcessor.reuse_verdict(json.loads(neighbours[i]), line, "vector")
+                similarity_sum += float(sims[i])
+            else:
+                missing.append(i)
+
+        hits = len(logs) - len(missing)
+        stats.incr("vector.lines", len(logs))
+        stats.incr("vector.hits", hits)
+        stats.incr("vector.misses", len(missing))
+        stats.incr("vector.similarity_sum", similarity_sum)
+        stats.incr("tiers.vector", hits)
+
+        if not missing:
+            return results
+
+        fresh = analyze_fn([logs[i] for i in missing])
+
+        learned = [
+            (i, verdict) for i, verdict in zip(missing, fresh)
+            if verdict and AIProcessor.is_model_verdict(verdict)
+        ]
+        if learned:
+            added = self.add(vectors[[i for i, _ in learned]], [v for _, v in learned])
+            stats.incr("vector.added", added)
+
+        for i, verdict in zip(missing, fresh):
+            results[i] = verdict
+
+        return [
+            r if r is not None else AIProcessor._safe_fallback(logs[i])
+            for i, r in enumerate(results)
+        ]
+
+    @staticmethod
+    def report(stats: PipelineStats) -> Dict[str, Any]:
+        """
+        Thống kê tier vector cho AnalysisJob.summary
+        """
+        vector = stats.section("vector")
+        lines = int(vector.get("lines", 0))
+        hits = int(vector.get("hits", 0))
+        return {
+            "lines": lines,
+            "hits": hits,
+            "misses": int(vector.get("misses", 0)),
+            "hit_rate": round(hits / lines * 100, 2) if lines else 0,
+            "avg_similarity": round(vector.get("similarity_sum", 0) / hits, 4) if hits else 0,
+            "added": int(vector.get("added", 0)),
+        }
+
+    # =====================================================
+    # PERSISTENCE
+    # =====================================================
+
+    @classmethod
+    def load(cls, path: Path, dim: int, ngram: int, max_size: int) -> "VectorIndex":
+        index = cls(dim=dim, ngram=ngram, max_size=max_size, path=path)
+        index._load_file()
+        return index
+
+    def _load_file(self) -> bool:
+        loaded = self._read_file()
+        if loaded is None:
+            return False
+        with self._lock:
+            self._install(*loaded)
+        return True
+
+    def _read_file(self) -> Optional[Tuple[np.ndarray, List[str]]]:
+        if self.path is None or not self.path.exists():
+            return None
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                vectors = data["vectors"].astype(np.float32)
+                verdicts = [str(v) for v in data["verdicts"]]
+        except (OSError, KeyError, ValueError) as e:
+            print(f"[VECTOR] ⚠️ Không đọc được {self.path}: {e}")
+            return None
+
+        if vectors.ndim != 2 or vectors.shape[1] != self.dim:
+            # đổi VECTOR_INDEX_DIM → index cũ không dùng được nữa
+            print(f"[VECTOR] ⚠️ {self.path} có dim {vectors.shape[-1]} ≠ {self.dim}, bỏ qua")
+            return None
+        return vectors, verdicts
+
+    def _install(self, vectors: np.ndarray, verdicts: List[str]) -> None:
+        # thay toàn bộ index bằng bản trên disk (gọi khi đang giữ lock)
+        self._buf = vectors
+        self._verdicts = verdicts
+        self._pending = 0
+        self._trim()
+        self._mtime = self.path.stat().st_mtime
+
+    def flush(self) -> int:
+        """
+        Ghi các dòng mới xuống .npz (atomic). Nếu worker khác đã ghi file trong lúc đó
+        thì merge: load bản trên disk rồi append lại các dòng mới của mình.
+        """
+        if self.path is None:
+            return 0
+
+        with self._lock:
+            if not self._pending:
+                return 0
+
+        if self.path.exists() and self.path.stat().st_mtime != self._mtime:
+            loaded = self._read_file()
+            if loaded is not None:
+                # lấy dòng mới và thay bằng bản trên disk trong cùng lock:
+                # dòng thread khác add() trong lúc đọc file vẫn nằm trong phần pending
+                with self._lock:
+                    size = len(self._verdicts)
+                    new_vectors = self._buf[size - self._pending:size].copy()
+                    new_verdicts = self._verdicts[size - self._pending:size]
+                    self._install(*loaded)
+                self.add(new_vectors, [json.loads(v) for v in new_verdicts])
+
+        with self._lock:
+            pending = self._pending
+            vectors = self._buf[:len(self._verdicts)].copy()
+            verdicts = np.array(self._verdicts, dtype=str)
+            self._pending = 0
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(f, vectors=vectors, verdicts=verdicts)
+        os.replace(tmp_path, self.path)
+        self._mtime = self.path.stat().st_mtime
+
+        print(f"[VECTOR] 💾 {self.path.name}: +{pending} → {len(verdicts)} dòng")
+        return pending
+
+    def bootstrap(self, db: Session, source_type: Optional[str], limit: int, model: Optional[str] = None) -> int:
+        """
+        Index chưa có file → nạp các dòng đã có verdict trong analysis_logs
+        (mới nhất trước) của các dataset cùng source_type, cùng model + prompt version
+        """
+        query = (
+            db.query(AnalysisLog.raw_log, AnalysisLog.parsed_result)
+            .join(LogDataset, LogDataset.id == AnalysisLog.dataset_id)
+            .filter(
+                AnalysisLog.parsed_result.isnot(None),
+                AnalysisLog.prompt_version == AIProcessor.PROMPT_VERSION,
+            )
+        )
+        if model:
+            query = query.filter(AnalysisLog.model_name == model)
+        if source_type:
+            query = query.filter(LogDataset.source_type == source_type)
+        rows = query.order_by(AnalysisLog.dataset_id.desc()).limit(limit).all()
+
+        lines: List[str] = []
+        verdicts: List[Dict[str, Any]] = []
+        for raw_log, parsed_result in rows:
+            try:
+                verdict = json.loads(parsed_result)
+            except (TypeError, ValueError):
+                continue
+            # chỉ verdict model trả trực tiếp (không nạp lại verdict của rule / cache / cluster)
+            if not raw_log or not isinstance(verdict, dict) or not AIProcessor.is_model_verdict(verdict):
+                continue
+            lines.append(raw_log)
+            verdicts.append(verdict)
+
+        added = self.add(vectorize(lines, self.dim, self.ngram), verdicts) if lines else 0
+        print(f"[VECTOR] Bootstrap {source_type or '*'}: {added}/{len(rows)} dòng từ analysis_logs")
+        return added
+
+
+# ======================================================
+# PROCESS-WIDE INDEXES (theo source_type + model namespace)
+# ======================================================
+_SAFE_NAME = re.compile(r"[^A-Za-z0-9_.-]+")
+
+_indexes: "OrderedDict[Tuple[str, str], VectorIndex]" = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def vector_index_path(namespace: str, source_type: Optional[str]) -> Path:
+    # prompt version trong tên file → đổi prompt thì index cũ không được dùng lại
+    namespace = f"{namespace}__{AIProcessor.PROMPT_VERSION}"
+    name = f"{_SAFE_NAME.sub('_', source_type or 'default')}__{_SAFE_NAME.sub('_', namespace)}.npz"
+    return Path(settings.VECTOR_INDEX_DIR) / name
+
+
+def get_vector_index(
+    namespace: str,
+    source_type: Optional[str],
+    db: Optional[Session] = None,
+) -> VectorIndex:
+    """
+    Load lazy lần đầu dùng; chưa có file và có db → bootstrap từ analysis_logs
+    """
+    key = (source_type or "default", namespace)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            path = vector_index_path(namespace, source_type)
+            index = VectorIndex.load(
+                path,
+                dim=settings.VECTOR_INDEX_DIM,
+                ngram=settings.VECTOR_INDEX_NGRAM,
+                max_size=settings.VECTOR_INDEX_MAX_SIZE,
+            )
+            if not len(index) and db is not None and settings.VECTOR_INDEX_BOOTSTRAP_ROWS > 0:
+                try:
+                    index.bootstrap(db, source_type, settings.VECTOR_INDEX_BOOTSTRAP_ROWS, model=namespace)
+                except Exception as e:
+                    print(f"[VECTOR] ⚠️ Bootstrap failed: {type(e).__name__}: {e}")
+                    db.rollback()
+            _indexes[key] = index
+            print(f"[VECTOR] Index {path.name}: {len(index)} dòng")
+        return index
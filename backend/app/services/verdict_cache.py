@@ -0,0 +1,243 @@
+# backend/app/services/verdict_cache.py
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+import redis
+
+from app.core.config import settings
+from app.services.ai_processor import AIProcessor
+from app.services.pipeline_stats import PipelineStats
+
+# ======================================================
+# LOG TEMPLATE
+# ======================================================
+# Các phần thay đổi giữa những dòng "cùng hình dạng" bị mask đi,
+# phần còn lại (action, dst, dst_port, rule, msg...) quyết định verdict.
+_TEMPLATE_MASKS = [
+    # 2025-11-30 10:21:35 / 2025-11-30T10:21:35.123+07:00
+    (re.compile(r"\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}(?:\.\d+)?(?:Z|[+-]\d{2}:?\d{2})?"), "<TS>"),
+    # syslog: Nov 30 10:21:35
+    (re.compile(r"\b[A-Z][a-z]{2} +\d{1,2} \d{2}:\d{2}:\d{2}\b"), "<TS>"),
+    # id=1001, logid=..., sessionid=...
+    (re.compile(r"\b((?:log|session|event|seq|msg)?_?id)=\S+", re.IGNORECASE), r"\1=<ID>"),
+    # UUID / hex dài
+    (re.compile(r"\b[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\b", re.IGNORECASE), "<UUID>"),
+    (re.compile(r"\b[0-9a-f]{16,}\b", re.IGNORECASE), "<HEX>"),
+    # ephemeral source port (>= 1024); dst_port (53, 443, 3389...) được giữ nguyên
+    (re.compile(r"\b((?:src|s)_?port)=(?:[1-9]\d{4}|[2-9]\d{3}|1[1-9]\d{2}|10[3-9]\d|102[4-9])\b", re.IGNORECASE), r"\1=<PORT>"),
+    # host octet của IPv4: 192.168.1.25 → 192.168.1.<H>
+    (re.compile(r"\b(\d{1,3}\.\d{1,3}\.\d{1,3})\.\d{1,3}\b"), r"\1.<H>"),
+]
+
+
+def log_template(line: str) -> str:
+    """
+    Chuyển một dòng log thành template (mask timestamp, id, ephemeral port, host octet)
+    """
+    for pattern, repl in _TEMPLATE_MASKS:
+        line = pattern.sub(repl, line)
+    return line.strip()
+
+
+class VerdictCache:
+    """
+    Cache verdict theo log template, đặt trước AIProcessor.analyze_batch.
+
+    - Tier 1: in-process LRU + TTL (dùng chung giữa các job trong một worker)
+    - Tier 2: Redis (tùy chọn) → chia sẻ giữa các Celery worker
+    - Chỉ những template chưa có verdict mới được gửi lên LLM
+    """
+
+    def __init__(
+        self,
+        max_size: int = 10000,
+        ttl_seconds: int = 3600,
+        redis_client: Optional[redis.Redis] = None,
+        key_prefix: str = "verdict",
+    ):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.redis = redis_client
+        self.key_prefix = key_prefix
+
+        self._lock = threading.Lock()
+        self._store: "OrderedDict[str, tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+    # =====================================================
+    # STORE
+    # =====================================================
+
+    def _key(self, namespace: str, template: str) -> str:
+        digest = hashlib.sha1(template.encode("utf-8", errors="ignore")).hexdigest()
+        return f"{self.key_prefix}:{namespace}:{digest}"
+
+    def get(self, namespace: str, template: str, stats: Optional[PipelineStats] = None):
+        key = self._key(namespace, template)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._store.get(key)
+            if entry is not None:
+                expires_at, verdict = entry
+                if expires_at > now:
+                    self._store.move_to_end(key)
+                    if stats:
+                        stats.incr("cache.hits_local")
+                    return verdict
+                del self._store[key]
+
+        if self.redis is not None:
+            try:
+                raw = self.redis.get(key)
+            except redis.RedisError as e:
+                print(f"[CACHE] ⚠️ Redis get failed: {e}")
+                raw = None
+            if raw:
+                verdict = json.loads(raw)
+                self._put_local(key, verdict)
+                if stats:
+                    stats.incr("cache.hits_redis")
+                return verdict
+
+        return None
+
+    def put(self, namespace: str, template: str, verdict: Dict[str, Any]) -> None:
+        key = self._key(namespace, template)
+        verdict = {k: v for k, v in verdict.items() if k != "raw_log"}
+        self._put_local(key, verdict)
+
+        if self.redis is not None:
+            try:
+                self.redis.set(key, json.dumps(verdict, ensure_ascii=False), ex=self.ttl_seconds)
+            except redis.RedisError as e:
+                print(f"[CACHE] ⚠️ Redis set failed: {e}")
+
+    def _put_local(self, key: str, verdict: Dict[str, Any]) -> None:
+        with self._lock:
+            self._store[key] = (time.monotonic() + self.ttl_seconds, verdict)
+            self._store.move_to_end(key)
+            while len(self._store) > self.max_size:
+                self._store.popitem(last=False)
+
+    # =====================================================
+    # CACHED ANALYZE
+    # =====================================================
+
+    def analyze_batch(
+        self,
+        logs: List[str],
+        analyze_fn: Callable[[List[str]], List[Dict[str, Any]]],
+        namespace: str,
+        stats: Optional[PipelineStats] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Giống analyze_fn(logs) nhưng chỉ gửi các template chưa có trong cache.
+        Kết quả luôn align với `logs`.
+        """
+        stats = stats or PipelineStats()
+        results: List[Optional[Dict[str, Any]]] = [None] * len(logs)
+
+        # template → index các dòng cần verdict (dedupe trong batch)
+        missing: "OrderedDict[str, List[int]]" = OrderedDict()
+        hits = 0
+
+        for i, line in enumerate(logs):
+            template = log_template(line)
+            if template in missing:
+                # cùng template với dòng trước trong batch → chờ verdict của dòng đó, không tra store
+                missing[template].append(i)
+                continue
+            verdict = self.get(namespace, template, stats)
+            if verdict is not None:
+                results[i] = AIProcessor.reuse_verdict(verdict, line, "cache")
+                hits += 1
+            else:
+                missing[template] = [i]
+
+        # hits = dòng lấy từ store (local / Redis); deduped = dòng trùng template với
+        # một dòng khác trong batch (chỉ dòng đầu được gửi lên LLM)
+        deduped = len(logs) - hits - len(missing)
+        stats.incr("cache.lines", len(logs))
+        stats.incr("cache.hits", hits)
+        stats.incr("cache.deduped", deduped)
+        stats.incr("cache.misses", len(missing))
+        stats.incr("cache.llm_lines", len(missing))
+        stats.incr("cache.llm_lines_saved", hits + deduped)
+        stats.incr("tiers.cache", hits)
+        stats.incr("tiers.dedupe", deduped)
+
+        if not missing:
+            stats.incr("cache.batches_saved")
+            return results
+
+        representatives = [logs[idxs[0]] for idxs in missing.values()]
+        stats.incr("cache.batches_forwarded")
+        fresh = analyze_fn(representatives)
+
+        for (template, idxs), verdict in zip(missing.items(), fresh):
+            # chỉ cache verdict của model (verdict vector dùng lại là xấp xỉ, không thành verdict chuẩn)
+            if AIProcessor.is_model_verdict(verdict):
+                self.put(namespace, template, verdict)
+            for i in idxs:
+                results[i] = verdict if i == idxs[0] else AIProcessor.reuse_verdict(verdict, logs[i], "cache")
+
+        # model trả thiếu kết quả → fallback cho các dòng còn trống
+        return [
+            r if r is not None else AIProcessor._safe_fallback(logs[i])
+            for i, r in enumerate(results)
+        ]
+
+    @staticmethod
+    def report(stats: PipelineStats) -> Dict[str, Any]:
+        """
+        Thống kê cache cho AnalysisJob.summary
+        """
+        cache = stats.section("cache")
+        lines = int(cache.get("lines", 0))
+        hits = int(cache.get("hits", 0))
+        return {
+            "lines": lines,
+            "hits": hits,
+            "hits_local": int(cache.get("hits_local", 0)),
+            "hits_redis": int(cache.get("hits_redis", 0)),
+            "deduped": int(cache.get("deduped", 0)),
+            "misses": int(cache.get("misses", 0)),
+            "hit_rate": round(hits / lines * 100, 2) if lines else 0,
+            # theo dòng đại diện: số dòng gửi xuống tầng sau / số dòng không phải gửi
+            "llm_lines": int(cache.get("llm_lines", 0)),
+            "llm_lines_saved": int(cache.get("llm_lines_saved", 0)),
+            "batches_forwarded": int(cache.get("batches_forwarded", 0)),
+            "batches_saved": int(cache.get("batches_saved", 0)),
+        }
+
+
+# ======================================================
+# PROCESS-WIDE INSTANCE
+# ======================================================
+_verdict_cache: Optional[VerdictCache] = None
+_verdict_cache_lock = threading.Lock()
+
+
+def get_verdict_cache() -> VerdictCache:
+    global _verdict_cache
+    with _verdict_cache_lock:
+        if _verdict_cache is None:
+            redis_client = None
+            if settings.VERDICT_CACHE_REDIS:
+                redis_client = redis.Redis(
+                    host=settings.REDIS_HOST,
+                    port=settings.REDIS_PORT,
+                    db=settings.REDIS_DB,
+                    decode_responses=True,
+                )
+            _verdict_cache = VerdictCache(
+                max_size=settings.VERDICT_CACHE_SIZE,
+                ttl_seconds=settings.VERDICT_CACHE_TTL,
+                redis_client=redis_client,
+            )
+        return _verdict_cache
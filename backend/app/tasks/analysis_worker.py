@@ -3,6 +3,7 @@ from celery import shared_task
 from app.database.postgres import SessionLocal
 from app.models.analysis_job import AnalysisJob
 from app.services.analysis_runner import run_analysis_job
+from app.core.llm_scheduler import llm_priority
 from app.core.ws_manager import job_ws_manager
 import traceback
 
@@ -30,11 +31,13 @@ def run_analysis_task(job_id: int, file_path: str, model_name: str,
         print(f"[TASK] Job {job_id} running")
 
         # Chạy AI ko dùng async để tránh vấn đề với Celery
-        run_analysis_job(
-            job_id=job_id,
-            db=db,
-            log_file_path=file_path
-        )
+        # bulk: nhường slot Ollama cho chatbot / hunt
+        with llm_priority("bulk", user_id=job.created_by):
+            run_analysis_job(
+                job_id=job_id,
+                db=db,
+                log_file_path=file_path
+            )
 
         print(f"[TASK] Job {job_id} completed")
 
@@ -2,16 +2,24 @@
 
 from datetime import datetime
 from typing import List
+import json
 import time
 
 from app.core.celery_app import celery_app
+from app.core.config import settings
 from app.database.postgres import SessionLocal
 
 from app.services.hunt_service import HuntService
 from app.services.ai_processor import AIProcessor
+from app.services.batcher import AdaptiveBatcher
+from app.services.hunt_strategy import HuntStrategy
+from app.services.llm_telemetry import LLMTelemetry
 from app.models.threat_hunt import HuntExecution
+from app.models.log_dataset import LogDataset
+from app.models.analysis_log import AnalysisLog
 
 from app.core.redis_ws_bridge import publish_to_hunt
+from app.core.llm_scheduler import llm_priority
 
 
 @celery_app.task(
@@ -29,6 +37,8 @@ def execute_hunt_task(
     ):
     db = SessionLocal()
     service = HuntService()
+    telemetry = LLMTelemetry()
+    strategy = None
 
     try:
         # ===============================
@@ -59,21 +69,52 @@ def execute_hunt_task(
         )
         raw_logs: List[str] = [l.raw_log for l in logs]
 
-        total = len(raw_logs)
+        # ===============================
+        # DEPTH → STRATEGY (quick: sample, standard: prefilter, deep: mọi dòng)
+        # ===============================
+        dataset = db.query(LogDataset).get(hunt.dataset_id)
+        strategy = HuntStrategy(execution.depth, dataset.source_type if dataset else None)
+        selected = strategy.select(raw_logs)
+
+        total = len(selected)
         _ws_progress(hunt_id, 0, total)
 
         if total == 0:
-            _finish(db, service, execution, hunt_id, user_id)
+            _finish(db, service, execution, hunt_id, user_id, telemetry, strategy)
             return
 
         # ===============================
-        # AI ANALYSIS
+        # REUSE STORED VERDICTS (cùng model + prompt version) → chỉ dòng chưa có verdict lên LLM
+        # deep: phân tích lại mọi dòng, không dùng verdict đã lưu
         # ===============================
-        BATCH_SIZE = 20
+        model = settings.OLLAMA_MODEL
+        reused = {}
+        if strategy.depth != "deep":
+            for i in selected:
+                verdict = _stored_verdict(logs[i], model)
+                if verdict is not None:
+                    reused[i] = verdict
+        pending = [i for i in selected if i not in reused]
+
         processed = 0
         saved_findings = 0
+        if reused:
+            strategy.observe(reused.keys(), reused.values())
+            saved_findings += _save_findings(
+                db, service, hunt_id,
+                [raw_logs[i] for i in reused], reused.values(), source="AI-stored",
+                line_indexes=[logs[i].line_index for i in reused],
+            )
+            processed += len(reused)
+            _ws_progress(hunt_id, processed, total)
+        print(f"[HUNT] Reused {len(reused)} stored verdicts ({model} / {AIProcessor.PROMPT_VERSION}), {len(pending)} lines → LLM")
+
+        # ===============================
+        # AI ANALYSIS
+        # ===============================
+        batcher = AdaptiveBatcher()
 
-        for i in range(0, total, BATCH_SIZE):
+        for batch, indexes in batcher.pack((i, raw_logs[i]) for i in pending):
             db.expire(execution)
             execution = db.query(HuntExecution).get(execution_id)
 
@@ -89,54 +130,121 @@ def execute_hunt_task(
                         break
                     if execution.status == "stopped":
                         _ws_status(hunt_id, "stopped")
+                        _save_telemetry(db, execution, telemetry, strategy)
                         return
 
             # ⏹ Stop
             if execution.status == "stopped":
                 _ws_status(hunt_id, "stopped")
+                _save_telemetry(db, execution, telemetry, strategy)
                 return
             # AI processor
-            batch = raw_logs[i : i + BATCH_SIZE]
-            results = AIProcessor.analyze_batch(batch)
-
-            for raw, result in zip(batch, results):
-                if not result.get("is_threat"):
-                    continue
-
-                try:
-                    finding = service.add_finding(
-                        db,
-                        hunt_id,
-                        {
-                            "timestamp": datetime.utcnow(),
-                            "source": "AI",
-                            "event": raw[:500],
-                            "severity": result["risk_level"],
-                            "confidence": int(result.get("confidence", 0)),
-                            "mitre_technique": result.get("threat_type", "unknown")[:50],
-                            "evidence": result,
-                        },
-                    )
-                    saved_findings += 1
-                    
-                    # 🔥 EMIT FINDING MỚI QUA WEBSOCKET
-                    _ws_finding(hunt_id, finding)
-                    
-                except Exception:
-                    db.rollback()
+            started = time.perf_counter()
+            with telemetry.batch(len(batch)) as record, llm_priority("hunt", user_id=user_id):
+                results = AIProcessor.analyze_batch(batch)
+                record["fallback_lines"] = sum(1 for r in results if AIProcessor.is_fallback(r))
+            batcher.observe(batch, results, time.perf_counter() - started)
+            strategy.observe(indexes, results)
+
+            # lưu finding + verdict của batch → thời gian ghi DB (telemetry db_flush)
+            started = time.perf_counter()
+            saved_findings += _save_findings(
+                db, service, hunt_id, batch, results,
+                line_indexes=[logs[i].line_index for i in indexes],
+            )
+            _store_verdicts(db, [logs[i] for i in indexes], results, model)
+            telemetry.record_flush(time.perf_counter() - started)
 
             processed += len(batch)
             _ws_progress(hunt_id, processed, total)
 
-        _finish(db, service, execution, hunt_id, user_id)
+        _finish(db, service, execution, hunt_id, user_id, telemetry, strategy)
 
     except Exception as e:
-        _fail(db, execution, hunt_id, str(e))
+        _fail(db, execution, hunt_id, str(e), telemetry, strategy)
         raise
     finally:
         db.close()
 
 
+# ======================================================
+# VERDICTS / FINDINGS
+# ======================================================
+
+def _stored_verdict(row: AnalysisLog, model: str) -> dict | None:
+    """
+    Verdict đã lưu trong analysis_logs, chỉ dùng lại khi cùng model + prompt version
+    và do model trả trực tiếp (không phải verdict của rule / cache / cluster / vector)
+    """
+    if row.model_name != model or row.prompt_version != AIProcessor.PROMPT_VERSION:
+        return None
+    try:
+        verdict = json.loads(row.parsed_result)
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(verdict, dict) or not AIProcessor.is_model_verdict(verdict):
+        return None
+    return verdict
+
+
+def _store_verdicts(db, rows: List[AnalysisLog], results: List[dict], model: str) -> None:
+    """
+    Ghi verdict mới vào các dòng chưa thuộc analysis job nào (dòng của job giữ kết quả của job)
+    → hunt sau trên cùng dataset không phải gọi lại LLM
+    """
+    mappings = [
+        {
+            "id": row.id,
+            "parsed_result": json.dumps(result, ensure_ascii=False),
+            "threat_result": result.get("summary") if result.get("is_threat") else None,
+            "model_name": model,
+            "prompt_version": AIProcessor.PROMPT_VERSION,
+        }
+        for row, result in zip(rows, results)
+        if row.job_id is None and AIProcessor.is_model_verdict(result)
+    ]
+    if not mappings:
+        return
+    try:
+        db.bulk_update_mappings(AnalysisLog, mappings)
+        db.commit()
+    except Exception as e:
+        print(f"[HUNT] ⚠️ Failed to store verdicts: {e}")
+        db.rollback()
+
+
+def _save_findings(db, service, hunt_id: int, lines, results, source: str = "AI", line_indexes=None) -> int:
+    saved = 0
+    line_indexes = line_indexes or [None] * len(lines)
+    for raw, result, line_index in zip(lines, results, line_indexes):
+        if not result.get("is_threat"):
+            continue
+
+        try:
+            finding = service.add_finding(
+                db,
+                hunt_id,
+                {
+                    "timestamp": datetime.utcnow(),
+                    "source": source,
+                    "event": raw[:500],
+                    "severity": result["risk_level"],
+                    "confidence": int(result.get("confidence", 0)),
+                    "mitre_technique": result.get("threat_type", "unknown")[:50],
+                    "evidence": result,
+                    "line_index": line_index,
+                },
+            )
+            saved += 1
+
+            # 🔥 EMIT FINDING MỚI QUA WEBSOCKET
+            _ws_finding(hunt_id, finding)
+
+        except Exception:
+            db.rollback()
+    return saved
+
+
 # ======================================================
 # REDIS EVENTS
 # ======================================================
@@ -155,6 +263,7 @@ def _ws_finding(hunt_id: int, finding):
             "confidence": finding.confidence,
             "mitre_technique": finding.mitre_technique,
             "source": finding.source,
+            "line_index": finding.line_index,
         }
     })
 
@@ -180,9 +289,31 @@ def _ws_completed(hunt_id: int, summary: dict):
     })
 
 
-def _finish(db, service, execution, hunt_id: int, user_id:int):
+def _execution_telemetry(telemetry: LLMTelemetry, strategy: HuntStrategy | None = None) -> dict:
+    summary = telemetry.summary()
+    if strategy is not None:
+        summary["coverage"] = strategy.coverage()
+    return summary
+
+
+def _save_telemetry(db, execution, telemetry: LLMTelemetry, strategy: HuntStrategy | None = None):
+    execution.telemetry = _execution_telemetry(telemetry, strategy)
+    db.commit()
+
+
+def _finish(
+    db,
+    service,
+    execution,
+    hunt_id: int,
+    user_id: int,
+    telemetry: LLMTelemetry | None = None,
+    strategy: HuntStrategy | None = None,
+):
     execution.status = "completed"
     execution.finished_at = datetime.utcnow()
+    if telemetry is not None:
+        execution.telemetry = _execution_telemetry(telemetry, strategy)
     hunt = service._get_hunt_or_404(db, hunt_id)
     hunt.status = "completed"
     db.commit()
@@ -194,12 +325,22 @@ def _finish(db, service, execution, hunt_id: int, user_id:int):
     _ws_completed(hunt_id, {
         "total_logs": len(service.get_analysis_logs(db, hunt_id,user_id)),
         "detected_threats": detected,
+        "coverage": strategy.coverage() if strategy is not None else None,
     })
 
 
-def _fail(db, execution, hunt_id: int, error: str):
+def _fail(
+    db,
+    execution,
+    hunt_id: int,
+    error: str,
+    telemetry: LLMTelemetry | None = None,
+    strategy: HuntStrategy | None = None,
+):
     execution.status = "failed"
     execution.finished_at = datetime.utcnow()
+    if telemetry is not None:
+        execution.telemetry = _execution_telemetry(telemetry, strategy)
     execution.hunt.status = "failed"
     db.commit()
 
@@ -0,0 +1,45 @@
+# backend/app/utils/exceptions.py
+
+
+class OllamaError(Exception):
+    """
+    Lỗi chung khi gọi Ollama
+    """
+
+
+class OllamaConnectionError(OllamaError):
+    """
+    Không kết nối được / timeout (đã hết số lần retry)
+    """
+
+
+class OllamaResponseError(OllamaError):
+    """
+    Ollama trả về HTTP status lỗi
+    """
+
+    def __init__(self, message: str, status_code: int | None = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class LLMQueueTimeout(OllamaError):
+    """
+    Chờ slot của LLM scheduler quá LLM_SCHEDULER_MAX_WAIT
+    """
+
+
+class UploadError(Exception):
+    """
+    Upload không hợp lệ (quá dung lượng, sai offset, upload_id không tồn tại...)
+    """
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class LogTooLargeError(Exception):
+    """
+    File log nén giải nén ra vượt LOG_MAX_DECOMPRESSED_SIZE (file nhỏ bung ra vô hạn)
+    """
@@ -0,0 +1,157 @@
+# backend/app/utils/json_extract.py
+import json
+import re
+from typing import Any, List, Optional, Tuple
+
+# Tách JSON ra khỏi output của LLM (markdown fence, câu dẫn, output bị cắt...)
+# bằng json.JSONDecoder.raw_decode (C scanner) thay cho regex trên toàn bộ text.
+
+_DECODER = json.JSONDecoder()
+_OPENERS = re.compile(r"[\[{]")
+_WS = re.compile(r"\s*")
+
+
+def extract_json(text: str) -> Tuple[Any, bool]:
+    """
+    Trả về (value, complete) của array / object ngoài cùng trong text.
+
+    - JSON hợp lệ (kể cả có fence / text bao quanh) → (value, True), một lần raw_decode
+    - Array bị cắt / có phần tử hỏng → giữ các phần tử hoàn chỉnh, complete=False
+    - {"results": [...]} bị cắt → {"results": [phần tử hoàn chỉnh]}, complete=False
+    - Không tìm thấy gì → (None, False)
+    """
+    if not text:
+        return None, False
+
+    for match in _OPENERS.finditer(text):
+        pos = match.start()
+        try:
+            value, _ = _DECODER.raw_decode(text, pos)
+            return value, True
+        except json.JSONDecodeError:
+            pass
+
+        value = _salvage(text, pos)
+        # "[v2]" trong câu dẫn... không lấy được gì → thử dấu ngoặc tiếp theo
+        if value:
+            return value, False
+
+    return None, False
+
+
+def extract_array(text: str, key: Optional[str] = None) -> Tuple[List[Any], bool]:
+    """
+    Như extract_json nhưng luôn trả về list:
+    array ngoài cùng, hoặc object[key] (key=None → list đầu tiên trong object)
+    """
+    value, complete = extract_json(text)
+
+    if isinstance(value, dict):
+        if key is not None:
+            value = value.get(key)
+        else:
+            value = next((v for v in value.values() if isinstance(v, list)), None)
+            if value is None and complete:
+                # model trả một object đơn lẻ thay vì mảng
+                return [], False
+
+    if not isinstance(value, list):
+        return [], False
+    return value, complete
+
+
+# ======================================================
+# SALVAGE (JSON không hợp lệ)
+# ======================================================
+def _skip_ws(text: str, pos: int) -> int:
+    return _WS.match(text, pos).end()
+
+
+def _salvage(text: str, pos: int) -> Any:
+    if text[pos] == "[":
+        return _salvage_array(text, pos)
+    return _salvage_object(text, pos)
+
+
+def _salvage_array(text: str, pos: int) -> List[Any]:
+    """
+    Đọc từng phần tử; phần tử hỏng → nhảy tới '{' kế tiếp đứng ngay sau ',' hoặc '['
+    (ranh giới phần tử, không phải object con sau ':')
+    """
+    items: List[Any] = []
+    pos += 1
+    size = len(text)
+
+    while pos < size:
+        pos = _skip_ws(text, pos)
+        if pos >= size or text[pos] == "]":
+            break
+        try:
+            value, pos = _DECODER.raw_decode(text, pos)
+            items.append(value)
+        except json.JSONDecodeError:
+            pos = _resync(text, pos + 1)
+            if pos < 0:
+                break
+            continue
+
+        pos = _skip_ws(text, pos)
+        if pos < size and text[pos] == ",":
+            pos += 1
+        elif pos < size and text[pos] != "]":
+            pos = _resync(text, pos)
+            if pos < 0:
+                break
+
+    return items
+
+
+def _resync(text: str, pos: int) -> int:
+    while True:
+        pos = text.find("{", pos)
+        if pos < 0:
+            return -1
+        prev = pos - 1
+        while prev >= 0 and text[prev].isspace():
+            prev -= 1
+        if prev >= 0 and text[prev] in ",[":
+            return pos
+        pos += 1
+
+
+def _salvage_object(text: str, pos: int) -> dict:
+    """
+    Giữ các cặp key/value hoàn chỉnh; value là array bị cắt → giữ phần salvage của array
+    """
+    obj: dict = {}
+    pos += 1
+    size = len(text)
+
+    while pos < size:
+        pos = _skip_ws(text, pos)
+        if pos >= size or text[pos] != '"':
+            break
+        try:
+            key, pos = _DECODER.raw_decode(text, pos)
+        except json.JSONDecodeError:
+            break
+        pos = _skip_ws(text, pos)
+        if pos >= size or text[pos] != ":":
+            break
+        pos = _skip_ws(text, pos + 1)
+        if pos >= size:
+            break
+        try:
+            obj[key], pos = _DECODER.raw_decode(text, pos)
+        except json.JSONDecodeError:
+            if text[pos] == "[":
+                obj[key] = _salvage_array(text, pos)
+            break
+
+        pos = _skip_ws(text, pos)
+        if pos < size and text[pos] == ",":
+            pos += 1
+        else:
+            break
+
+    return obj
@@ -0,0 +1,92 @@
+# backend/app/utils/json_stream.py
+import json
+from typing import Any, Dict, List
+
+
+class ResultStreamParser:
+    """
+    Parse tăng dần output JSON dạng {"results": [ {...}, {...} ]} khi model đang stream.
+
+    - feed(chunk) trả về các object trong mảng "results" vừa đóng ngoặc
+    - Mỗi ký tự chỉ được quét một lần (theo dõi string / escape / độ sâu ngoặc)
+    - Stream bị cắt giữa chừng → các object đã trả về vẫn giữ nguyên
+    """
+
+    def __init__(self, key: str = "results"):
+        self._key = f'"{key}"'
+        self._text = ""
+        self._pos = 0
+
+        self._in_array = False
+        self._depth = 0
+        self._in_str = False
+        self._escape = False
+        self._obj_start = -1
+
+        self.done = False
+        self.count = 0
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        if self.done or not chunk:
+            return []
+
+        self._text += chunk
+        text = self._text
+        out: List[Dict[str, Any]] = []
+
+        if not self._in_array:
+            key_at = text.find(self._key)
+            if key_at < 0:
+                return out
+            bracket = text.find("[", key_at + len(self._key))
+            if bracket < 0:
+                return out
+            self._in_array = True
+            self._pos = bracket + 1
+
+        i = self._pos
+        n = len(text)
+        while i < n:
+            ch = text[i]
+
+            if self._in_str:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_str = False
+            elif ch == '"':
+                self._in_str = True
+            elif ch == "{":
+                if self._depth == 0:
+                    self._obj_start = i
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == 0 and self._obj_start >= 0:
+                    try:
+                        obj = json.loads(text[self._obj_start:i + 1])
+                        if isinstance(obj, dict):
+                            out.append(obj)
+                            self.count += 1
+                    except json.JSONDecodeError:
+                        pass  # object hỏng → bỏ qua, retry sẽ gửi lại index này
+                    self._obj_start = -1
+            elif ch == "]" and self._depth == 0:
+                self.done = True
+                i += 1
+                break
+            i += 1
+
+        # chỉ giữ phần object đang mở để buffer không phình theo độ dài response
+        if self._obj_start >= 0:
+            self._text = text[self._obj_start:]
+            i -= self._obj_start
+            self._obj_start = 0
+        else:
+            self._text = ""
+            i = 0
+        self._pos = i
+
+        return out
@@ -0,0 +1,219 @@
+# backend/app/utils/line_index.py
+import mmap
+import os
+import struct
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.utils.log_reader import PathLike, detect_compression, open_log_binary
+
+# File index "<log>.lidx" nằm cạnh file log:
+#   header (magic, size + mtime_ns của file log lúc build, số dòng)
+#   + (số dòng + 1) offset uint64 little-endian: dòng i = byte [offsets[i], offsets[i + 1])
+# Dòng đếm theo "\n" giống line_index của iter_log_lines (kể cả dòng rỗng).
+# File nén: offset tính trên byte đã giải nén.
+INDEX_SUFFIX = ".lidx"
+
+_MAGIC = b"LIDX\x01\x00\x00\x00"
+_HEADER = struct.Struct("<8sQQQ")
+_OFFSET = np.dtype("<u8")
+_READ_BUFFER = 4 * 1024 * 1024
+_NEWLINE = ord("\n")
+
+
+def index_path(path: PathLike) -> Path:
+    return Path(f"{path}{INDEX_SUFFIX}")
+
+
+def build_line_index(path: PathLike) -> np.ndarray:
+    """
+    Quét file một lượt, ghi "<log>.lidx" (ghi file tạm rồi os.replace).
+    Thư mục không ghi được → vẫn trả offsets (chỉ dùng trong process này).
+    """
+    stat = os.stat(path)
+    parts = [np.zeros(1, dtype=_OFFSET)]
+    base = 0
+    with open_log_binary(path) as f:
+        while True:
+            chunk = f.read(_READ_BUFFER)
+            if not chunk:
+                break
+            ends = np.flatnonzero(np.frombuffer(chunk, dtype=np.uint8) == _NEWLINE)
+            parts.append((ends + (base + 1)).astype(_OFFSET))
+            base += len(chunk)
+
+    offsets = np.concatenate(parts)
+    if offsets[-1] != base:
+        # dòng cuối không có "\n"
+        offsets = np.append(offsets, np.array([base], dtype=_OFFSET))
+
+    target = index_path(path)
+    tmp = target.with_name(f"{target.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp, "wb") as out:
+            out.write(_HEADER.pack(_MAGIC, stat.st_size, stat.st_mtime_ns, len(offsets) - 1))
+            out.write(offsets.tobytes())
+        os.replace(tmp, target)
+        print(f"[LINE_INDEX] Indexed {len(offsets) - 1} lines of {Path(path).name}")
+    except OSError as e:
+        tmp.unlink(missing_ok=True)
+        print(f"[LINE_INDEX] ⚠️ Cannot write {target}: {e}")
+    return offsets
+
+
+def _load_line_index(path: PathLike) -> Optional[np.ndarray]:
+    """
+    memmap offsets của "<log>.lidx"; None nếu chưa có / file log đã đổi sau khi build
+    """
+    target = index_path(path)
+    try:
+        with open(target, "rb") as f:
+            header = f.read(_HEADER.size)
+    except OSError:
+        return None
+    if len(header) != _HEADER.size:
+        return None
+
+    magic, size, mtime_ns, count = _HEADER.unpack(header)
+    stat = os.stat(path)
+    if magic != _MAGIC or size != stat.st_size or mtime_ns != stat.st_mtime_ns:
+        return None
+    if target.stat().st_size != _HEADER.size + (count + 1) * _OFFSET.itemsize:
+        return None
+    return np.memmap(target, dtype=_OFFSET, mode="r", offset=_HEADER.size, shape=(count + 1,))
+
+
+def _decode_lines(data: bytes) -> List[str]:
+    lines = data.decode("utf-8", errors="ignore").split("\n")
+    if lines and lines[-1] == "":
+        lines.pop()
+    return [line.rstrip("\r") for line in lines]
+
+
+class LineIndex:
+    """
+    Truy cập ngẫu nhiên dòng thứ N của file log không cần quét lại file:
+
+    - offsets: memmap "<log>.lidx" (build lúc upload hoặc lần đọc đầu tiên)
+    - file plain: mmap → lấy dòng N..M là O(1)
+    - file nén (.gz / .bz2 / .zst) không mmap được: seek trên stream giải nén
+      (vẫn phải giải nén từ đầu file tới offset, nhưng không cần tách dòng)
+    """
+
+    def __init__(self, path: PathLike):
+        self.path = Path(path)
+        self.compressed = detect_compression(self.path) is not None
+
+        offsets = _load_line_index(self.path)
+        self.offsets = offsets if offsets is not None else build_line_index(self.path)
+
+        self._file = None
+        self._map = None
+        if not self.compressed and self.size > 0:
+            self._file = open(self.path, "rb")
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    @property
+    def size(self) -> int:
+        """
+        Số byte (đã giải nén) của file log
+        """
+        return int(self.offsets[-1])
+
+    def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self) -> "LineIndex":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    # =====================================================
+    # READ
+    # =====================================================
+
+    def read(self, start: int, stop: int) -> List[str]:
+        """
+        Dòng [start, stop) (giữ dòng rỗng, bỏ ký tự xuống dòng)
+        """
+        start, stop = self._clamp(start, stop)
+        if start >= stop:
+            return []
+
+        begin, end = int(self.offsets[start]), int(self.offsets[stop])
+        if self._map is not None:
+            data = self._map[begin:end]
+        else:
+            with open_log_binary(self.path) as f:
+                f.seek(begin)
+                data = f.read(end - begin)
+        return _decode_lines(data)
+
+    def read_ranges(self, ranges: List[Tuple[int, int]]) -> List[List[str]]:
+        """
+        read() cho nhiều khoảng; file nén: một stream duy nhất seek tiến dần
+        thay vì giải nén lại từ đầu cho từng khoảng
+        """
+        if self._map is not None:
+            return [self.read(start, stop) for start, stop in ranges]
+
+        out: Dict[Tuple[int, int], List[str]] = {}
+        with open_log_binary(self.path) as f:
+            position = 0
+            for start, stop in sorted(set(self._clamp(a, b) for a, b in ranges)):
+                if start >= stop:
+                    continue
+                begin, end = int(self.offsets[start]), int(self.offsets[stop])
+                if begin < position:
+                    # chồng lên khoảng trước (stream không seek lùi được) → đọc riêng
+                    out[(start, stop)] = self.read(start, stop)
+                    continue
+                f.seek(begin)
+                out[(start, stop)] = _decode_lines(f.read(end - begin))
+                position = end
+        return [out.get(self._clamp(a, b), []) for a, b in ranges]
+
+    def line(self, line_index: int) -> str:
+        if not 0 <= line_index < len(self):
+            raise IndexError(f"Line {line_index} out of range (0..{len(self) - 1})")
+        return self.read(line_index, line_index + 1)[0]
+
+    def context(self, line_index: int, before: int = 5, after: int = 5) -> Dict[str, Any]:
+        """
+        Dòng line_index + before / after dòng xung quanh (cho timeline / finding)
+        """
+        if not 0 <= line_index < len(self):
+            raise IndexError(f"Line {line_index} out of range (0..{len(self) - 1})")
+
+        start = max(line_index - max(before, 0), 0)
+        stop = min(line_index + max(after, 0) + 1, len(self))
+        return {
+            "line": line_index,
+            "total_lines": len(self),
+            "lines": [
+                {"index": idx, "text": text, "match": idx == line_index}
+                for idx, text in zip(range(start, stop), self.read(start, stop))
+            ],
+        }
+
+    def _clamp(self, start: int, stop: int) -> Tuple[int, int]:
+        return max(start, 0), min(stop, len(self))
+
+
+def line_context(path: PathLike, line_index: int, before: int = 5, after: int = 5) -> Dict[str, Any]:
+    """
+    Mở index của file, lấy context quanh một dòng rồi đóng ngay (dùng cho API)
+    """
+    with LineIndex(path) as index:
+        return index.context(line_index, before, after)
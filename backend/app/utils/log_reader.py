@@ -0,0 +1,139 @@
+# backend/app/utils/log_reader.py
+import bz2
+import gzip
+import io
+from pathlib import Path
+from typing import IO, Iterator, Optional, Tuple, Union
+
+try:
+    import zstandard
+except ImportError:  # optional: chỉ cần khi có dataset .zst
+    zstandard = None
+
+from app.core.config import settings
+from app.utils.exceptions import LogTooLargeError
+
+# Log appliance rotate thường là .gz; đọc trực tiếp dạng stream (không giải nén ra file tạm)
+LOG_EXTENSIONS = ("log", "txt", "csv")
+COMPRESSED_EXTENSIONS = ("gz", "bz2", "zst")
+
+_MAGIC = (
+    (b"\x1f\x8b", "gzip"),
+    (b"BZh", "bz2"),
+    (b"\x28\xb5\x2f\xfd", "zstd"),
+)
+_READ_BUFFER = 1024 * 1024
+
+PathLike = Union[str, Path]
+
+
+def detect_compression(path: PathLike) -> Optional[str]:
+    """
+    "gzip" | "bz2" | "zstd" | None, theo magic bytes (không dựa vào đuôi file:
+    upload lưu theo sha256, file rotate có thể bị đổi tên)
+    """
+    with open(path, "rb") as f:
+        head = f.read(4)
+    for magic, name in _MAGIC:
+        if head.startswith(magic):
+            return name
+    return None
+
+
+class _CappedReader(io.BufferedIOBase):
+    """
+    Stream giải nén có trần số byte: vượt `limit` → LogTooLargeError ngay trong lúc đọc
+    (file .gz vài MB vẫn có thể bung ra hàng trăm GB)
+    """
+
+    def __init__(self, raw: IO[bytes], path: PathLike, limit: int):
+        self._raw = raw
+        self._path = path
+        self._limit = limit
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def read(self, size: Optional[int] = -1) -> bytes:
+        if size is None or size < 0:
+            size = self._limit - self._pos + 1  # đọc hết: vẫn dừng ngay sau trần
+        data = self._raw.read(size)
+        self._advance(self._pos + len(data))
+        return data
+
+    read1 = read
+
+    def readinto(self, buffer) -> int:
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        # stream nén chỉ seek tiến (đọc bỏ) → vẫn tính vào trần
+        self._advance(self._raw.seek(offset, whence))
+        return self._pos
+
+    def close(self) -> None:
+        if not self.closed:
+            self._raw.close()
+        super().close()
+
+    def _advance(self, position: int) -> None:
+        self._pos = position
+        if position > self._limit:
+            raise LogTooLargeError(
+                f"{Path(self._path).name}: decompressed size exceeds "
+                f"{self._limit // (1024 * 1024)}MB (LOG_MAX_DECOMPRESSED_SIZE)"
+            )
+
+
+def open_log_binary(path: PathLike, max_size: Optional[int] = None) -> IO[bytes]:
+    """
+    Stream byte đã giải nén của file log (plain / gzip / bz2 / zstd).
+    File nén: giải nén quá max_size byte (mặc định LOG_MAX_DECOMPRESSED_SIZE) → LogTooLargeError
+    """
+    compression = detect_compression(path)
+    if compression is None:
+        return open(path, "rb", buffering=_READ_BUFFER)
+
+    if compression == "gzip":
+        stream = gzip.open(path, "rb")
+    elif compression == "bz2":
+        stream = bz2.open(path, "rb")
+    else:
+        if zstandard is None:
+            raise RuntimeError(f"{path}: zstd dataset cần package 'zstandard'")
+        raw = open(path, "rb")
+        # closefd → đóng file gốc khi đóng reader
+        stream = zstandard.ZstdDecompressor().stream_reader(raw, read_size=_READ_BUFFER, closefd=True)
+    return _CappedReader(stream, path, settings.LOG_MAX_DECOMPRESSED_SIZE if max_size is None else max_size)
+
+
+def open_log_text(path: PathLike) -> IO[str]:
+    """
+    Như open(path, "r", encoding="utf-8", errors="ignore") nhưng giải nén trong lúc đọc.
+    Chỉ tách dòng theo "\n" (line_index khớp với offset của app/utils/line_index)
+    """
+    binary = open_log_binary(path)
+    if isinstance(binary, _CappedReader):
+        # đọc theo khối _READ_BUFFER từ stream giải nén (TextIOWrapper mặc định đọc 8KB / lần)
+        binary = io.BufferedReader(binary, buffer_size=_READ_BUFFER)
+    return io.TextIOWrapper(binary, encoding="utf-8", errors="ignore", newline="\n")
+
+
+def iter_log_lines(path: PathLike) -> Iterator[Tuple[int, str]]:
+    """
+    Yield (line_index, line) cho các dòng không rỗng (đã strip)
+    """
+    with open_log_text(path) as f:
+        for idx, line in enumerate(f):
+            line = line.strip()
+            if line:
+                yield idx, line
@@ -1,9 +1,383 @@
 # backend/app/utils/ollama_client.py
+import asyncio
 import json
+import random
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager, nullcontext
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+from urllib.parse import urlsplit
+
+import httpx
 import requests
+from requests.adapters import HTTPAdapter
+
+from app.core.config import settings
+from app.core.llm_scheduler import get_llm_scheduler
+from app.utils.exceptions import OllamaConnectionError, OllamaResponseError
+
+RETRY_STATUS = {429, 502, 503, 504}
+
+
+def ollama_base_url(url: Optional[str] = None) -> str:
+    """
+    Settings.OLLAMA_API_URL có thể là ".../api/generate" → lấy phần scheme://host:port
+    """
+    parts = urlsplit(url or settings.OLLAMA_API_URL)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+_call_info = threading.local()
+
+
+def last_queue_wait() -> float:
+    """
+    Số giây request Ollama gần nhất (sync client, thread hiện tại) phải chờ slot LLMScheduler
+    """
+    return getattr(_call_info, "queue_wait", 0.0)
+
+
+def _backoff_delay(attempt: int, base: float) -> float:
+    # exponential backoff + jitter để các worker không retry cùng lúc
+    return base * (2 ** attempt) + random.uniform(0, base)
+
+
+def _build_payload(model: str, stream: bool, **fields) -> Dict[str, Any]:
+    payload = {"model": model, "stream": stream}
+    payload.update({k: v for k, v in fields.items() if v is not None})
+    return payload
+
+
+class OllamaClient:
+    """
+    Client Ollama dùng chung (sync):
+
+    - requests.Session + connection pool keep-alive, giới hạn số connection / host
+      (pool_block=True → request thứ N+1 chờ connection rảnh thay vì mở thêm)
+    - timeout (connect, read), retry + exponential backoff cho lỗi kết nối / 429 / 5xx
+      (read timeout không retry: generation chậm bị gửi lại chỉ nhân thời gian + tải GPU)
+    - chat / generate, stream hoặc không
+    - mỗi request xin slot của LLMScheduler (priority theo llm_priority() của caller);
+      stream giữ slot tới khi đọc hết
+    """
+
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        max_connections: Optional[int] = None,
+        connect_timeout: Optional[float] = None,
+        read_timeout: Optional[float] = None,
+        max_retries: Optional[int] = None,
+        backoff: Optional[float] = None,
+        scheduled: Optional[bool] = None,
+    ):
+        self.base_url = (base_url or ollama_base_url()).rstrip("/")
+        self.scheduled = settings.LLM_SCHEDULER_ENABLED if scheduled is None else scheduled
+        self.max_connections = max_connections or settings.OLLAMA_MAX_CONNECTIONS
+        self.timeout = (
+            connect_timeout or settings.OLLAMA_CONNECT_TIMEOUT,
+            read_timeout or settings.OLLAMA_READ_TIMEOUT,
+        )
+        self.max_retries = settings.OLLAMA_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff = settings.OLLAMA_RETRY_BACKOFF if backoff is None else backoff
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=self.max_connections,
+            pool_block=True,
+            max_retries=0,  # retry tự xử lý bên dưới (có backoff + status)
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    # =====================================================
+    # PUBLIC API
+    # =====================================================
+
+    def chat(
+        self,
+        model: str,
+        messages: List[Dict[str, Any]],
+        options: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None,
+        priority: Optional[str] = None,
+        user: Optional[str] = None,
+        **fields,
+    ) -> Dict[str, Any]:
+        payload = _build_payload(model, False, messages=messages, options=options, **fields)
+        with self._slot(priority, user):
+            return self._post("/api/chat", payload, timeout=timeout).json()
+
+    def chat_stream(
+        self,
+        model: str,
+        messages: List[Dict[str, Any]],
+        options: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None,
+        priority: Optional[str] = None,
+        user: Optional[str] = None,
+        **fields,
+    ) -> Iterator[Dict[str, Any]]:
+        payload = _build_payload(model, True, messages=messages, options=options, **fields)
+        with self._slot(priority, user):
+            yield from self._iter_ndjson(self._post("/api/chat", payload, stream=True, timeout=timeout))
+
+    def generate(
+        self,
+        model: str,
+        prompt: str,
+        options: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None,
+        priority: Optional[str] = None,
+        user: Optional[str] = None,
+        **fields,
+    ) -> Dict[str, Any]:
+        payload = _build_payload(model, False, prompt=prompt, options=options, **fields)
+        with self._slot(priority, user):
+            return self._post("/api/generate", payload, timeout=timeout).json()
+
+    def generate_stream(
+        self,
+        model: str,
+        prompt: str,
+        options: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None,
+        priority: Optional[str] = None,
+        user: Optional[str] = None,
+        **fields,
+    ) -> Iterator[Dict[str, Any]]:
+        payload = _build_payload(model, True, prompt=prompt, options=options, **fields)
+        with self._slot(priority, user):
+            yield from self._iter_ndjson(self._post("/api/generate", payload, stream=True, timeout=timeout))
+
+    def ps(self) -> Dict[str, Any]:
+        """
+        Model đang được load trong Ollama (/api/ps)
+        """
+        try:
+            response = self.session.get(f"{self.base_url}/api/ps", timeout=self.timeout)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            raise OllamaConnectionError(f"{self.base_url}/api/ps: {e}") from e
+        if response.status_code >= 400:
+            raise OllamaResponseError(response.text[:500], status_code=response.status_code)
+        return response.json()
+
+    def close(self) -> None:
+        self.session.close()
+
+    # =====================================================
+    # INTERNAL
+    # =====================================================
+
+    @contextmanager
+    def _slot(self, priority: Optional[str] = None, user: Optional[str] = None):
+        # priority / user không truyền → lấy từ llm_priority() của caller
+        slot = get_llm_scheduler().slot(priority, user) if self.scheduled else nullcontext()
+        started = time.perf_counter()
+        with slot:
+            # thời gian chờ slot của request gần nhất trên thread này (telemetry)
+            _call_info.queue_wait = time.perf_counter() - started
+            yield
+
+    def _post(self, path: str, payload: Dict[str, Any], stream: bool = False, timeout=None):
+        url = f"{self.base_url}{path}"
+        req_timeout = (self.timeout[0], timeout) if timeout else self.timeout
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.post(url, json=payload, stream=stream, timeout=req_timeout)
+            except requests.ReadTimeout as e:
+                # model đã nhận request và đang sinh → không gửi lại (tốn thêm cả lượt generate)
+                raise OllamaConnectionError(f"{url}: {e}") from e
+            except (requests.ConnectionError, requests.ConnectTimeout) as e:
+                # chỉ retry khi chưa gửi được request (lỗi lúc mở kết nối)
+                if attempt >= self.max_retries:
+                    raise OllamaConnectionError(f"{url}: {e}") from e
+                delay = _backoff_delay(attempt, self.backoff)
+                print(f"[Ollama] ⚠️ {type(e).__name__}, retry {attempt + 1}/{self.max_retries} sau {delay:.1f}s")
+                time.sleep(delay)
+                continue
+
+            if response.status_code in RETRY_STATUS and attempt < self.max_retries:
+                response.close()
+                delay = _backoff_delay(attempt, self.backoff)
+                print(f"[Ollama] ⚠️ HTTP {response.status_code}, retry {attempt + 1}/{self.max_retries} sau {delay:.1f}s")
+                time.sleep(delay)
+                continue
+
+            if response.status_code >= 400:
+                detail = response.text[:500]
+                response.close()
+                raise OllamaResponseError(detail, status_code=response.status_code)
+
+            return response
+
+        raise OllamaConnectionError(f"{url}: retries exhausted")
+
+    @staticmethod
+    def _iter_ndjson(response) -> Iterator[Dict[str, Any]]:
+        with response:
+            for line in response.iter_lines(decode_unicode=True):
+                if not line:
+                    continue
+                try:
+                    data = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if "error" in data:
+                    raise OllamaResponseError(str(data["error"]))
+                yield data
+
+
+class AsyncOllamaClient:
+    """
+    Biến thể asyncio (httpx.AsyncClient) với cùng pool limit / timeout / retry
+    """
+
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        max_connections: Optional[int] = None,
+        connect_timeout: Optional[float] = None,
+        read_timeout: Optional[float] = None,
+        max_retries: Optional[int] = None,
+        backoff: Optional[float] = None,
+        scheduled: Optional[bool] = None,
+    ):
+        self.base_url = (base_url or ollama_base_url()).rstrip("/")
+        self.scheduled = settings.LLM_SCHEDULER_ENABLED if scheduled is None else scheduled
+        max_connections = max_connections or settings.OLLAMA_MAX_CONNECTIONS
+        self.max_retries = settings.OLLAMA_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff = settings.OLLAMA_RETRY_BACKOFF if backoff is None else backoff
+
+        self.client = httpx.AsyncClient(
+            base_url=self.base_url,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+            timeout=httpx.Timeout(
+                read_timeout or settings.OLLAMA_READ_TIMEOUT,
+                connect=connect_timeout or settings.OLLAMA_CONNECT_TIMEOUT,
+            ),
+        )
+
+    async def chat(self, model: str, messages: List[Dict[str, Any]], options=None, priority=None, user=None, **fields) -> Dict[str, Any]:
+        payload = _build_payload(model, False, messages=messages, options=options, **fields)
+        async with self._slot(priority, user):
+            response = await self._post("/api/chat", payload)
+        return response.json()
+
+    async def chat_stream(self, model: str, messages: List[Dict[str, Any]], options=None, priority=None, user=None, **fields) -> AsyncIterator[Dict[str, Any]]:
+        payload = _build_payload(model, True, messages=messages, options=options, **fields)
+        async with self._slot(priority, user):
+            async for data in self._stream("/api/chat", payload):
+                yield data
+
+    async def generate(self, model: str, prompt: str, options=None, priority=None, user=None, **fields) -> Dict[str, Any]:
+        payload = _build_payload(model, False, prompt=prompt, options=options, **fields)
+        async with self._slot(priority, user):
+            response = await self._post("/api/generate", payload)
+        return response.json()
+
+    async def generate_stream(self, model: str, prompt: str, options=None, priority=None, user=None, **fields) -> AsyncIterator[Dict[str, Any]]:
+        payload = _build_payload(model, True, prompt=prompt, options=options, **fields)
+        async with self._slot(priority, user):
+            async for data in self._stream("/api/generate", payload):
+                yield data
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+    @asynccontextmanager
+    async def _slot(self, priority: Optional[str] = None, user: Optional[str] = None):
+        if not self.scheduled:
+            yield None
+            return
+        async with get_llm_scheduler().slot_async(priority, user) as ticket:
+            yield ticket
+
+    async def _post(self, path: str, payload: Dict[str, Any]) -> httpx.Response:
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = await self.client.post(path, json=payload)
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+                # chỉ retry lỗi lúc mở kết nối / chờ pool; read timeout = model đang sinh → không gửi lại
+                if attempt >= self.max_retries:
+                    raise OllamaConnectionError(f"{self.base_url}{path}: {e}") from e
+                await asyncio.sleep(_backoff_delay(attempt, self.backoff))
+                continue
+            except httpx.TimeoutException as e:
+                raise OllamaConnectionError(f"{self.base_url}{path}: {e}") from e
+
+            if response.status_code in RETRY_STATUS and attempt < self.max_retries:
+                await asyncio.sleep(_backoff_delay(attempt, self.backoff))
+                continue
+            if response.status_code >= 400:
+                raise OllamaResponseError(response.text[:500], status_code=response.status_code)
+            return response
+
+        raise OllamaConnectionError(f"{self.base_url}{path}: retries exhausted")
+
+    async def _stream(self, path: str, payload: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self.client.stream("POST", path, json=payload) as response:
+                    if response.status_code in RETRY_STATUS and attempt < self.max_retries:
+                        await asyncio.sleep(_backoff_delay(attempt, self.backoff))
+                        continue
+                    if response.status_code >= 400:
+                        body = await response.aread()
+                        raise OllamaResponseError(body[:500].decode(errors="ignore"), status_code=response.status_code)
 
-OLLAMA_URL = "http://127.0.0.1:11434/api/generate"
+                    async for line in response.aiter_lines():
+                        if not line:
+                            continue
+                        try:
+                            data = json.loads(line)
+                        except json.JSONDecodeError:
+                            continue
+                        if "error" in data:
+                            raise OllamaResponseError(str(data["error"]))
+                        yield data
+                    return
+            except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+                # chỉ retry khi chưa nhận được byte nào (lỗi lúc mở kết nối)
+                if attempt >= self.max_retries:
+                    raise OllamaConnectionError(f"{self.base_url}{path}: {e}") from e
+                await asyncio.sleep(_backoff_delay(attempt, self.backoff))
 
+        raise OllamaConnectionError(f"{self.base_url}{path}: retries exhausted")
+
+
+# ======================================================
+# SHARED INSTANCES (1 pool / process)
+# ======================================================
+_client: Optional[OllamaClient] = None
+_async_client: Optional[AsyncOllamaClient] = None
+_client_lock = threading.Lock()
+
+
+def get_ollama_client() -> OllamaClient:
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = OllamaClient()
+        return _client
+
+
+def get_async_ollama_client() -> AsyncOllamaClient:
+    global _async_client
+    with _client_lock:
+        if _async_client is None:
+            _async_client = AsyncOllamaClient()
+        return _async_client
+
+
+# ======================================================
+# BACKWARD-COMPATIBLE HELPER
+# ======================================================
 def call_ollama(
     model: str,
     prompt: str,
@@ -12,57 +386,31 @@ def call_ollama(
     stream: bool | None = None,
 ):
     """
-    Hàm gọi Ollama cải tiến:
+    Hàm gọi Ollama (giữ chữ ký cũ), chạy trên client dùng chung:
     - stream=None  → mặc định streaming như phiên bản cũ (ưu tiên chatbot / phân tích)
-    - stream=True  → yield token theo thời gian thực
+    - stream=True  → iterator token theo thời gian thực
     - stream=False → trả về full string (không stream)
-    
-    => Giúp linh hoạt cho cả chatbot, phân tích log, phân tích file lớn.
-    """
 
-    # Mặc định giữ y hệt bản cũ
+    max_tokens được giữ để tương thích; Ollama không đọc field này nên không gửi đi.
+    """
     if stream is None:
         stream = True
 
-    payload = {
-        "model": model,
-        "prompt": prompt,
-        "max_tokens": max_tokens,
-        "stream": stream,
-    }
-
-    try:
-        response = requests.post(
-            OLLAMA_URL,
-            json=payload,
-            stream=stream,
-            timeout=timeout,
-        )
-        response.raise_for_status()
+    client = get_ollama_client()
 
-        # =====================================
-        # 1) STREAM MODE → yield từng chunk
-        # =====================================
-        if stream:
-            for line in response.iter_lines(decode_unicode=True):
-                if not line:
-                    continue
-                try:
-                    data = json.loads(line)
-                    print("[Ollama] Stream chunk received:", data)
+    if stream:
+        def _tokens():
+            try:
+                for data in client.generate_stream(model, prompt, timeout=timeout):
                     if "response" in data:
                         yield data["response"]
-                except:
-                    continue
-            return
+            except Exception as e:
+                print("[Ollama Error]", e)
+        return _tokens()
 
-        # =====================================
-        # 2) NON-STREAM MODE → trả về string
-        # =====================================
-        data = response.json()
-        print("[Ollama] Non-stream response received.")
+    try:
+        data = client.generate(model, prompt, timeout=timeout)
         return data.get("response", "")
-
     except Exception as e:
         print("[Ollama Error]", e)
-        return "" if not stream else iter([])
+        return ""
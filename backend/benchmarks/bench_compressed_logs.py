@@ -0,0 +1,117 @@
+# backend/benchmarks/bench_compressed_logs.py
+"""
+Benchmark: đọc dataset log plain vs .gz / .bz2 / .zst qua app/utils/log_reader
+(giải nén dạng stream, không tạo file plain tạm).
+
+Đo dung lượng trên disk, thời gian nén (một lần, lúc appliance rotate log) và throughput
+đọc từng dòng (iter_log_lines, cùng reader mà analysis runner / hunt dùng).
+
+    cd backend
+    python -m benchmarks.bench_compressed_logs
+    python -m benchmarks.bench_compressed_logs --lines 2000000 --repeat 3
+    python -m benchmarks.bench_compressed_logs --file /data/fw-2025-11-30.log
+"""
+import argparse
+import bz2
+import gzip
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from app.utils.log_reader import iter_log_lines
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+ACTIONS = ("ALLOW", "ALLOW", "ALLOW", "DENY")
+PORTS = (443, 443, 53, 80, 22, 3389, 123, 8080)
+MSGS = ("connection allowed", "dns query", "failed password for admin", "GET /index.html", "ntp sync")
+
+
+def write_sample(path: Path, lines: int, seed: int = 0) -> None:
+    """
+    Log firewall tổng hợp (cùng dạng log của fake generator)
+    """
+    rng = random.Random(seed)
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(lines):
+            f.write(
+                f"2025-11-30 {i // 3600 % 24:02d}:{i // 60 % 60:02d}:{i % 60:02d} INFO FIREWALL "
+                f"id={i} action={rng.choice(ACTIONS)} src=192.168.{rng.randrange(8)}.{rng.randrange(1, 255)} "
+                f"src_port={rng.randrange(1024, 65535)} dst=10.0.{rng.randrange(4)}.{rng.randrange(1, 255)} "
+                f"dst_port={rng.choice(PORTS)} protocol=TCP msg=\"{rng.choice(MSGS)}\"\n"
+            )
+
+
+def compress(src: Path, kind: str) -> Path:
+    dst = src.with_name(f"{src.name}.{kind}")
+    with open(src, "rb") as fin:
+        if kind == "gz":
+            with gzip.open(dst, "wb", compresslevel=6) as fout:
+                shutil.copyfileobj(fin, fout, 1024 * 1024)
+        elif kind == "bz2":
+            with bz2.open(dst, "wb", compresslevel=9) as fout:
+                shutil.copyfileobj(fin, fout, 1024 * 1024)
+        else:
+            with open(dst, "wb") as raw:
+                zstandard.ZstdCompressor(level=3).copy_stream(fin, raw)
+    return dst
+
+
+def read_all(path: Path) -> int:
+    count = 0
+    for _ in iter_log_lines(path):
+        count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lines", type=int, default=500_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--file", help="file log plain có sẵn (mặc định: sinh dữ liệu mẫu)")
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="bench_logs_"))
+    try:
+        plain = workdir / "fw.log"
+        if args.file:
+            shutil.copyfile(args.file, plain)
+        else:
+            write_sample(plain, args.lines)
+
+        kinds = ["gz", "bz2"] + (["zst"] if zstandard is not None else [])
+        files = {"plain": (plain, 0.0)}
+        for kind in kinds:
+            started = time.perf_counter()
+            files[kind] = (compress(plain, kind), time.perf_counter() - started)
+
+        plain_size = os.path.getsize(plain)
+        print(f"{'format':<8} {'size MB':>9} {'ratio':>7} {'compress s':>11} {'read s':>8} {'lines/s':>11} {'MB/s (plain)':>13}")
+        for name, (path, compress_seconds) in files.items():
+            samples = []
+            lines = 0
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                lines = read_all(path)
+                samples.append(time.perf_counter() - started)
+            seconds = statistics.median(samples)
+            size = os.path.getsize(path)
+            print(
+                f"{name:<8} {size / 1e6:>9.1f} {plain_size / size:>6.1f}x {compress_seconds:>11.2f} "
+                f"{seconds:>8.2f} {lines / seconds:>11,.0f} {plain_size / 1e6 / seconds:>13.1f}"
+            )
+        if zstandard is None:
+            print("(zstandard chưa cài → bỏ qua .zst)")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+# backend/benchmarks/bench_inflight_batches.py
+"""
+Benchmark: throughput của run_analysis_job khi giữ 1 → N batch in-flight.
+
+Chạy fake Ollama server (app/devtools/fake_ollama.py) với độ trễ cố định / batch,
+rồi đẩy cùng một tập log qua _dispatch_batches với các mức max_inflight khác nhau.
+
+    cd backend
+    python -m benchmarks.bench_inflight_batches --lines 400 --latency 0.5 --slots 4
+"""
+import argparse
+import time
+
+SAMPLE_LINE = (
+    '2025-11-30 10:21:35 INFO FIREWALL id={i} action=ALLOW src=192.168.1.25 '
+    'dst=8.8.8.8 src_port={port} dst_port=53 protocol=UDP rule=DNS-ALLOW msg="DNS query allowed"'
+)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lines", type=int, default=400)
+    parser.add_argument("--chunk-size", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds per batch")
+    parser.add_argument("--slots", type=int, default=4, help="parallel slots on the fake server")
+    parser.add_argument("--inflight", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    import contextlib
+    import io
+
+    from app.core.config import settings
+    from app.devtools.fake_ollama import start_in_thread
+
+    server, _, base_url = start_in_thread(latency=f"fixed:{args.latency}", parallel=args.slots)
+    # client Ollama dùng chung đọc URL lúc tạo lần đầu → set trước khi gọi
+    settings.OLLAMA_API_URL = f"{base_url}/api/chat"
+
+    from app.services.analysis_runner import _analyze_batch, _dispatch_batches
+
+    lines = [SAMPLE_LINE.format(i=i, port=50000 + i) for i in range(args.lines)]
+
+    def batches():
+        for i in range(0, len(lines), args.chunk_size):
+            chunk = lines[i:i + args.chunk_size]
+            yield chunk, list(range(i, i + len(chunk)))
+
+    print(f"lines={args.lines} chunk={args.chunk_size} latency={args.latency}s server_slots={args.slots}")
+    print(f"{'in-flight':>10} {'seconds':>10} {'lines/s':>10} {'speedup':>10}")
+
+    baseline = None
+    for n in args.inflight:
+        start = time.perf_counter()
+        # AIProcessor in log rất nhiều → nuốt stdout khi đo
+        with contextlib.redirect_stdout(io.StringIO()):
+            processed = sum(len(b[0]) for b in _dispatch_batches(batches(), _analyze_batch, n))
+        elapsed = time.perf_counter() - start
+
+        baseline = baseline or elapsed
+        print(f"{n:>10} {elapsed:>10.2f} {processed / elapsed:>10.1f} {baseline / elapsed:>9.2f}x")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+# backend/benchmarks/bench_json_extract.py
+"""
+Benchmark: parse output của model bằng regex cũ (parse_ai_result / _clean_json + json.loads)
+vs scanner raw_decode (app/utils/json_extract).
+
+Mặc định dùng output sinh từ fake Ollama (cùng format model thật trả) với nhiều kích thước,
+ở 3 dạng: JSON sạch, có fence + câu dẫn, bị cắt giữa chừng. --outputs DIR để chạy trên các
+file .txt output đã ghi lại từ model thật.
+
+    cd backend
+    python -m benchmarks.bench_json_extract
+    python -m benchmarks.bench_json_extract --sizes 10 100 1000 --repeat 50
+    python -m benchmarks.bench_json_extract --outputs recorded_outputs/
+"""
+import argparse
+import contextlib
+import io
+import json
+import re
+import statistics
+import time
+from pathlib import Path
+
+SAMPLE_LINE = (
+    '2025-11-30 10:{m:02d}:{s:02d} INFO FIREWALL id={i} action={action} src=192.168.{a}.{b} '
+    'dst=10.0.{c}.{d} dst_port={dport} protocol=TCP msg="{msg}"'
+)
+
+
+# ======================================================
+# PARSER CŨ (giữ nguyên để so sánh)
+# ======================================================
+def legacy_parse_ai_result(raw_text):
+    if not raw_text:
+        return []
+
+    raw_text = raw_text.replace("```json", "").replace("```", "").strip()
+
+    json_arrays = re.findall(r"\[\s*{.*?}\s*]", raw_text, flags=re.DOTALL)
+    if not json_arrays:
+        try:
+            data = json.loads(raw_text)
+            if isinstance(data, list):
+                return data
+        except Exception:
+            return []
+
+    candidate = max(json_arrays, key=len)
+    fixed = (
+        candidate
+        .replace("\n", " ")
+        .replace("\t", " ")
+        .replace(",]", "]")
+        .replace(", }", " }")
+        .strip()
+    )
+    if not fixed.endswith("]"):
+        fixed += "]"
+
+    try:
+        data = json.loads(fixed)
+        if isinstance(data, list):
+            return data
+    except Exception:
+        return []
+    return []
+
+
+def legacy_parse_results(content):
+    cleaned = re.sub(r"^```json\s*", "", content)
+    cleaned = re.sub(r"^```\s*", "", cleaned)
+    cleaned = re.sub(r"\s*```$", "", cleaned).strip()
+    try:
+        parsed = json.loads(cleaned)
+        results = parsed.get("results", []) if isinstance(parsed, dict) else parsed
+        if isinstance(results, list):
+            return [r for r in results if isinstance(r, dict)]
+    except json.JSONDecodeError:
+        pass
+
+    decoder = json.JSONDecoder()
+    start = cleaned.find("[", max(cleaned.find('"results"'), 0))
+    items = []
+    pos = start + 1 if start >= 0 else 0
+    while True:
+        pos = cleaned.find("{", pos)
+        if pos < 0:
+            break
+        try:
+            obj, end = decoder.raw_decode(cleaned, pos)
+        except json.JSONDecodeError:
+            pos += 1
+            continue
+        if isinstance(obj, dict) and ("risk_level" in obj or "is_threat" in obj):
+            items.append(obj)
+        pos = end
+    return items
+
+
+# ======================================================
+# SAMPLE OUTPUTS
+# ======================================================
+def make_lines(n):
+    return [
+        SAMPLE_LINE.format(
+            m=i // 60 % 60, s=i % 60, i=i,
+            action="DENY" if i % 3 == 0 else "ALLOW",
+            a=i % 7, b=i % 250 + 1, c=i % 5, d=i % 200 + 1,
+            dport=(443, 53, 22, 3389)[i % 4],
+            msg="failed password for admin" if i % 3 == 0 else "connection allowed",
+        )
+        for i in range(n)
+    ]
+
+
+def batch_output(n):
+    """
+    {"results": [...]} giống output của AIProcessor (fake Ollama sinh deterministic)
+    """
+    from app.devtools.fake_ollama import build_content
+
+    numbered = "\n".join(f"{i}| {line}" for i, line in enumerate(make_lines(n)))
+    return build_content(f"INPUT LOGS:\n{numbered}")
+
+
+def hunt_output(n):
+    """
+    JSON array giống output của threat hunt prompt
+    """
+    from app.devtools.fake_ollama import derive_verdict
+
+    items = []
+    for line in make_lines(n):
+        v = derive_verdict(line)
+        items.append({
+            "timestamp": v["details"].get("timestamp"),
+            "source_ip": v["details"].get("source_ip"),
+            "dest_ip": "10.0.0.1",
+            "protocol": "TCP",
+            "action": v["details"].get("action"),
+            "is_threat": v["is_threat"],
+            "threat_type": v["threat_type"] if v["is_threat"] else "None",
+            "ai_confidence": v["confidence"],
+            "evidence": v["summary"],
+        })
+    return json.dumps(items, ensure_ascii=False, indent=2)
+
+
+def variants(content):
+    return {
+        "clean": content,
+        "fenced": f"Here is the analysis:\n```json\n{content}\n```\nLet me know if you need more.",
+        "truncated": content[: int(len(content) * 0.85)],
+    }
+
+
+# ======================================================
+# RUN
+# ======================================================
+def timeit(fn, text, repeat):
+    samples = []
+    # _parse_results log khi salvage → tắt stdout để không làm nhiễu số đo
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            start = time.perf_counter()
+            out = fn(text)
+            samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1e6, out
+
+
+def report(label, text, old_fn, new_fn, repeat):
+    old_us, old_out = timeit(old_fn, text, repeat)
+    new_us, new_out = timeit(new_fn, text, repeat)
+    print(
+        f"{label:<26} {len(text):>9} {old_us:>11.1f} {len(old_out):>6} "
+        f"{new_us:>11.1f} {len(new_out):>6} {old_us / new_us if new_us else 0:>8.2f}x"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 50, 200, 1000])
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--outputs", help="thư mục chứa output .txt đã ghi lại từ model thật")
+    args = parser.parse_args()
+
+    from app.services.ai_processor import AIProcessor
+    from app.utils.ai_parser import parse_ai_result
+
+    def new_parse_results(content):
+        return AIProcessor._parse_results(content)[0]
+
+    print(f"{'output':<26} {'chars':>9} {'legacy µs':>11} {'items':>6} {'scanner µs':>11} {'items':>6} {'speedup':>9}")
+
+    if args.outputs:
+        for path in sorted(Path(args.outputs).glob("*.txt")):
+            text = path.read_text(encoding="utf-8", errors="ignore")
+            report(f"{path.name[:14]} batch", text, legacy_parse_results, new_parse_results, args.repeat)
+            report(f"{path.name[:14]} hunt", text, legacy_parse_ai_result, parse_ai_result, args.repeat)
+        return
+
+    for n in args.sizes:
+        for name, text in variants(batch_output(n)).items():
+            report(f"batch n={n} {name}", text, legacy_parse_results, new_parse_results, args.repeat)
+        for name, text in variants(hunt_output(n)).items():
+            report(f"hunt n={n} {name}", text, legacy_parse_ai_result, parse_ai_result, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
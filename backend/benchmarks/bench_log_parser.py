@@ -0,0 +1,112 @@
+# backend/benchmarks/bench_log_parser.py
+"""
+Benchmark: LogParser.parse_raw_log cũ (re.search từng field, mỗi pattern 2 lần)
+vs tokenizer key=value một lượt (app/services/log_parser.tokenize_kv / tokenize_kv_batch).
+
+Dữ liệu: dòng firewall tổng hợp cùng format file upload (id= action= src= dst= src_port=
+dst_port= protocol= rule= msg="..."), một phần msg có dấu nháy escape / key=value bên trong.
+
+    cd backend
+    python -m benchmarks.bench_log_parser
+    python -m benchmarks.bench_log_parser --lines 200000 --repeat 5
+"""
+import argparse
+import random
+import re
+import statistics
+import time
+
+from app.services.log_parser import LogParser, tokenize_kv, tokenize_kv_batch
+
+SAMPLE_LINE = (
+    '2025-11-30 10:{m:02d}:{s:02d} INFO FIREWALL id={i} action={action} src=192.168.{a}.{b} '
+    'dst=10.0.{c}.{d} src_port={port} dst_port={dport} protocol={proto} rule=R{rule} msg="{msg}"'
+)
+MSGS = (
+    "connection allowed",
+    "dns query",
+    "failed password for user=admin",
+    'GET /login.php?q=\\"1 OR 1=1\\"',
+    "ntp sync",
+)
+
+
+# ======================================================
+# PARSER CŨ (giữ nguyên để so sánh)
+# ======================================================
+def legacy_parse_raw_log(raw_log: str):
+    if not raw_log:
+        return {}
+
+    return {
+        "time": re.search(r"\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}", raw_log).group(0)
+            if re.search(r"\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}", raw_log) else None,
+        "action": re.search(r"action=(\w+)", raw_log).group(1)
+            if re.search(r"action=(\w+)", raw_log) else "unknown",
+        "src": re.search(r"src=([\d\.]+)", raw_log).group(1)
+            if re.search(r"src=([\d\.]+)", raw_log) else None,
+        "threat": "Firewall Event"
+    }
+
+
+def make_lines(n: int, seed: int = 0):
+    rng = random.Random(seed)
+    return [
+        SAMPLE_LINE.format(
+            m=i // 60 % 60, s=i % 60, i=i,
+            action=rng.choice(("ALLOW", "ALLOW", "DENY", "BLOCK")),
+            a=rng.randrange(8), b=rng.randrange(1, 255), c=rng.randrange(4), d=rng.randrange(1, 255),
+            port=rng.randrange(1024, 65535), dport=rng.choice((443, 53, 22, 3389, 80)),
+            proto=rng.choice(("TCP", "UDP")), rule=rng.randrange(20), msg=rng.choice(MSGS),
+        )
+        for i in range(n)
+    ]
+
+
+def timed(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lines", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    lines = make_lines(args.lines)
+    buffer = "\n".join(lines)
+
+    # kết quả tương thích với parser cũ trên các field cũ có
+    for line in lines[:1000]:
+        old, new = legacy_parse_raw_log(line), LogParser.parse_raw_log(line)
+        assert old == new, (line, old, new)
+    sample = tokenize_kv(lines[3])
+    assert isinstance(sample["dst_port"], int) and "user" not in sample, sample
+
+    cases = [
+        ("legacy parse_raw_log (6x re.search)", lambda: [legacy_parse_raw_log(l) for l in lines]),
+        ("parse_raw_log (tokenizer)", lambda: [LogParser.parse_raw_log(l) for l in lines]),
+        ("tokenize_kv (mọi field, có kiểu)", lambda: [tokenize_kv(l) for l in lines]),
+        ("tokenize_kv_batch(list)", lambda: tokenize_kv_batch(lines)),
+        ("tokenize_kv_batch(buffer)", lambda: tokenize_kv_batch(buffer)),
+        ("LogParser.parse_batch (fortigate)", lambda: LogParser.parse_batch(lines)),
+    ]
+
+    print(f"{args.lines:,} lines, median of {args.repeat}")
+    baseline = None
+    for name, fn in cases:
+        seconds = timed(fn, args.repeat)
+        baseline = baseline or seconds
+        print(
+            f"  {name:<38} {seconds:>7.2f}s {seconds / args.lines * 1e6:>7.2f} µs/line "
+            f"{args.lines / seconds:>12,.0f} lines/s  x{baseline / seconds:.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# backend/benchmarks/bench_ollama_pool.py
+"""
+Benchmark: requests.post mới cho mỗi lần gọi vs OllamaClient (Session + pool keep-alive).
+
+Fake Ollama server (app/devtools/fake_ollama.py) trả về /api/generate ngay lập tức,
+nên chênh lệch đo được chủ yếu là chi phí TCP handshake + dựng connection mỗi request.
+
+    cd backend
+    python -m benchmarks.bench_ollama_pool --calls 500 --threads 4
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def _run(label: str, call, calls: int, threads: int, state, baseline=None):
+    before = state.counters["connections"]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(lambda _: call(), range(calls)))
+    elapsed = time.perf_counter() - start
+
+    connections = state.counters["connections"] - before
+    speedup = baseline / elapsed if baseline else 1.0
+    print(f"{label:>12} {elapsed:>10.3f} {calls / elapsed:>10.1f} {connections:>12} {speedup:>9.2f}x")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=500)
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    import requests
+
+    from app.devtools.fake_ollama import start_in_thread
+    from app.utils.ollama_client import OllamaClient
+
+    server, state, base_url = start_in_thread(latency="fixed:0", parallel=args.threads)
+    url = f"{base_url}/api/generate"
+    # không qua LLMScheduler: chỉ đo chi phí transport
+    client = OllamaClient(base_url=base_url, max_connections=args.threads, scheduled=False)
+
+    def fresh():
+        requests.post(url, json={"model": "bench", "prompt": "ping", "stream": False}, timeout=10).json()
+
+    def pooled():
+        client.generate("bench", "ping")
+
+    print(f"calls={args.calls} threads={args.threads}")
+    print(f"{'client':>12} {'seconds':>10} {'calls/s':>10} {'connections':>12} {'speedup':>10}")
+    baseline = _run("per-call", fresh, args.calls, args.threads, state)
+    _run("pooled", pooled, args.calls, args.threads, state, baseline)
+
+    client.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
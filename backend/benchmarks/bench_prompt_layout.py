@@ -0,0 +1,155 @@
+# backend/benchmarks/bench_prompt_layout.py
+"""
+Benchmark: prompt cũ (1 user message, instruction + json.dumps(logs, indent=2) + example)
+vs system prompt cố định + payload đánh số dòng.
+
+Đo prompt tokens, prompt_eval_count (phần không có trong KV cache) và prompt_eval_duration
+do Ollama trả về. Mặc định chạy trên fake Ollama (prefill 500 tok/s); --url để đo model thật.
+
+    cd backend
+    python -m benchmarks.bench_prompt_layout --batches 10 --batch-size 20
+    python -m benchmarks.bench_prompt_layout --url http://127.0.0.1:11434 --model qwen3:8b
+"""
+import argparse
+import json
+import time
+
+SAMPLE_LINE = (
+    '2025-11-30 10:{m:02d}:{s:02d} INFO FIREWALL id={i} action={action} src=192.168.{a}.{b} '
+    'dst=10.0.{c}.{d} src_port={port} dst_port={dport} protocol=TCP rule=R{rule} msg="connection {action}"'
+)
+
+
+def legacy_prompt(logs):
+    """
+    Prompt trước khi tách system message (giữ nguyên để so sánh)
+    """
+    return f"""
+You are a cybersecurity log analysis AI for SOC Threat Hunting.
+
+Analyze EACH log independently.
+DO NOT merge logs.
+Return STRICT JSON ONLY.
+No markdown. No explanation.
+
+For each log return:
+- index: 0-based position of the log in INPUT LOGS
+- risk_level: none | low | medium | high | critical
+- threat_type: authentication_failure | suspicious_activity | malware | ddos | normal | other
+- is_threat: boolean
+- confidence: integer (0-100)
+- summary: short explanation
+- details:
+    - source_ip
+    - timestamp
+    - action
+
+INPUT LOGS:
+{json.dumps(logs, indent=2)}
+
+OUTPUT FORMAT:
+{{
+  "results": [
+    {{
+      "index": 0,
+      "risk_level": "none",
+      "threat_type": "normal",
+      "is_threat": false,
+      "confidence": 95,
+      "summary": "Explanation",
+      "details": {{
+        "source_ip": null,
+        "timestamp": null,
+        "action": ""
+      }}
+    }}
+  ]
+}}
+"""
+
+
+def make_batches(n_batches: int, size: int):
+    batches = []
+    for b in range(n_batches):
+        batch = []
+        for j in range(size):
+            i = b * size + j
+            batch.append(SAMPLE_LINE.format(
+                m=i // 60 % 60, s=i % 60, i=i,
+                action="ALLOW" if i % 3 else "DENY",
+                a=i % 7, b=i % 250 + 1, c=i % 5, d=i % 200 + 1,
+                port=40000 + i, dport=(443, 53, 22, 3389)[i % 4], rule=i % 9,
+            ))
+        batches.append(batch)
+    return batches
+
+
+def run(label, client, model, build_messages, batches, keep_alive):
+    prompt_chars = eval_count = eval_ns = 0
+    start = time.perf_counter()
+    for logs in batches:
+        messages = build_messages(logs)
+        prompt_chars += sum(len(m["content"]) for m in messages)
+        response = client.chat(
+            model=model,
+            messages=messages,
+            options={"temperature": 0.1},
+            keep_alive=keep_alive,
+        )
+        eval_count += response.get("prompt_eval_count", 0)
+        eval_ns += response.get("prompt_eval_duration", 0)
+    elapsed = time.perf_counter() - start
+
+    n = len(batches)
+    print(
+        f"{label:>8} {prompt_chars / n / 3.5:>14.0f} {eval_count / n:>18.0f} "
+        f"{eval_ns / n / 1e6:>22.1f} {elapsed:>10.2f}"
+    )
+    return eval_ns
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batches", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=20)
+    parser.add_argument("--url", help="Ollama thật (mặc định: fake Ollama in-process)")
+    parser.add_argument("--model", default="bench")
+    parser.add_argument("--prefill", type=float, default=500.0, help="fake: prompt tokens/sec")
+    args = parser.parse_args()
+
+    from app.core.config import settings
+    from app.services.ai_processor import AIProcessor
+    from app.utils.ollama_client import OllamaClient
+
+    server = None
+    base_url = args.url
+    if not base_url:
+        from app.devtools.fake_ollama import start_in_thread
+        server, _, base_url = start_in_thread(latency="fixed:0", prefill_tokens_per_sec=args.prefill, parallel=1)
+
+    client = OllamaClient(base_url=base_url, scheduled=False)
+    batches = make_batches(args.batches, args.batch_size)
+
+    print(f"batches={args.batches} batch_size={args.batch_size} model={args.model} url={base_url}")
+    print(f"{'layout':>8} {'~prompt tokens':>14} {'prompt_eval_count':>18} {'prompt_eval_ms/batch':>22} {'seconds':>10}")
+
+    before = run(
+        "legacy", client, args.model,
+        lambda logs: [{"role": "user", "content": legacy_prompt(logs)}],
+        batches, keep_alive=None,
+    )
+    after = run(
+        "system", client, args.model,
+        AIProcessor._build_messages,
+        batches, keep_alive=settings.OLLAMA_KEEP_ALIVE,
+    )
+    if after:
+        print(f"prompt_eval_duration: {before / after:.2f}x faster")
+
+    client.close()
+    if server:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+# backend/tests/conftest.py
+import os
+
+# Settings bắt buộc (thường lấy từ .env) → test chạy được không cần .env / Postgres
+os.environ.setdefault("POSTGRES_USER", "test")
+os.environ.setdefault("POSTGRES_PASSWORD", "test")
+os.environ.setdefault("POSTGRES_DB", "test")
+os.environ.setdefault("JWT_SECRET_KEY", "test-secret")
+
+import fakeredis
+import pytest
+
+from app.core import model_residency
+from app.devtools import fake_ollama
+from app.utils import ollama_client
+
+
+@pytest.fixture
+def fake_ollama_server(monkeypatch):
+    """
+    Fake Ollama (app/devtools/fake_ollama) chạy nền, client dùng chung của process trỏ vào đó
+    (không qua LLMScheduler / Redis).
+
+    state.fault = fn(content, logs, call_no) → content: làm hỏng output của từng request
+    (None → output chuẩn); state.calls: các dòng log của từng request.
+    """
+    build_content = fake_ollama.build_content
+    state = None
+
+    def scripted(prompt):
+        content = build_content(prompt)
+        logs = fake_ollama.extract_logs(prompt) or []
+        state.calls.append(logs)
+        if state.fault is None:
+            return content
+        return state.fault(content, logs, len(state.calls))
+
+    monkeypatch.setattr(fake_ollama, "build_content", scripted)
+    server, state, base_url = fake_ollama.start_in_thread(latency="fixed:0")
+    state.fault = None
+    state.calls = []
+
+    client = ollama_client.OllamaClient(base_url=base_url, max_retries=0, scheduled=False)
+    monkeypatch.setattr(ollama_client, "_client", client)
+    monkeypatch.setattr(
+        model_residency, "_residency",
+        model_residency.ModelResidency(client=client, redis_client=fakeredis.FakeRedis(decode_responses=True), models=[]),
+    )
+    yield state
+
+    client.close()
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,206 @@
+# backend/tests/test_ai_processor.py
+import json
+
+import pytest
+
+from app.core.config import settings
+from app.services.ai_processor import AIProcessor
+from app.services.pipeline_stats import PipelineStats
+from app.utils.json_stream import ResultStreamParser
+
+LOGS = [
+    f"2025-11-30 10:21:{i:02d} INFO FIREWALL id={1000 + i} action={'DENY' if i % 2 else 'ALLOW'} "
+    f"src=192.168.1.{10 + i} dst=10.0.0.8 src_port={50000 + i} dst_port={22 if i % 2 else 443} protocol=TCP"
+    for i in range(6)
+]
+
+
+# ======================================================
+# RESULT STREAM PARSER
+# ======================================================
+BODY = '{"results": [{"index": 0, "risk_level": "low"}, {"index": 1, "risk_level": "high"}]}'
+
+
+def _feed(parser, text, step):
+    out = []
+    for i in range(0, len(text), step):
+        out.extend(parser.feed(text[i:i + step]))
+    return out
+
+
+@pytest.mark.parametrize(
+    "text, expected, done",
+    [
+        (BODY, [0, 1], True),
+        (BODY[:BODY.index('{"index": 1')] + '{"index": 1, "risk', [0], False),  # cắt giữa object
+        (BODY[:BODY.index('{"index": 1')], [0], False),  # cắt giữa 2 object
+        ('Here you go:\n' + BODY + '\nDone.', [0, 1], True),  # text trước key "results"
+        ('{"results": [{"index": 0, "summary": "a } b { \\"q\\""}, {"index": 1}]}', [0, 1], True),
+        ('{"results": [{"index": 0, "x": }, {"index": 1}]}', [1], True),  # object hỏng bị bỏ qua
+        ('{"other": 1}', [], False),
+        ('{"results": []}', [], True),
+    ],
+)
+@pytest.mark.parametrize("step", [len(BODY) * 2, 7, 1])
+def test_result_stream_parser(text, expected, done, step):
+    parser = ResultStreamParser()
+    items = _feed(parser, text, step)
+    assert [item["index"] for item in items] == expected
+    assert parser.count == len(expected)
+    assert parser.done is done
+
+
+def test_result_stream_parser_ignores_input_after_done():
+    parser = ResultStreamParser()
+    parser.feed(BODY)
+    assert parser.feed('{"results": [{"index": 5}]}') == []
+
+
+# ======================================================
+# FAULTS (áp lên output của fake Ollama)
+# ======================================================
+def _ok(content, logs, call_no):
+    return content
+
+
+def _garbage(content, logs, call_no):
+    return "I'm sorry, I cannot analyze these logs right now."
+
+
+def _first_call(fault):
+    def apply(content, logs, call_no):
+        return fault(content, logs, call_no) if call_no == 1 else content
+    return apply
+
+
+def _drop(*indexes):
+    """
+    Bỏ các object có index trong indexes (mảng vẫn đóng ngoặc đầy đủ)
+    """
+    def apply(content, logs, call_no):
+        results = json.loads(content)["results"]
+        return json.dumps({"results": [r for r in results if r["index"] not in indexes]})
+    return apply
+
+
+def _truncate(keep):
+    """
+    Cắt output giữa object thứ keep + 1 (như model bị ngắt num_predict / timeout)
+    """
+    def apply(content, logs, call_no):
+        results = json.loads(content)["results"]
+        head = json.dumps({"results": results[:keep]})[:-2]
+        return head + ', {"index": ' + str(keep) + ', "risk_le'
+    return apply
+
+
+def _poison(line):
+    """
+    Output hỏng mỗi khi batch có chứa dòng `line`
+    """
+    def apply(content, logs, call_no):
+        return _garbage(content, logs, call_no) if line in logs else content
+    return apply
+
+
+# ======================================================
+# RESOLVE: resubmit / bisect / retry budget
+# ======================================================
+# (fault, số dòng, retry_budget, các batch gửi lên model, index bị fallback, stats)
+CASES = {
+    "ok": (
+        _ok, 4, 3,
+        [[0, 1, 2, 3]],
+        [],
+        {},
+    ),
+    "missing_indexes": (
+        _first_call(_drop(1, 3)), 4, 3,
+        [[0, 1, 2, 3], [1, 3]],
+        [],
+        {"retry.resubmits": 1, "retry.recovered_lines": 2},
+    ),
+    "truncated_array": (
+        _first_call(_truncate(2)), 5, 3,
+        [[0, 1, 2, 3, 4], [2, 3, 4]],
+        [],
+        {"retry.resubmits": 1, "retry.recovered_lines": 3},
+    ),
+    "truncated_twice": (
+        lambda content, logs, call_no: _truncate(1)(content, logs, call_no) if call_no < 3 else content, 4, 3,
+        [[0, 1, 2, 3], [1, 2, 3], [2, 3]],
+        [],
+        {"retry.resubmits": 2, "retry.recovered_lines": 2},
+    ),
+    "no_budget": (
+        _garbage, 4, 0,
+        [[0, 1, 2, 3]],
+        [0, 1, 2, 3],
+        {"retry.exhausted_lines": 4, "retry.fallback_lines": 4},
+    ),
+    "budget_exhausted": (
+        _garbage, 4, 3,
+        [[0, 1, 2, 3], [0, 1, 2, 3], [0, 1], [0, 1]],
+        [0, 1, 2, 3],
+        {"retry.resubmits": 2, "retry.bisections": 1, "retry.exhausted_lines": 4, "retry.fallback_lines": 4},
+    ),
+    "budget_exhausted_mid_bisection": (
+        _garbage, 4, 2,
+        [[0, 1, 2, 3], [0, 1, 2, 3], [0, 1]],
+        [0, 1, 2, 3],
+        {"retry.resubmits": 1, "retry.bisections": 1, "retry.exhausted_lines": 4, "retry.fallback_lines": 4},
+    ),
+    "poison_line_isolated": (
+        _poison(LOGS[2]), 4, 7,
+        [[0, 1, 2, 3], [0, 1, 2, 3], [0, 1], [2, 3], [2, 3], [2], [2], [3]],
+        [2],
+        {"retry.bisections": 2, "retry.exhausted_lines": 1, "retry.fallback_lines": 1},
+    ),
+}
+
+
+@pytest.mark.parametrize("streaming", [False, True], ids=["chat", "stream"])
+@pytest.mark.parametrize("case", list(CASES))
+def test_analyze_batch_resolve(fake_ollama_server, monkeypatch, case, streaming):
+    fault, size, budget, batches, fallback, expected_stats = CASES[case]
+    monkeypatch.setattr(settings, "OLLAMA_STREAMING", streaming)
+    fake_ollama_server.fault = fault
+    logs = LOGS[:size]
+    stats = PipelineStats()
+    streamed = {}
+
+    results = AIProcessor.analyze_batch(
+        logs, stats=stats, retry_budget=budget, on_result=lambda pos, r: streamed.setdefault(pos, r), model="fake",
+    )
+
+    assert fake_ollama_server.calls == [[logs[i] for i in batch] for batch in batches]
+    assert [r["raw_log"] for r in results] == logs
+    assert [i for i, r in enumerate(results) if AIProcessor.is_fallback(r)] == fallback
+    assert all(r["source"] == "llm" for i, r in enumerate(results) if i not in fallback)
+    assert sorted(streamed) == [i for i in range(size) if i not in fallback]
+    for key, value in expected_stats.items():
+        assert stats.get(key) == value, key
+
+
+# ======================================================
+# CASCADE
+# ======================================================
+def test_cascade_keeps_small_model_counters_in_job_stats(fake_ollama_server):
+    # model nhỏ trả rác → cả batch leo thang, model lớn trả đủ
+    fake_ollama_server.fault = _first_call(_garbage)
+    profile = {"name": "cascade", "small": "small", "large": "large", "min_confidence": 0}
+    stats = PipelineStats()
+
+    results = AIProcessor.analyze_cascade(LOGS[:4], profile, stats=stats)
+
+    assert fake_ollama_server.calls == [LOGS[:4], LOGS[:4]]
+    assert not any(AIProcessor.is_fallback(r) for r in results)
+    mode = AIProcessor.output_mode()
+    parsing = AIProcessor.parse_report(stats)
+    assert parsing["small"][mode]["failed_requests"] == 1
+    assert parsing["large"][mode]["failed_requests"] == 0
+    assert stats.get("model.calls") == 2
+    # dòng model nhỏ không parse được là leo thang, không phải retry hỏng của job
+    assert stats.section("retry") == {}
+    assert stats.get("cascade.small_retry.exhausted_lines") == 4
+    assert AIProcessor.cascade_report(stats, profile)["small_unparsed"] == 4
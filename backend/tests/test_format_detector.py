@@ -0,0 +1,89 @@
+# backend/tests/test_format_detector.py
+import json
+
+import pytest
+
+from app.services.format_detector import FORMATS, UNRECOGNIZED, FormatDetector, get_format_parser
+
+KV = [
+    f"2025-11-30 10:21:{i:02d} INFO FIREWALL id={i} action=DENY src=192.168.1.{i} dst=10.0.0.8 dst_port=22"
+    for i in range(20)
+]
+JSON = [
+    json.dumps({"ts": f"2025-11-30T10:21:{i:02d}Z", "action": "deny", "src": f"192.168.1.{i}"})
+    for i in range(20)
+]
+CSV = ["time,action,src,dst"] + [f"2025-11-30 10:21:{i:02d},DENY,192.168.1.{i},10.0.0.8" for i in range(20)]
+SYSLOG_3164 = [f"<34>Nov 30 10:21:{i:02d} fw01 sshd[{100 + i}]: Failed password for root" for i in range(20)]
+SYSLOG_5424 = [
+    f"<165>1 2025-11-30T10:21:{i:02d}Z fw01 sshd {100 + i} ID47 Failed password for root" for i in range(20)
+]
+PROSE = [f"user {i} logged in from the office" for i in range(20)]
+
+
+def _best(scores):
+    return max(FORMATS, key=lambda name: scores[name])
+
+
+# ======================================================
+# SCORE
+# ======================================================
+@pytest.mark.parametrize(
+    "lines, expected",
+    [
+        (KV, "kv"),
+        (JSON, "json"),
+        (CSV, "csv"),
+        (SYSLOG_3164, "syslog_rfc3164"),
+        (SYSLOG_5424, "syslog_rfc5424"),
+    ],
+    ids=["kv", "json", "csv", "syslog_rfc3164", "syslog_rfc5424"],
+)
+def test_score_picks_format(lines, expected):
+    scores = FormatDetector().score(lines[:5], lines[5:])
+
+    assert set(scores) == set(FORMATS)
+    assert scores[expected] == 1.0
+    assert _best(scores) == expected
+
+
+def test_score_vendor_patterns_need_signature():
+    # pattern cisco / checkpoint khớp gần như mọi dòng → không có dấu hiệu vendor thì 0 điểm
+    scores = FormatDetector().score(PROSE, [])
+    assert scores["cisco"] == scores["checkpoint"] == 0.0
+
+
+def test_score_counts_partial_matches():
+    scores = FormatDetector().score(JSON[:6], PROSE[:4])
+    assert scores["json"] == pytest.approx(0.6)
+    assert FormatDetector().score([], []) == {name: 0.0 for name in FORMATS}
+
+
+def test_csv_needs_header_in_head():
+    scores = FormatDetector().score(CSV[1:6], CSV[6:])
+    assert scores["csv"] == 0.0
+
+
+# ======================================================
+# DETECT + PARSER
+# ======================================================
+@pytest.mark.parametrize("lines, expected", [(KV, "kv"), (CSV, "csv"), (PROSE, UNRECOGNIZED)])
+def test_detect_file(tmp_path, lines, expected):
+    path = tmp_path / "sample.log"
+    path.write_text("\n".join(lines) + "\n")
+
+    result = FormatDetector(head_lines=5, probes=2, probe_lines=3).detect(str(path))
+
+    assert result["log_format"] == expected
+    assert result["sampled_lines"] == 11
+
+
+def test_format_parser_matches_detected_format(tmp_path):
+    path = tmp_path / "sample.csv"
+    path.write_text("\n".join(CSV) + "\n")
+
+    assert get_format_parser("csv", str(path))(CSV[1])["src"] == "192.168.1.0"
+    assert get_format_parser("csv", str(path))(CSV[0]) == {}
+    assert get_format_parser("json")(JSON[0])["action"] == "deny"
+    assert get_format_parser("syslog_rfc3164")(SYSLOG_3164[0])["host"] == "fw01"
+    assert get_format_parser(UNRECOGNIZED)(KV[0])["action"] == "DENY"
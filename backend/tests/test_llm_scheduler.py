@@ -0,0 +1,198 @@
+# backend/tests/test_llm_scheduler.py
+import asyncio
+import threading
+import time
+
+import fakeredis
+import pytest
+
+from app.core.llm_scheduler import LLMScheduler, llm_priority
+from app.utils.exceptions import LLMQueueTimeout
+
+
+@pytest.fixture
+def redis_client():
+    # register_script / EVALSHA của fakeredis cần lupa
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+def _scheduler(redis_client, cap=1, **kwargs):
+    kwargs.setdefault("poll_interval", 0.01)
+    return LLMScheduler(redis_client=redis_client, max_concurrency=cap, **kwargs)
+
+
+def _enqueue(scheduler, priority, user, name):
+    ticket = f"{priority}:{user}:{name}"
+    scheduler._enqueue_ticket(ticket, priority, user)
+    return ticket
+
+
+def _grant_order(scheduler, tickets):
+    """
+    cap = 1: lần lượt poll mọi ticket đang chờ, ticket nào được cấp slot thì release ngay
+    → thứ tự cấp slot
+    """
+    order = []
+    pending = dict(tickets)
+    while pending:
+        granted = [t for t, priority in pending.items() if scheduler._poll(t, priority) == 1]
+        assert len(granted) == 1
+        order.append(granted[0])
+        scheduler.release(granted[0])
+        del pending[granted[0]]
+    return order
+
+
+# ======================================================
+# PRIORITY / FAIRNESS
+# ======================================================
+def test_higher_priority_class_is_served_first(redis_client):
+    scheduler = _scheduler(redis_client)
+    holder = scheduler.acquire("bulk", "u0")
+
+    bulk = _enqueue(scheduler, "bulk", "u1", "a")
+    hunt = _enqueue(scheduler, "hunt", "u1", "b")
+    interactive = _enqueue(scheduler, "interactive", "u1", "c")
+
+    # slot đang bị giữ → không ai được cấp
+    assert scheduler._poll(interactive, "interactive") == 0
+    scheduler.release(holder)
+
+    assert scheduler._poll(bulk, "bulk") == 0
+    assert _grant_order(scheduler, {bulk: "bulk", hunt: "hunt", interactive: "interactive"}) == [
+        interactive, hunt, bulk,
+    ]
+
+
+def test_users_in_same_class_are_interleaved(redis_client):
+    scheduler = _scheduler(redis_client)
+    holder = scheduler.acquire("bulk", "u0")
+
+    heavy = [_enqueue(scheduler, "bulk", "alice", f"{i}") for i in range(3)]
+    light = _enqueue(scheduler, "bulk", "bob", "0")
+    scheduler.release(holder)
+
+    order = _grant_order(scheduler, {t: "bulk" for t in heavy + [light]})
+    # bob gửi sau 3 request của alice nhưng không phải chờ hết cả 3
+    assert order.index(light) <= 1
+    assert [t for t in order if t != light] == heavy
+
+
+def test_concurrency_cap_is_shared(redis_client):
+    first = _scheduler(redis_client, cap=2)
+    second = _scheduler(redis_client, cap=2)  # process khác, cùng Redis
+
+    a = first.acquire("bulk", "u1")
+    second.acquire("bulk", "u2")
+    with pytest.raises(LLMQueueTimeout):
+        second.acquire("bulk", "u3", timeout=0.1)
+
+    first.release(a)
+    assert second.acquire("bulk", "u3", timeout=1).startswith("bulk:u3:")
+
+
+def test_context_priority_is_used_by_default(redis_client):
+    scheduler = _scheduler(redis_client)
+    with llm_priority("hunt", user_id=7):
+        ticket = scheduler.acquire()
+    assert ticket.startswith("hunt:7:")
+    with pytest.raises(ValueError):
+        with llm_priority("urgent"):
+            pass
+
+
+# ======================================================
+# LEASE / DỌN TICKET CHẾT
+# ======================================================
+def test_expired_lease_frees_the_slot(redis_client):
+    scheduler = _scheduler(redis_client, lease_seconds=0.05)
+    scheduler.acquire("bulk", "crashed")  # không bao giờ release
+
+    time.sleep(0.1)
+    assert scheduler.acquire("bulk", "u1", timeout=1).startswith("bulk:u1:")
+
+
+def test_stale_waiting_ticket_is_dropped(redis_client):
+    scheduler = _scheduler(redis_client)
+    dead = _enqueue(scheduler, "interactive", "crashed", "0")
+    redis_client.hset(scheduler.keys["seen"], dead, time.time() - scheduler.stale_after - 1)
+
+    assert scheduler.acquire("bulk", "u1", timeout=1).startswith("bulk:u1:")
+    assert redis_client.zscore(scheduler.keys["waiting"], dead) is None
+    # ticket bị dọn mà process vẫn sống → poll trả -1 để enqueue lại
+    assert scheduler._poll(dead, "interactive") == -1
+
+
+def test_queue_timeout_abandons_ticket(redis_client):
+    scheduler = _scheduler(redis_client)
+    scheduler.acquire("hunt", "u0")
+
+    with pytest.raises(LLMQueueTimeout):
+        scheduler.acquire("hunt", "u1", timeout=0.05)
+
+    assert redis_client.zcard(scheduler.keys["waiting"]) == 0
+    metrics = scheduler.metrics()
+    assert metrics["backend"] == "redis"
+    assert metrics["active"] == 1
+    assert metrics["classes"]["hunt"]["granted"] == 1
+    assert metrics["classes"]["hunt"]["timeouts"] == 1
+
+
+# ======================================================
+# FALLBACK SEMAPHORE CỤC BỘ
+# ======================================================
+def test_local_semaphore_without_redis():
+    scheduler = LLMScheduler(redis_client=None, max_concurrency=2)
+
+    tickets = [scheduler.acquire("bulk", "u1"), scheduler.acquire("bulk", "u1")]
+    assert tickets == ["local", "local"]
+    with pytest.raises(LLMQueueTimeout):
+        scheduler.acquire("bulk", "u1", timeout=0.05)
+
+    scheduler.release(tickets[0])
+    assert scheduler.acquire("bulk", "u1", timeout=0.05) == "local"
+    assert scheduler.metrics() == {"backend": "local", "max_concurrency": 2}
+
+
+def test_redis_error_falls_back_to_local_semaphore():
+    server = fakeredis.FakeServer()
+    server.connected = False
+    scheduler = LLMScheduler(redis_client=fakeredis.FakeRedis(server=server, decode_responses=True), max_concurrency=1)
+
+    assert scheduler.acquire("bulk", "u1") == "local"
+    assert not scheduler._redis_available()  # không thử Redis lại cho mỗi request
+
+    released = threading.Event()
+
+    def hold_then_release():
+        time.sleep(0.05)
+        released.set()
+        scheduler.release("local")
+
+    threading.Thread(target=hold_then_release).start()
+    assert scheduler.acquire("bulk", "u2", timeout=1) == "local"
+    assert released.is_set()
+
+
+# ======================================================
+# ASYNC
+# ======================================================
+def test_slot_async_respects_cap(redis_client):
+    scheduler = _scheduler(redis_client)
+    running = []
+    peak = []
+
+    async def job(i):
+        async with scheduler.slot_async("interactive", f"u{i}"):
+            running.append(i)
+            peak.append(len(running))
+            await asyncio.sleep(0.01)
+            running.remove(i)
+
+    async def main():
+        await asyncio.gather(*(job(i) for i in range(4)))
+
+    asyncio.run(main())
+    assert max(peak) == 1
+    assert redis_client.zcard(scheduler.keys["active"]) == 0
+    assert scheduler.metrics()["classes"]["interactive"]["granted"] == 4
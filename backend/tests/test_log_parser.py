@@ -0,0 +1,148 @@
+# backend/tests/test_log_parser.py
+import pytest
+
+from app.services import log_parser
+from app.services.log_parser import KVTokenizer, LogParser, _tokenize_general, tokenize_kv_batch
+from benchmarks.bench_log_parser import legacy_parse_raw_log, make_lines
+
+HEADER = "2025-11-30 10:21:35 INFO FIREWALL"
+LINE = f'{HEADER} id=7 action=DENY src=192.168.1.25 dst=10.0.0.8 src_port=51234 dst_port=22 protocol=TCP msg="failed password"'
+
+
+@pytest.fixture
+def fresh_tokenizer(monkeypatch):
+    # parse_raw_log dùng tokenizer chung của process → layout không rò giữa các test
+    monkeypatch.setattr(log_parser, "_tokenizer", KVTokenizer())
+    return log_parser._tokenizer
+
+
+# ======================================================
+# LAYOUT PATH vs GENERAL PATH
+# ======================================================
+LINES = [
+    LINE,
+    LINE.replace("id=7", "id=8").replace("failed password", "accepted key"),
+    LINE.replace('"failed password"', '"GET /login.php?q=\\"1 OR 1=1\\""'),  # nháy escape
+    LINE.replace('"failed password"', '"failed password for user=admin action=ALLOW"'),  # key=value trong nháy
+    LINE.replace('"failed password"', '""'),  # value rỗng trong nháy
+    LINE.replace("src_port=51234", "src_port=ephemeral"),  # port không phải số
+    LINE.replace("action=DENY ", ""),  # thiếu key → layout khác
+    LINE.replace("protocol=TCP", "protocol=TCP rule=R1"),  # thêm key
+    LINE[: LINE.index("password")],  # bị cắt, thiếu nháy đóng
+    LINE.replace(HEADER, "2025-11-30T10:21:35"),  # header chỉ có time
+    LINE.replace(f"{HEADER} ", ""),  # không header
+    "<134>Nov 30 10:21:35 fw01 id=7 action=DENY src=192.168.1.25",  # có chữ lẻ ngoài key=value
+    "no key value pairs here",
+    "",
+]
+
+
+@pytest.mark.parametrize("line", LINES)
+def test_layout_path_matches_general_path(line):
+    tokenizer = KVTokenizer()
+    tokenizer.tokenize(LINE)  # học layout của LINE
+    assert tokenizer._layout is not None
+
+    assert tokenizer.tokenize(line) == _tokenize_general(line)[0]
+
+
+def test_layout_is_learned_and_reused():
+    tokenizer = KVTokenizer()
+    tokenizer.tokenize(LINE)
+    layout = tokenizer._layout
+
+    fields = tokenizer.tokenize(LINES[1])
+    assert tokenizer._layout is layout  # khớp layout → không tách lại
+    assert fields == {
+        "time": "2025-11-30 10:21:35", "level": "INFO", "facility": "FIREWALL",
+        "id": 8, "action": "DENY", "src": "192.168.1.25", "dst": "10.0.0.8",
+        "src_port": 51234, "dst_port": 22, "protocol": "TCP", "msg": "accepted key",
+    }
+
+
+def test_layout_path_unescapes_quoted_values():
+    tokenizer = KVTokenizer()
+    tokenizer.tokenize(LINE)
+    layout = tokenizer._layout
+
+    assert tokenizer.tokenize(LINES[2])["msg"] == 'GET /login.php?q="1 OR 1=1"'
+    assert tokenizer._layout is layout
+
+
+def test_layout_mismatch_learns_new_layout():
+    tokenizer = KVTokenizer()
+    tokenizer.tokenize(LINE)
+    first = tokenizer._layout
+
+    fields = tokenizer.tokenize(LINES[7])
+    assert fields["rule"] == "R1"
+    assert tokenizer._layout is not first
+    assert tokenizer._layout[0].match(LINES[7].replace("R1", "R2"))
+
+
+@pytest.mark.parametrize(
+    "line",
+    [
+        LINES[2],  # nháy escape
+        LINES[8],  # thiếu nháy đóng
+        LINES[11],  # chữ lẻ
+        LINE.replace("dst=10.0.0.8", "dst=10.0.0.8 src=10.9.9.9"),  # key trùng
+        LINE.replace("action=DENY", "level=DENY"),  # key trùng tên header
+    ],
+)
+def test_unlearnable_lines_keep_previous_layout(line):
+    tokenizer = KVTokenizer()
+    tokenizer.tokenize(LINE)
+    layout = tokenizer._layout
+
+    tokenizer.tokenize(line)
+    assert tokenizer._layout is layout
+
+
+def test_pick_returns_strings_and_none_for_missing_keys():
+    tokenizer = KVTokenizer()
+    tokenizer.tokenize(LINE)
+    assert tokenizer.pick(LINES[1], "id", "action", "rule") == ("8", "DENY", None)
+    # lệch layout → qua tokenize()
+    assert tokenizer.pick(LINES[6], "id", "action", "src") == ("7", None, "192.168.1.25")
+
+
+def test_tokenize_kv_batch_accepts_buffers():
+    buffer = "\n".join([LINE, "", "   ", LINES[1]]) + "\n"
+    expected = [_tokenize_general(LINE)[0], _tokenize_general(LINES[1])[0]]
+    assert tokenize_kv_batch(buffer) == expected
+    assert tokenize_kv_batch(buffer.encode()) == expected
+    assert tokenize_kv_batch([LINE, "", LINES[1]]) == expected
+
+
+# ======================================================
+# parse_raw_log (regression với bản regex cũ)
+# ======================================================
+def test_parse_raw_log_matches_legacy_regex(fresh_tokenizer):
+    for line in make_lines(2000, seed=3):
+        assert LogParser.parse_raw_log(line) == legacy_parse_raw_log(line), line
+
+
+@pytest.mark.parametrize(
+    "line",
+    [
+        LINE,
+        LINE.replace("action=DENY ", ""),  # thiếu action
+        LINE.replace("src=192.168.1.25 ", ""),  # thiếu src
+        LINE.replace(f"{HEADER} ", ""),  # thiếu time
+        f"<134>Nov 30 fw01: {LINE}",  # timestamp không ở đầu dòng
+        "no key value pairs here",
+        "",
+    ],
+)
+def test_parse_raw_log_missing_keys_match_legacy(fresh_tokenizer, line):
+    fresh_tokenizer.tokenize(LINE)  # đi qua cả layout path lẫn general path
+    assert LogParser.parse_raw_log(line) == legacy_parse_raw_log(line)
+
+
+def test_parse_raw_log_ignores_keys_inside_quotes(fresh_tokenizer):
+    # regex cũ nhận nhầm action / src nằm trong msg; tokenizer lấy trọn value trong nháy
+    line = f'{HEADER} id=7 dst=10.0.0.8 msg="user=admin action=ALLOW src=1.2.3.4"'
+    assert LogParser.parse_raw_log(line) == {
+        "time": "2025-11-30 10:21:35", "action": "unknown", "src": None, "threat": "Firewall Event",
+    }
@@ -0,0 +1,75 @@
+# backend/tests/test_log_reader.py
+import bz2
+import gzip
+
+import pytest
+import zstandard
+
+from app.utils import log_reader
+from app.utils.exceptions import LogTooLargeError
+from app.utils.line_index import LineIndex, build_line_index
+from app.utils.log_reader import iter_log_lines, open_log_binary
+
+LINES = [f"2025-11-30 10:00:{i % 60:02d} id={i} action=DENY" for i in range(200)]
+CONTENT = ("\n".join(LINES) + "\n").encode()
+
+COMPRESSORS = {
+    "gz": gzip.compress,
+    "bz2": bz2.compress,
+    "zst": lambda data: zstandard.ZstdCompressor().compress(data),
+    "log": lambda data: data,
+}
+
+
+@pytest.fixture(params=list(COMPRESSORS))
+def log_file(request, tmp_path):
+    path = tmp_path / f"fw.{request.param}"
+    path.write_bytes(COMPRESSORS[request.param](CONTENT))
+    return path
+
+
+def test_iter_log_lines_decompresses(log_file):
+    assert [line for _, line in iter_log_lines(log_file)] == LINES
+
+
+def test_line_index_reads_within_cap(log_file, monkeypatch):
+    monkeypatch.setattr(log_reader.settings, "LOG_MAX_DECOMPRESSED_SIZE", len(CONTENT))
+    with LineIndex(log_file) as index:
+        assert len(index) == len(LINES)
+        assert index.read_ranges([(10, 12), (150, 151)]) == [LINES[10:12], LINES[150:151]]
+
+
+@pytest.mark.parametrize("suffix", ["gz", "bz2", "zst"])
+@pytest.mark.parametrize(
+    "read",
+    [
+        lambda path: list(iter_log_lines(path)),
+        build_line_index,
+        lambda path: open_log_binary(path).read(),
+    ],
+    ids=["iter_log_lines", "build_line_index", "read_all"],
+)
+def test_decompressed_size_is_capped(tmp_path, monkeypatch, suffix, read):
+    monkeypatch.setattr(log_reader.settings, "LOG_MAX_DECOMPRESSED_SIZE", len(CONTENT) - 1)
+    path = tmp_path / f"bomb.{suffix}"
+    path.write_bytes(COMPRESSORS[suffix](CONTENT))
+
+    with pytest.raises(LogTooLargeError):
+        read(path)
+
+
+def test_seek_past_cap_is_rejected(tmp_path):
+    path = tmp_path / "fw.gz"
+    path.write_bytes(gzip.compress(CONTENT))
+    with open_log_binary(path, max_size=100) as f:
+        f.seek(50)
+        assert f.tell() == 50
+        with pytest.raises(LogTooLargeError):
+            f.seek(101)
+
+
+def test_plain_files_are_not_capped(tmp_path, monkeypatch):
+    monkeypatch.setattr(log_reader.settings, "LOG_MAX_DECOMPRESSED_SIZE", 10)
+    path = tmp_path / "fw.log"
+    path.write_bytes(CONTENT)
+    assert len(list(iter_log_lines(path))) == len(LINES)
@@ -0,0 +1,60 @@
+# backend/tests/test_ollama_client.py
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.utils.exceptions import OllamaConnectionError
+from app.utils.ollama_client import OllamaClient
+
+
+@pytest.fixture
+def slow_server():
+    """
+    Server nhận request rồi "sinh" lâu hơn read timeout của client; đếm số request nhận được
+    """
+    received = []
+
+    class _Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            received.append(self.path)
+            time.sleep(0.5)
+            self.send_response(200)
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"{}")
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}", received
+    server.shutdown()
+    server.server_close()
+
+
+def test_read_timeout_is_not_resubmitted(slow_server):
+    base_url, received = slow_server
+    client = OllamaClient(base_url=base_url, read_timeout=0.1, max_retries=2, backoff=0.01, scheduled=False)
+
+    with pytest.raises(OllamaConnectionError):
+        client.chat("fake", [{"role": "user", "content": "hi"}])
+    assert received == ["/api/chat"]
+
+
+def test_connection_errors_are_retried(monkeypatch):
+    client = OllamaClient(base_url="http://127.0.0.1:1", max_retries=2, backoff=0.0, scheduled=False)
+    attempts = []
+    original = client.session.post
+
+    def counting_post(*args, **kwargs):
+        attempts.append(1)
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(client.session, "post", counting_post)
+    with pytest.raises(OllamaConnectionError):
+        client.chat("fake", [])
+    assert len(attempts) == 3
@@ -0,0 +1,112 @@
+# backend/tests/test_prefilter.py
+import pytest
+
+from app.services import prefilter
+from app.services.ai_processor import AIProcessor
+from app.services.pipeline_stats import PipelineStats
+from app.services.prefilter import RulePrefilter, _load_profiles
+
+FW = "2025-11-30 10:21:35 INFO FIREWALL id=1 action={action} src=192.168.1.25 dst={dst} dst_port={port} protocol={proto}"
+SQUID = "1764498095.123 120 10.0.0.5 TCP_TUNNEL/{status} 0 CONNECT {host}:443 - HIER_DIRECT/{ip} -"
+ACCESS = '10.0.0.5 - - [30/Nov/2025:10:21:35 +0000] "CONNECT {host}:443 HTTP/1.1" {status} 0'
+
+
+def _prefilter(source_type, monkeypatch, trusted=()):
+    monkeypatch.setattr(prefilter.settings, "PREFILTER_HTTPS_TRUSTED_DSTS", list(trusted))
+    monkeypatch.setattr(prefilter.settings, "PREFILTER_RULES_FILE", None)
+    return RulePrefilter(source_type, _load_profiles().get(source_type, []))
+
+
+# ======================================================
+# CLASSIFY
+# ======================================================
+@pytest.mark.parametrize(
+    "line, expected",
+    [
+        (FW.format(action="ALLOW", dst="8.8.8.8", port=53, proto="UDP"), ("allow", "DNS-PUBLIC-RESOLVER")),
+        (FW.format(action="ACCEPT", dst="10.0.0.1", port=123, proto="UDP"), ("allow", "NTP-ALLOW")),
+        (FW.format(action="DENY", dst="8.8.8.8", port=53, proto="UDP"), ("ambiguous", None)),
+        (FW.format(action="ALLOW", dst="203.0.113.9", port=53, proto="UDP"), ("ambiguous", None)),
+        # HTTPS không có đích tin cậy → luôn lên LLM
+        (FW.format(action="ALLOW", dst="203.0.113.9", port=443, proto="TCP"), ("ambiguous", None)),
+        # cờ cảnh báo trong msg thắng allow-list
+        (FW.format(action="ALLOW", dst="8.8.8.8", port=53, proto="UDP") + ' msg="dns beacon detected"', ("ambiguous", None)),
+        # tên field chứa từ khóa không tính
+        (FW.format(action="ALLOW", dst="8.8.8.8", port=53, proto="UDP") + ' threat_id=0 msg="ok"', ("allow", "DNS-PUBLIC-RESOLVER")),
+    ],
+)
+def test_firewall_classify(monkeypatch, line, expected):
+    assert _prefilter("firewall", monkeypatch).classify(line) == expected
+
+
+def test_payload_indicator_is_suspicious(monkeypatch):
+    line = FW.format(action="ALLOW", dst="8.8.8.8", port=53, proto="UDP") + " msg=\"GET /?id=1 UNION SELECT pass\""
+    decision, threat = _prefilter("firewall", monkeypatch).classify(line)
+    assert decision == "suspicious"
+    assert threat
+
+
+def test_firewall_https_allowed_only_for_trusted_dst(monkeypatch):
+    pf = _prefilter("firewall", monkeypatch, trusted=["10.0.0.80"])
+    assert pf.classify(FW.format(action="ALLOW", dst="10.0.0.80", port=443, proto="TCP")) == ("allow", "HTTPS-TRUSTED-DST")
+    assert pf.classify(FW.format(action="ALLOW", dst="10.0.0.800", port=443, proto="TCP")) == ("ambiguous", None)
+    assert pf.classify(FW.format(action="ALLOW", dst="10.0.0.81", port=443, proto="TCP")) == ("ambiguous", None)
+
+
+@pytest.mark.parametrize(
+    "line, expected",
+    [
+        (SQUID.format(status=200, host="updates.example.com", ip="203.0.113.9"), ("allow", "HTTPS-CONNECT-TRUSTED")),
+        (ACCESS.format(status=200, host="updates.example.com"), ("allow", "HTTPS-CONNECT-TRUSTED")),
+        (SQUID.format(status=200, host="evil.example.net", ip="203.0.113.9"), ("ambiguous", None)),
+        (SQUID.format(status=407, host="updates.example.com", ip="203.0.113.9"), ("ambiguous", None)),
+        # "200" chỉ nằm trong IP, không phải status
+        (SQUID.format(status=403, host="updates.example.com", ip="10.0.200.5"), ("ambiguous", None)),
+        (ACCESS.format(status=502, host="updates.example.com") + " 200", ("ambiguous", None)),
+        # từ khóa cảnh báo ở dòng không có msg=
+        (SQUID.format(status=200, host="updates.example.com", ip="203.0.113.9") + " category=malware", ("ambiguous", None)),
+    ],
+)
+def test_proxy_connect_allowed_only_for_trusted_host(monkeypatch, line, expected):
+    assert _prefilter("proxy", monkeypatch, trusted=["updates.example.com"]).classify(line) == expected
+
+
+def test_proxy_has_no_allow_rule_by_default(monkeypatch):
+    pf = _prefilter("proxy", monkeypatch)
+    assert pf.rules == []
+    assert pf.classify(SQUID.format(status=200, host="anything.example.com", ip="203.0.113.9")) == ("ambiguous", None)
+
+
+# ======================================================
+# ANALYZE BATCH
+# ======================================================
+def test_analyze_batch_forwards_only_unmatched_lines(monkeypatch):
+    pf = _prefilter("firewall", monkeypatch)
+    allowed = FW.format(action="ALLOW", dst="8.8.8.8", port=53, proto="UDP")
+    forwarded = FW.format(action="DENY", dst="10.0.0.8", port=22, proto="TCP")
+    sent = []
+
+    def downstream(logs):
+        sent.append(list(logs))
+        return [AIProcessor._normalize_result({"risk_level": "high"}, line) for line in logs]
+
+    stats = PipelineStats()
+    results = pf.analyze_batch([allowed, forwarded, allowed], downstream, stats)
+
+    assert sent == [[forwarded]]
+    assert [r["source"] for r in results] == ["rule", "llm", "rule"]
+    assert results[0]["risk_level"] == "none"
+    assert results[0]["details"]["action"] == "ALLOW"
+    assert RulePrefilter.report(stats) == {"allow": 2, "ambiguous": 1}
+    assert stats.get("tiers.rule") == 2
+
+
+def test_analyze_batch_pads_short_downstream_results(monkeypatch):
+    pf = _prefilter("firewall", monkeypatch)
+    lines = [FW.format(action="DENY", dst="10.0.0.8", port=22, proto="TCP")] * 3
+
+    results = pf.analyze_batch(lines, lambda logs: [AIProcessor._normalize_result({}, logs[0])])
+
+    assert len(results) == 3
+    assert results[0]["source"] == "llm"
+    assert all(AIProcessor.is_fallback(r) for r in results[1:])
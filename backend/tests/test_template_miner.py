@@ -0,0 +1,155 @@
+# backend/tests/test_template_miner.py
+import copy
+import json
+
+import pytest
+
+from app.services.template_miner import WILDCARD, DrainMiner
+
+OPENED = "sshd session opened for user alice port 22"
+
+
+# ======================================================
+# ADD / MATCH
+# ======================================================
+def test_add_merges_similar_lines_into_one_template():
+    miner = DrainMiner()
+    first = miner.add(OPENED)
+    second = miner.add(OPENED.replace("alice", "bob"))
+
+    assert second is first
+    assert first.size == 2
+    assert first.template == f"sshd session opened for user {WILDCARD} port 22"
+
+
+@pytest.mark.parametrize(
+    "other",
+    [
+        "sshd session opened for user alice port 22 extra",  # khác số token
+        "kernel session opened for user alice port 22",  # khác token đầu (nhánh tree khác)
+        "sshd session failed with bad key from root",  # cùng nhánh, độ giống < sim_threshold
+    ],
+)
+def test_add_keeps_dissimilar_lines_apart(other):
+    miner = DrainMiner()
+    assert miner.add(OPENED) is not miner.add(other)
+    assert len(miner.clusters) == 2
+
+
+def test_variable_tokens_share_a_branch():
+    miner = DrainMiner()
+    a = miner.add("conn 10 closed by peer")
+    b = miner.add("conn 11 closed by peer")
+    assert a is b
+    assert a.path == ["5", "conn", WILDCARD]
+
+
+def test_match_round_trip_without_updating():
+    miner = DrainMiner()
+    cluster = miner.add(OPENED)
+    miner.add(OPENED.replace("alice", "bob"))
+    root = copy.deepcopy(miner._root)
+
+    assert miner.match(OPENED.replace("alice", "carol")) is cluster
+    assert cluster.size == 2
+    assert miner._root == root
+
+
+@pytest.mark.parametrize(
+    "line",
+    [
+        "kernel eth0 link up",  # số token chưa có trong tree
+        "sshd daemon opened for user alice port 22",  # token thứ 2 chưa có
+        "sshd session failed with bad key from root",  # có nhánh nhưng không đủ giống
+    ],
+)
+def test_match_unknown_shape_returns_none(line):
+    miner = DrainMiner()
+    miner.add(OPENED)
+    root = copy.deepcopy(miner._root)
+
+    assert miner.match(line) is None
+    assert miner._root == root
+
+
+def test_max_children_overflow_goes_to_wildcard_branch():
+    miner = DrainMiner(max_children=2)
+    for host in ("alpha", "beta", "gamma", "delta"):
+        miner.add(f"node {host} heartbeat ok")
+
+    assert set(miner._root["4"]["node"]) == {"alpha", "beta", WILDCARD}
+    assert miner.match("node omega heartbeat ok") is miner.match("node gamma heartbeat ok")
+
+
+# ======================================================
+# LRU EVICTION
+# ======================================================
+def test_lru_evicts_least_recently_used_cluster():
+    miner = DrainMiner(max_clusters=2)
+    a = miner.add("alpha service started ok")
+    b = miner.add("beta worker crashed hard now")
+    miner.add("alpha service started ok")  # a thành mới dùng gần nhất
+    c = miner.add("gamma queue is full")
+
+    assert [cluster.cluster_id for cluster in miner.clusters] == [a.cluster_id, c.cluster_id]
+    assert miner.get(b.cluster_id) is None
+    assert miner.match("beta worker crashed hard now") is None
+    assert miner._root["5"]["beta"]["worker"] == []  # id bị xoá khỏi leaf
+    assert miner.match("alpha service started ok") is a
+
+
+def test_evicted_shape_gets_a_new_id():
+    miner = DrainMiner(max_clusters=1)
+    first = miner.add("alpha service started ok")
+    miner.add("beta worker crashed hard now")
+    again = miner.add("alpha service started ok")
+
+    assert again.cluster_id != first.cluster_id
+    assert again.size == 1
+
+
+# ======================================================
+# SAVE / LOAD (.drain.json)
+# ======================================================
+def test_save_load_round_trip(tmp_path):
+    miner = DrainMiner(sim_threshold=0.6, depth=5, max_children=10, max_clusters=50)
+    opened = miner.add(OPENED)
+    miner.add(OPENED.replace("alice", "bob"))
+    kernel = miner.add("kernel eth0 link up")
+    path = tmp_path / "dataset.drain.json"
+
+    miner.save(str(path))
+    loaded = DrainMiner.load(str(path))
+
+    assert not (tmp_path / "dataset.drain.json.tmp").exists()
+    assert (loaded.sim_threshold, loaded.depth, loaded.max_children, loaded.max_clusters) == (0.6, 5, 10, 50)
+    assert [c.to_dict() for c in loaded.clusters] == [c.to_dict() for c in miner.clusters]
+    assert loaded._root == miner._root
+    assert loaded.match(OPENED.replace("alice", "carol")).cluster_id == opened.cluster_id
+    assert loaded.match("kernel eth0 link up").cluster_id == kernel.cluster_id
+
+    # id mới không trùng id đã lưu
+    assert loaded.add("totally new shape of line here").cluster_id == kernel.cluster_id + 1
+
+
+def test_save_writes_json(tmp_path):
+    miner = DrainMiner()
+    miner.add(OPENED)
+    path = tmp_path / "dataset.drain.json"
+    miner.save(str(path))
+
+    data = json.loads(path.read_text(encoding="utf-8"))
+    assert data["next_id"] == 2
+    assert data["clusters"][0]["tokens"] == OPENED.split()
+
+
+@pytest.mark.parametrize("content", [None, "{not json", '{"clusters": []}'])
+def test_load_or_create_falls_back_to_empty_miner(tmp_path, content):
+    path = tmp_path / "dataset.drain.json"
+    if content is not None:
+        path.write_text(content, encoding="utf-8")
+
+    miner = DrainMiner.load_or_create(str(path), max_clusters=7)
+
+    assert miner.clusters == []
+    assert miner.max_clusters == 7
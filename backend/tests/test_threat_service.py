@@ -0,0 +1,112 @@
+# backend/tests/test_threat_service.py
+import pytest
+
+from app.services import threat_service
+from app.services.threat_service import chunk_lines, hunt_threats_from_lines, reduce_by_source_ip
+
+LINES = [f"2025-11-30 10:21:{i % 60:02d} INFO FIREWALL id={i} action=DENY src=192.168.1.{i % 4} dst=10.0.0.8" for i in range(25)]
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(threat_service.settings, "HUNT_CHUNK_MAX_LINES", 10)
+    monkeypatch.setattr(threat_service.settings, "HUNT_MAP_WORKERS", 2)
+
+
+# ======================================================
+# CHUNK
+# ======================================================
+def test_chunk_lines_keeps_every_line_in_order(small_chunks):
+    chunks = chunk_lines(LINES)
+
+    assert [offset for offset, _ in chunks] == [0, 10, 20]
+    assert [line for _, chunk in chunks for line in chunk] == LINES
+
+
+def test_chunk_lines_respects_token_budget(monkeypatch):
+    monkeypatch.setattr(threat_service.settings, "HUNT_CHUNK_MAX_LINES", 1000)
+    overhead = len(threat_service.build_threat_hunt_prompt([], "")) / threat_service.CHARS_PER_TOKEN
+    per_line = len(LINES[0]) / threat_service.CHARS_PER_TOKEN + threat_service.settings.HUNT_OUTPUT_TOKENS_PER_LINE
+    # vừa đủ chỗ cho 3 dòng / chunk
+    monkeypatch.setattr(threat_service.settings, "OLLAMA_NUM_CTX", int((overhead + 3.5 * per_line) / threat_service.settings.BATCH_CONTEXT_FILL) + 1)
+
+    chunks = chunk_lines(LINES[:10])
+    assert [len(chunk) for _, chunk in chunks] == [3, 3, 3, 1]
+
+
+def test_chunk_lines_never_returns_empty_chunks(monkeypatch):
+    # dòng dài hơn cả budget vẫn đi một mình
+    monkeypatch.setattr(threat_service.settings, "OLLAMA_NUM_CTX", 1)
+    assert chunk_lines(["a" * 500, "b"]) == [(0, ["a" * 500]), (1, ["b"])]
+    assert chunk_lines([]) == []
+
+
+# ======================================================
+# REDUCE
+# ======================================================
+def test_reduce_by_source_ip():
+    items = [
+        {"source_ip": "10.0.0.1", "is_threat": True, "threat_type": "Brute Force", "ai_confidence": 70,
+         "timestamp": "2025-11-30 10:00:05", "evidence": "failed password"},
+        {"source_ip": "10.0.0.1", "is_threat": True, "threat_type": "Brute Force", "ai_confidence": 90,
+         "timestamp": "2025-11-30 10:00:01", "evidence": "failed password"},
+        {"source_ip": "10.0.0.2", "is_threat": False, "timestamp": "2025-11-30 09:00:00"},
+        {"source_ip": "10.0.0.2", "is_threat": False},
+        {"source_ip": "10.0.0.2", "is_threat": False},
+        {"is_threat": True, "ai_confidence": 40, "evidence": "odd"},
+    ]
+
+    by_ip = reduce_by_source_ip(items)
+
+    assert list(by_ip) == ["10.0.0.1", "unknown", "10.0.0.2"]
+    assert by_ip["10.0.0.1"] == {
+        "lines": 2,
+        "threats": 2,
+        "threat_types": {"Brute Force": 2},
+        "max_confidence": 90,
+        "first_seen": "2025-11-30 10:00:01",
+        "last_seen": "2025-11-30 10:00:05",
+        "evidence": ["failed password"],
+    }
+    assert by_ip["unknown"]["threat_types"] == {"Unknown": 1}
+    assert by_ip["10.0.0.2"]["threats"] == 0
+    assert by_ip["10.0.0.2"]["first_seen"] == by_ip["10.0.0.2"]["last_seen"] == "2025-11-30 09:00:00"
+
+
+def test_reduce_by_source_ip_caps_evidence():
+    items = [{"source_ip": "10.0.0.1", "is_threat": True, "evidence": f"e{i}"} for i in range(8)]
+    assert reduce_by_source_ip(items)["10.0.0.1"]["evidence"] == [f"e{i}" for i in range(threat_service.EVIDENCE_PER_IP)]
+
+
+# ======================================================
+# MAP-REDUCE
+# ======================================================
+def _fake_hunt_chunk(fail_offsets=()):
+    def hunt(chunk, offset, model, user_query):
+        if offset in fail_offsets:
+            raise TimeoutError("ollama timed out")
+        return [
+            {"source_ip": line.split("src=")[1].split()[0], "is_threat": "id=1 " in line, "line_index": offset + i}
+            for i, line in enumerate(chunk)
+        ]
+    return hunt
+
+
+def test_hunt_threats_from_lines_returns_reduce_and_coverage(small_chunks, monkeypatch):
+    monkeypatch.setattr(threat_service, "_hunt_chunk", _fake_hunt_chunk())
+
+    result = hunt_threats_from_lines(LINES)
+
+    assert [item["line_index"] for item in result["items"]] == list(range(len(LINES)))
+    assert list(result["by_source_ip"])[0] == "192.168.1.1"
+    assert result["chunks"] == {"total": 3, "failed": 0, "lines": 25, "covered_lines": 25}
+
+
+def test_failed_chunk_is_reported_in_coverage(small_chunks, monkeypatch):
+    monkeypatch.setattr(threat_service, "_hunt_chunk", _fake_hunt_chunk(fail_offsets={10}))
+
+    result = hunt_threats_from_lines(LINES)
+
+    assert [item["line_index"] for item in result["items"]] == list(range(10)) + list(range(20, 25))
+    assert result["chunks"] == {"total": 3, "failed": 1, "lines": 25, "covered_lines": 15}
+    assert sum(entry["lines"] for entry in result["by_source_ip"].values()) == 15
@@ -0,0 +1,246 @@
+# backend/tests/test_upload.py
+import asyncio
+import gzip
+import hashlib
+import io
+
+import pytest
+
+from app.services import upload_service
+from app.services.upload_service import HASH_SUFFIX, UploadService, file_sha256, stored_log_format, stored_sha256
+from app.utils.exceptions import UploadError
+from app.utils.line_index import index_path
+
+CONTENT = b"".join(f"2025-11-30 10:00:{i:02d} id={i} action=DENY\n".encode() for i in range(40))
+DIGEST = hashlib.sha256(CONTENT).hexdigest()
+
+
+class _FakeUploadFile:
+    """
+    Giống UploadFile: async read(n); fail_after → lỗi giữa chừng (client ngắt kết nối)
+    """
+
+    def __init__(self, data, filename="fw.log", fail_after=None):
+        self._buffer = io.BytesIO(data)
+        self.filename = filename
+        self.fail_after = fail_after
+
+    async def read(self, n):
+        if self.fail_after is not None and self._buffer.tell() >= self.fail_after:
+            raise ConnectionResetError("client disconnected")
+        return self._buffer.read(n)
+
+
+async def _chunks(*parts, fail=False):
+    for part in parts:
+        yield part
+    if fail:
+        raise ConnectionResetError("client disconnected")
+
+
+@pytest.fixture
+def service(tmp_path):
+    return UploadService(str(tmp_path / "uploads"), chunk_size=64)
+
+
+def _leftovers(service):
+    return sorted(p.name for p in service.partial_dir.iterdir())
+
+
+# ======================================================
+# ONE-SHOT (multipart)
+# ======================================================
+def test_save_upload_stores_by_content_hash(service):
+    result = asyncio.run(service.save_upload(_FakeUploadFile(CONTENT)))
+
+    path = service.upload_dir / f"{DIGEST}.log"
+    assert result == {"filepath": str(path), "filename": "fw.log", "size": len(CONTENT), "sha256": DIGEST, "duplicate": False}
+    assert path.read_bytes() == CONTENT
+    assert (service.upload_dir / f"{DIGEST}.log{HASH_SUFFIX}").read_text() == DIGEST
+    assert index_path(path).exists()
+    assert stored_log_format(str(path)) == "kv"  # đoán format một lần lúc upload
+    assert _leftovers(service) == []
+
+
+@pytest.mark.parametrize("max_size", [0, 100, len(CONTENT) - 1])
+def test_save_upload_aborts_over_size_limit(service, max_size):
+    with pytest.raises(UploadError) as exc:
+        asyncio.run(service.save_upload(_FakeUploadFile(CONTENT), max_size=max_size))
+
+    assert exc.value.status_code == 413
+    assert _leftovers(service) == []
+    assert [p.name for p in service.upload_dir.iterdir()] == [upload_service.PARTIAL_DIR]
+
+
+def test_save_upload_removes_temp_file_on_client_error(service):
+    with pytest.raises(ConnectionResetError):
+        asyncio.run(service.save_upload(_FakeUploadFile(CONTENT, fail_after=128)))
+    assert _leftovers(service) == []
+
+
+def test_save_upload_dedupes_identical_content(service):
+    first = asyncio.run(service.save_upload(_FakeUploadFile(CONTENT)))
+    second = asyncio.run(service.save_upload(_FakeUploadFile(CONTENT, filename="copy.LOG")))
+
+    assert second["duplicate"] is True
+    assert second["filepath"] == first["filepath"]
+    assert second["filename"] == "copy.LOG"
+    assert _leftovers(service) == []
+
+
+def test_save_upload_rejects_decompression_bomb(service, monkeypatch):
+    # giới hạn upload tính trên byte nén → kiểm tra thêm byte sau giải nén
+    monkeypatch.setattr(upload_service.settings, "LOG_MAX_DECOMPRESSED_SIZE", len(CONTENT) - 1)
+    compressed = gzip.compress(CONTENT)
+
+    with pytest.raises(UploadError) as exc:
+        asyncio.run(service.save_upload(_FakeUploadFile(compressed, filename="fw.log.gz")))
+
+    assert exc.value.status_code == 413
+    assert _leftovers(service) == []
+    assert [p.name for p in service.upload_dir.iterdir()] == [upload_service.PARTIAL_DIR]
+
+
+# ======================================================
+# RESUMABLE
+# ======================================================
+def test_resumable_upload_round_trip(service):
+    upload_id = service.begin("fw.log", len(CONTENT))["upload_id"]
+
+    status = asyncio.run(service.write_chunk(upload_id, 0, _chunks(CONTENT[:100], b"", CONTENT[100:200])))
+    assert status["offset"] == 200
+    status = asyncio.run(service.write_chunk(upload_id, 200, _chunks(CONTENT[200:])))
+    assert status["offset"] == len(CONTENT)
+
+    result = service.complete(upload_id)
+    assert result["sha256"] == DIGEST
+    assert result["duplicate"] is False
+    assert _leftovers(service) == []
+
+
+def test_write_chunk_rejects_offset_mismatch(service):
+    upload_id = service.begin("fw.log", len(CONTENT))["upload_id"]
+    asyncio.run(service.write_chunk(upload_id, 0, _chunks(CONTENT[:100])))
+
+    for offset in (0, 50, 150):
+        with pytest.raises(UploadError) as exc:
+            asyncio.run(service.write_chunk(upload_id, offset, _chunks(CONTENT[offset:])))
+        assert exc.value.status_code == 409
+    assert service.status(upload_id)["offset"] == 100
+    assert upload_id not in upload_service._busy
+
+
+@pytest.mark.parametrize(
+    "chunks, error",
+    [
+        (lambda: _chunks(CONTENT[100:150], CONTENT[150:180], fail=True), ConnectionResetError),
+        (lambda: _chunks(CONTENT[100:], b"extra"), UploadError),  # vượt size đã khai báo
+    ],
+)
+def test_write_chunk_truncates_partial_chunk_on_error(service, chunks, error):
+    upload_id = service.begin("fw.log", len(CONTENT))["upload_id"]
+    asyncio.run(service.write_chunk(upload_id, 0, _chunks(CONTENT[:100])))
+
+    with pytest.raises(error):
+        asyncio.run(service.write_chunk(upload_id, 100, chunks()))
+
+    assert service.status(upload_id)["offset"] == 100
+    assert upload_id not in upload_service._hashers  # hash dở dang bị bỏ
+
+    # client gửi lại từ offset cũ → complete() hash lại từ file
+    asyncio.run(service.write_chunk(upload_id, 100, _chunks(CONTENT[100:])))
+    assert service.complete(upload_id)["sha256"] == DIGEST
+
+
+def test_complete_rehashes_when_incremental_hash_is_missing(service, monkeypatch):
+    upload_id = service.begin("fw.log", len(CONTENT))["upload_id"]
+    asyncio.run(service.write_chunk(upload_id, 0, _chunks(CONTENT)))
+
+    # chunk được ghi ở process khác / API restart → không có hasher trong memory
+    upload_service._hashers.pop(upload_id)
+    rehashed = []
+    monkeypatch.setattr(upload_service, "file_sha256", lambda path: rehashed.append(path) or file_sha256(path))
+
+    assert service.complete(upload_id)["sha256"] == DIGEST
+    assert len(rehashed) == 1
+
+
+def test_complete_rejects_incomplete_upload(service):
+    upload_id = service.begin("fw.log", len(CONTENT))["upload_id"]
+    asyncio.run(service.write_chunk(upload_id, 0, _chunks(CONTENT[:100])))
+
+    with pytest.raises(UploadError) as exc:
+        service.complete(upload_id)
+    assert exc.value.status_code == 409
+
+
+def test_resumable_upload_dedupes_against_existing_file(service):
+    first = asyncio.run(service.save_upload(_FakeUploadFile(CONTENT)))
+    upload_id = service.begin("again.log", len(CONTENT))["upload_id"]
+    asyncio.run(service.write_chunk(upload_id, 0, _chunks(CONTENT)))
+
+    result = service.complete(upload_id)
+    assert result["duplicate"] is True
+    assert result["filepath"] == first["filepath"]
+    assert _leftovers(service) == []
+
+
+def test_complete_rejects_decompression_bomb(service, monkeypatch):
+    monkeypatch.setattr(upload_service.settings, "LOG_MAX_DECOMPRESSED_SIZE", len(CONTENT) - 1)
+    compressed = gzip.compress(CONTENT)
+    upload_id = service.begin("fw.log.gz", len(compressed))["upload_id"]
+    asyncio.run(service.write_chunk(upload_id, 0, _chunks(compressed)))
+
+    with pytest.raises(UploadError) as exc:
+        service.complete(upload_id)
+
+    assert exc.value.status_code == 413
+    assert _leftovers(service) == []
+    assert [p.name for p in service.upload_dir.iterdir()] == [upload_service.PARTIAL_DIR]
+
+
+def test_concurrent_write_is_rejected(service):
+    upload_id = service.begin("fw.log", len(CONTENT))["upload_id"]
+    upload_service._busy.add(upload_id)
+    try:
+        with pytest.raises(UploadError) as exc:
+            asyncio.run(service.write_chunk(upload_id, 0, _chunks(CONTENT)))
+        assert exc.value.status_code == 409
+    finally:
+        upload_service._busy.discard(upload_id)
+
+
+@pytest.mark.parametrize(
+    "upload_id, status_code",
+    [("../../etc/passwd", 400), ("0" * 31, 400), ("0" * 32, 404)],
+)
+def test_unknown_or_invalid_upload_id(service, upload_id, status_code):
+    with pytest.raises(UploadError) as exc:
+        service.status(upload_id)
+    assert exc.value.status_code == status_code
+
+
+def test_begin_rejects_oversized_upload(service, monkeypatch):
+    monkeypatch.setattr(upload_service.settings, "UPLOAD_RESUMABLE_MAX_SIZE", 1000)
+    with pytest.raises(UploadError) as exc:
+        service.begin("huge.log", 1001)
+    assert exc.value.status_code == 413
+
+
+# ======================================================
+# file_sha256 / stored_sha256
+# ======================================================
+def test_file_sha256_prefers_sidecar(tmp_path):
+    path = tmp_path / "fw.log"
+    path.write_bytes(CONTENT)
+    assert stored_sha256(str(path)) is None  # không hash file log
+    assert file_sha256(str(path)) == DIGEST
+
+    (tmp_path / f"fw.log{HASH_SUFFIX}").write_text("a" * 64)
+    assert file_sha256(str(path)) == "a" * 64
+
+    assert stored_sha256(str(path)) == "a" * 64
+
+    (tmp_path / f"fw.log{HASH_SUFFIX}").write_text("truncated")
+    assert stored_sha256(str(path)) is None
+    assert file_sha256(str(path)) == DIGEST
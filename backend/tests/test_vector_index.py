@@ -0,0 +1,223 @@
+# backend/tests/test_vector_index.py
+import json
+import os
+
+import numpy as np
+import pytest
+
+from app.services.ai_processor import AIProcessor
+from app.services.pipeline_stats import PipelineStats
+from app.services.vector_index import VectorIndex, vectorize
+
+DIM = 256
+# mỗi dòng một kiểu sự kiện khác hẳn nhau → vector không trùng
+EVENTS = [
+    "action=DENY protocol=TCP msg=\"failed password for root\"",
+    "action=ALLOW protocol=UDP msg=\"dns query example.com\"",
+    "action=DROP protocol=ICMP msg=\"echo request flood\"",
+    "action=ALLOW protocol=TCP msg=\"GET /index.html\"",
+    "action=DENY protocol=TCP msg=\"SELECT * FROM users\"",
+]
+
+
+def _line(event, n=1):
+    # chỉ khác số → cùng template, cùng vector
+    return f"2025-11-30 10:21:{n % 60:02d} INFO FIREWALL id={1000 + n} src=192.168.1.{n % 250} {EVENTS[event]}"
+
+
+def _verdict(risk="low", raw_log="x"):
+    return AIProcessor._normalize_result({"risk_level": risk, "confidence": 80}, raw_log)
+
+
+def _add(index, *lines, risk="low"):
+    return index.add(vectorize(list(lines), DIM), [_verdict(risk, line) for line in lines])
+
+
+def _similarity(a, b):
+    va, vb = vectorize([a, b], DIM)
+    return float(va @ vb)
+
+
+def _risks(index):
+    return [json.loads(v)["risk_level"] for v in index._verdicts]
+
+
+class _FakeModel:
+    """
+    analyze_fn giả: ghi lại các batch được gửi xuống, trả verdict "high" cho mọi dòng
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, logs):
+        self.calls.append(list(logs))
+        return [_verdict("high", line) for line in logs]
+
+
+# ======================================================
+# ADD / DEDUPE / TRIM
+# ======================================================
+def test_add_skips_near_duplicates():
+    index = VectorIndex(dim=DIM)
+
+    # trong cùng lần add: dòng thứ 2 trùng vector dòng đầu
+    assert _add(index, _line(0, 1), _line(0, 2), _line(1, 3)) == 2
+    # so với dòng đã có trong index
+    assert _add(index, _line(0, 7), _line(2, 8)) == 1
+    assert len(index) == 3
+
+    sims, _ = index.search(vectorize([_line(0, 9)], DIM))
+    assert sims[0] >= VectorIndex.DEDUP_SIMILARITY
+
+
+def test_add_keeps_lines_below_dedup_similarity():
+    index = VectorIndex(dim=DIM)
+    near = _line(0).replace("root", "admin")
+    sim = _similarity(_line(0), near)
+    assert sim < VectorIndex.DEDUP_SIMILARITY
+
+    assert _add(index, _line(0), near) == 2
+
+
+def test_add_drops_raw_log_from_stored_verdict():
+    index = VectorIndex(dim=DIM)
+    _add(index, _line(0))
+    assert "raw_log" not in json.loads(index._verdicts[0])
+
+
+def test_trim_evicts_oldest_lines_first():
+    index = VectorIndex(dim=DIM, max_size=3)
+    for event, risk in enumerate(["none", "low", "medium", "high", "critical"]):
+        _add(index, _line(event), risk=risk)
+
+    assert len(index) == 3
+    assert _risks(index) == ["medium", "high", "critical"]
+    # vector còn khớp đúng verdict sau khi dịch buffer
+    sims, neighbours = index.search(vectorize([_line(3, 30)], DIM))
+    assert sims[0] == pytest.approx(1.0)
+    assert json.loads(neighbours[0])["risk_level"] == "high"
+    assert index._pending == 3
+
+
+# ======================================================
+# ANALYZE BATCH
+# ======================================================
+def test_analyze_batch_reuses_neighbour_above_threshold():
+    index = VectorIndex(dim=DIM)
+    _add(index, _line(0), risk="medium")
+    model = _FakeModel()
+    stats = PipelineStats()
+    logs = [_line(0, 5), _line(1, 6)]
+
+    results = index.analyze_batch(logs, model, threshold=0.9, stats=stats)
+
+    assert model.calls == [[logs[1]]]
+    assert [r["source"] for r in results] == ["vector", "llm"]
+    assert [r["raw_log"] for r in results] == logs
+    assert results[0]["risk_level"] == "medium"
+    report = VectorIndex.report(stats)
+    assert report["hits"] == 1
+    assert report["misses"] == 1
+    assert report["added"] == 1
+    assert report["avg_similarity"] == pytest.approx(1.0, abs=1e-4)
+
+    # verdict mới của LLM được học ngay → batch sau hit
+    results = index.analyze_batch([_line(1, 7)], model, threshold=0.9, stats=stats)
+    assert results[0]["source"] == "vector"
+    assert len(model.calls) == 1
+
+
+def test_analyze_batch_misses_below_threshold():
+    index = VectorIndex(dim=DIM)
+    _add(index, _line(0))
+    near = _line(0).replace("root", "admin")
+    sim = _similarity(_line(0), near)
+    model = _FakeModel()
+
+    index.analyze_batch([near], model, threshold=sim + 0.001)
+    assert model.calls == [[near]]
+
+    results = index.analyze_batch([near.replace("admin", "guest")], model, threshold=sim - 0.05)
+    assert results[0]["source"] == "vector"
+
+
+def test_analyze_batch_does_not_learn_fallbacks():
+    index = VectorIndex(dim=DIM)
+    stats = PipelineStats()
+
+    results = index.analyze_batch([_line(0)], lambda logs: [], threshold=0.9, stats=stats)
+
+    assert AIProcessor.is_fallback(results[0])
+    assert len(index) == 0
+    assert VectorIndex.report(stats)["added"] == 0
+
+
+# ======================================================
+# PERSISTENCE
+# ======================================================
+def _touch_later(path):
+    # mtime khác hẳn bản mình ghi (không phụ thuộc độ phân giải mtime của FS)
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+
+def test_flush_and_load_round_trip(tmp_path):
+    path = tmp_path / "fw.npz"
+    index = VectorIndex(dim=DIM, path=path)
+    _add(index, _line(0), _line(1))
+
+    assert index.flush() == 2
+    assert index.flush() == 0
+
+    loaded = VectorIndex.load(path, dim=DIM, ngram=3, max_size=100)
+    assert loaded._verdicts == index._verdicts
+    assert np.array_equal(loaded._buf[:2], index._buf[:2])
+    # đổi dim → không dùng index cũ
+    assert len(VectorIndex.load(path, dim=DIM * 2, ngram=3, max_size=100)) == 0
+
+
+def test_flush_merges_file_rewritten_by_another_process(tmp_path):
+    path = tmp_path / "fw.npz"
+    ours = VectorIndex(dim=DIM, path=path)
+    _add(ours, _line(0), risk="none")
+    ours.flush()
+
+    theirs = VectorIndex.load(path, dim=DIM, ngram=3, max_size=100)
+    _add(theirs, _line(1), risk="low")
+    theirs.flush()
+    _touch_later(path)
+
+    # dòng trùng với bản trên disk bị dedupe khi merge
+    _add(ours, _line(2), _line(1, 9), risk="high")
+    assert ours.flush() == 1
+
+    merged = VectorIndex.load(path, dim=DIM, ngram=3, max_size=100)
+    assert _risks(merged) == ["none", "low", "high"]
+    assert _risks(ours) == ["none", "low", "high"]
+
+
+def test_flush_keeps_lines_added_while_reading_file(tmp_path):
+    path = tmp_path / "fw.npz"
+    ours = VectorIndex(dim=DIM, path=path)
+    _add(ours, _line(0), risk="none")
+    ours.flush()
+
+    theirs = VectorIndex.load(path, dim=DIM, ngram=3, max_size=100)
+    _add(theirs, _line(1), risk="low")
+    theirs.flush()
+    _touch_later(path)
+
+    _add(ours, _line(2), risk="medium")
+    read_file = ours._read_file
+
+    def read_while_other_thread_adds():
+        loaded = read_file()
+        # batch in-flight khác của job add() giữa lúc flush đang đọc file
+        _add(ours, _line(3), risk="high")
+        return loaded
+
+    ours._read_file = read_while_other_thread_adds
+    ours.flush()
+
+    assert _risks(VectorIndex.load(path, dim=DIM, ngram=3, max_size=100)) == ["none", "low", "medium", "high"]
@@ -0,0 +1,210 @@
+# backend/tests/test_verdict_cache.py
+import json
+
+import fakeredis
+import pytest
+
+from app.services import verdict_cache as vc
+from app.services.ai_processor import AIProcessor
+from app.services.pipeline_stats import PipelineStats
+from app.services.verdict_cache import VerdictCache, log_template
+
+LINE = (
+    '2025-11-30 10:21:35 INFO FIREWALL id=1001 action=DENY src=192.168.1.25 '
+    'dst=10.0.0.8 src_port=51234 dst_port=22 protocol=TCP msg="failed password"'
+)
+
+
+def _verdict(risk="low", confidence=80, raw_log="x"):
+    return AIProcessor._normalize_result({"risk_level": risk, "confidence": confidence}, raw_log)
+
+
+class _FakeModel:
+    """
+    analyze_fn giả: ghi lại các batch được gửi xuống, trả verdict "low" cho mọi dòng
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, logs):
+        self.calls.append(list(logs))
+        return [_verdict(raw_log=line) for line in logs]
+
+
+# ======================================================
+# LOG TEMPLATE
+# ======================================================
+@pytest.mark.parametrize(
+    "line, expected",
+    [
+        ("2025-11-30 10:21:35 action=DENY", "<TS> action=DENY"),
+        ("2025-11-30T10:21:35.123+07:00 action=DENY", "<TS> action=DENY"),
+        ("Nov 30 10:21:35 host sshd", "<TS> host sshd"),
+        ("id=1001 logid=77 sessionid=abc", "id=<ID> logid=<ID> sessionid=<ID>"),
+        ("trace=123e4567-e89b-12d3-a456-426614174000", "trace=<UUID>"),
+        ("hash=deadbeefdeadbeef00", "hash=<HEX>"),
+        ("src_port=51234 dst_port=443", "src_port=<PORT> dst_port=443"),
+        ("src_port=80", "src_port=80"),
+        ("src=192.168.1.25 dst=10.0.0.8", "src=192.168.1.<H> dst=10.0.0.<H>"),
+        ("  action=ALLOW  ", "action=ALLOW"),
+    ],
+)
+def test_log_template_masks_variable_fields(line, expected):
+    assert log_template(line) == expected
+
+
+def test_log_template_same_shape_lines_share_template():
+    other = LINE.replace("10:21:35", "11:02:09").replace("1001", "1002").replace("51234", "40001").replace(".25", ".99")
+    assert log_template(LINE) == log_template(other)
+    assert log_template(LINE) != log_template(LINE.replace("dst_port=22", "dst_port=3389"))
+
+
+# ======================================================
+# LRU / TTL
+# ======================================================
+def test_lru_evicts_least_recently_used():
+    cache = VerdictCache(max_size=2)
+    cache.put("ns", "a", _verdict("low"))
+    cache.put("ns", "b", _verdict("medium"))
+    assert cache.get("ns", "a") is not None  # a thành mới dùng gần nhất
+
+    cache.put("ns", "c", _verdict("high"))
+
+    assert cache.get("ns", "b") is None
+    assert cache.get("ns", "a")["risk_level"] == "low"
+    assert cache.get("ns", "c")["risk_level"] == "high"
+
+
+def test_ttl_expires_local_entries(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(vc.time, "monotonic", lambda: now[0])
+    cache = VerdictCache(ttl_seconds=60)
+    cache.put("ns", "a", _verdict())
+
+    now[0] += 59
+    assert cache.get("ns", "a") is not None
+    now[0] += 2
+    assert cache.get("ns", "a") is None
+    assert len(cache._store) == 0
+
+
+def test_namespaces_are_isolated():
+    cache = VerdictCache()
+    cache.put("model-a@r1", "t", _verdict())
+    assert cache.get("model-b@r1", "t") is None
+
+
+def test_put_drops_raw_log():
+    cache = VerdictCache()
+    cache.put("ns", "t", _verdict(raw_log="secret line"))
+    assert "raw_log" not in cache.get("ns", "t")
+
+
+# ======================================================
+# REDIS TIER (fakeredis)
+# ======================================================
+@pytest.fixture
+def redis_client():
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+def test_redis_shares_verdicts_between_instances(redis_client):
+    writer = VerdictCache(ttl_seconds=120, redis_client=redis_client)
+    writer.put("ns", "t", _verdict("high"))
+
+    key = writer._key("ns", "t")
+    assert json.loads(redis_client.get(key))["risk_level"] == "high"
+    assert 0 < redis_client.ttl(key) <= 120
+
+    reader = VerdictCache(redis_client=redis_client)
+    stats = PipelineStats()
+    assert reader.get("ns", "t", stats)["risk_level"] == "high"
+    assert stats.get("cache.hits_redis") == 1
+
+    # lần sau lấy từ tier local
+    assert reader.get("ns", "t", stats) is not None
+    assert stats.get("cache.hits_local") == 1
+    assert stats.get("cache.hits_redis") == 1
+
+
+def test_redis_errors_fall_back_to_miss(redis_client):
+    class _Broken(fakeredis.FakeRedis):
+        def get(self, *args, **kwargs):
+            raise vc.redis.ConnectionError("down")
+
+        def set(self, *args, **kwargs):
+            raise vc.redis.ConnectionError("down")
+
+    cache = VerdictCache(redis_client=_Broken(decode_responses=True))
+    cache.put("ns", "t", _verdict())  # không raise
+    assert cache.get("ns", "t") is not None  # vẫn có trong tier local
+    assert cache.get("ns", "other") is None
+
+
+# ======================================================
+# CACHED ANALYZE (dedupe trong batch)
+# ======================================================
+def _line(i, dst_port=22):
+    return LINE.replace("id=1001", f"id={i}").replace("dst_port=22", f"dst_port={dst_port}")
+
+
+def test_analyze_batch_dedupes_templates_within_batch():
+    cache = VerdictCache()
+    model = _FakeModel()
+    stats = PipelineStats()
+    logs = [_line(1), _line(2), _line(3, 443), _line(4)]
+
+    results = cache.analyze_batch(logs, model, namespace="ns", stats=stats)
+
+    assert model.calls == [[logs[0], logs[2]]]
+    assert [r["raw_log"] for r in results] == logs
+    assert [r["source"] for r in results] == ["llm", "cache", "llm", "cache"]
+    report = VerdictCache.report(stats)
+    assert report["hits"] == 0
+    assert report["deduped"] == 2
+    assert report["misses"] == 2
+    assert report["llm_lines"] == 2
+    assert report["llm_lines_saved"] == 2
+    assert stats.section("tiers") == {"cache": 0, "dedupe": 2}
+
+
+def test_analyze_batch_serves_later_batches_from_store():
+    cache = VerdictCache()
+    model = _FakeModel()
+    stats = PipelineStats()
+    cache.analyze_batch([_line(1)], model, namespace="ns", stats=stats)
+
+    results = cache.analyze_batch([_line(2), _line(3)], model, namespace="ns", stats=stats)
+
+    assert len(model.calls) == 1
+    assert all(r["source"] == "cache" for r in results)
+    assert [r["raw_log"] for r in results] == [_line(2), _line(3)]
+    report = VerdictCache.report(stats)
+    assert report["hits"] == 2
+    assert report["deduped"] == 0
+    assert report["hit_rate"] == round(2 / 3 * 100, 2)
+    assert report["batches_saved"] == 1
+    assert report["batches_forwarded"] == 1
+
+
+def test_analyze_batch_does_not_cache_fallbacks_or_reused_verdicts():
+    cache = VerdictCache()
+
+    def failing(logs):
+        return [AIProcessor._safe_fallback(line) for line in logs]
+
+    cache.analyze_batch([_line(1)], failing, namespace="ns")
+    assert cache.get("ns", log_template(_line(1))) is None
+
+    def from_vector(logs):
+        return [AIProcessor.reuse_verdict(_verdict(), line, "vector") for line in logs]
+
+    cache.analyze_batch([_line(2, 443)], from_vector, namespace="ns")
+    assert cache.get("ns", log_template(_line(2, 443))) is None
+
+
+def test_analyze_batch_fills_missing_results_with_fallback():
+    cache = VerdictCache()
+    results = cache.analyze_batch([_line(1), _line(2, 443)], lambda logs: [], namespace="ns")
+    assert all(AIProcessor.is_fallback(r) for r in results)